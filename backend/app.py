@@ -17,19 +17,36 @@
 #########################
 
 # Import the API endpoints from other files in the folder "backend"
+import datasetSessions
+import generateBundle
 import generateLoadingsTable
 import generatePCA
 import generatePCA3D
 import generateScreePlot
 import generateTopFiveContributors
 import getDataFromDB
+import jobQueue
+import jsonEncoding
+import parallelAnalysis
+import pcaCache
+import projectSamples
+import requestMetrics
+import responseCaching
+import serverHealth
+import streamingPCA
 
 # Import the Flask and CORS libraries
-from flask import Flask
+from flask import Flask, Response, jsonify
 from flask_cors import CORS
 
 app = Flask(__name__)
-CORS(app)
+# The "ETag" header is exposed, so the frontend can read it and send it back in "If-None-Match", check the file "responseCaching.py"
+CORS(app, expose_headers=['ETag'])
+
+# The JSON of the responses is written with "orjson" if it is installed, which is much faster with the big results like the loadings table
+# Check the file "jsonEncoding.py" for the detail explanation
+app.json_provider_class = jsonEncoding.get_json_provider_class()
+app.json = app.json_provider_class(app)
 
 # The port number is set to 7000
 # It could be changed to any other port number
@@ -42,6 +59,13 @@ PORT = 7000
 def home():
     return f"Flask server is running on port {PORT}!"
 
+
+# If the data or the options sent by the frontend are not valid, like an unknown "solver", a "ValueError" is raised
+# ==> then we return the error message with the status code 400 (Bad Request), instead of the status code 500 (Internal Server Error)
+@app.errorhandler(ValueError)
+def handle_value_error(error):
+    return jsonify({'error': str(error)}), 400
+
 # The "register_blueprint()" function is used to connect the API endpoints from other files in the folder "backend"
 # So instead of writing everything in this "app.py" file, we separate the code into different files and then put them here
 app.register_blueprint(getDataFromDB.bp)
@@ -50,6 +74,31 @@ app.register_blueprint(generatePCA.bp)
 app.register_blueprint(generatePCA3D.bp)
 app.register_blueprint(generateLoadingsTable.bp)
 app.register_blueprint(generateTopFiveContributors.bp)
+app.register_blueprint(generateBundle.bp)
+app.register_blueprint(datasetSessions.bp)
+app.register_blueprint(pcaCache.bp)
+app.register_blueprint(streamingPCA.bp)
+app.register_blueprint(serverHealth.bp)
+app.register_blueprint(jobQueue.bp)
+app.register_blueprint(parallelAnalysis.bp)
+app.register_blueprint(projectSamples.bp)
+
+# The time of each request and of its stages is measured, then sent in the "Server-Timing" header, check the file "requestMetrics.py"
+# Flask calls the "after_request" functions in the reverse order, so "requestMetrics.finish_request" runs last and also measures the compression
+app.before_request(requestMetrics.start_request)
+app.after_request(requestMetrics.finish_request)
+
+# After each request, the ETag is added and the big JSON results are compressed, check the file "responseCaching.py"
+app.after_request(responseCaching.finish_response)
+
+
+# The counters and the histograms of the requests, in the text format of Prometheus, check the file "requestMetrics.py"
+@app.route('/metrics')
+def metrics():
+    return Response(requestMetrics.render_metrics(), mimetype='text/plain; version=0.0.4')
 
+# "python app.py" runs the development server of Flask, which is only for the development
+# In production, run the backend with Gunicorn: "gunicorn -c gunicorn.conf.py", check the file "gunicorn.conf.py"
 if __name__ == '__main__':
+    serverHealth.warm_up_in_background(app)
     app.run(host='0.0.0.0', port=PORT, debug=True)
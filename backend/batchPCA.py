@@ -0,0 +1,367 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "batchPCA.py" file does the PCA of many files from the command line, without the frontend
+# It uses the same code as the "generate_*" functions of the backend:
+# ==> the data is prepared by "prepare_numeric_data()" of the file "dataIngestion.py"
+# ==> the StandardScaler and the PCA are done by "fit_pca()" of the file "pcaCache.py", with the same "solver" (check the file "pcaSolvers.py") and "dtype"
+# ==> the top contributors are found by the file "topContributors.py"
+#
+# For each input file, a folder with the name of the file is created in "--output-dir", with:
+# ==> "scores": the coordinates of each sample on each principal component, like the points of the PCA plot
+# ==> "loadings": the loadings of each gene on each principal component, like the loadings table
+# ==> "explained_variance": the share of the variance of each principal component, and the cumulative share, like the scree plot
+# ==> "top_contributors": the top "--top-k" genes of each principal component, with the largest absolute, positive and negative loadings
+# ==> "summary.json": the shape of the data, the solver and the time of each step
+# The tables are written as Parquet, JSON, or both ("--format")
+#
+# The files are done in parallel in a pool of "--workers" processes
+# The memory is limited with "--max-memory-mb": a file is only started when the estimated memory of all the running files stays below this limit
+# ==> the memory of a file is estimated from its size on the disk, check "MEMORY_FACTORS" below, a file bigger than the limit still runs, but alone
+# ==> the biggest files are started first, so the small ones fill the gaps at the end
+#
+# At the end, the throughput is printed (datasets per second, MB per second), and written into "batch_summary.json" in "--output-dir"
+# ==> the time includes the start of the processes, so a batch of a few small files looks slower than it is
+#
+# Run it from the "backend" folder, for example:
+# ==> python batchPCA.py ../database_for_testing/*.csv --output-dir ../batch_results
+# ==> python batchPCA.py data/*.parquet data/*.mtx --output-dir results --workers 4 --format both --n-components 10 --top-k 20 --max-memory-mb 8000
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+import numpy as np
+
+import dataIngestion
+import lazyImports
+import pcaCache
+import pcaSolvers
+import serverHealth
+import topContributors as topContributorsModule
+
+# The big libraries are only imported when they are used for the first time, check the file "lazyImports.py"
+pd = lazyImports.lazy_module('pandas')
+paFeather = lazyImports.lazy_module('pyarrow.feather')
+pq = lazyImports.lazy_module('pyarrow.parquet')
+
+# The file types which can be read, by their extension
+TEXT_EXTENSIONS = ['.csv', '.tsv', '.txt']
+PARQUET_EXTENSIONS = ['.parquet', '.pq']
+ARROW_EXTENSIONS = ['.arrow', '.feather']
+JSON_EXTENSIONS = ['.json']
+MATRIX_MARKET_EXTENSIONS = ['.mtx']
+
+# The memory used by a file is estimated as its size on the disk times this factor
+# ==> a text file has about 10 bytes for each number, which becomes 8 bytes in the DataFrame, then its transposed and standardized copies
+# ==> a Parquet or Arrow file is compressed, so it becomes bigger in memory
+MEMORY_FACTORS = {
+    'text': 3,
+    'json': 3,
+    'parquet': 8,
+    'arrow': 4,
+    'matrix_market': 3,
+}
+
+OUTPUT_FORMATS = ['parquet', 'json', 'both']
+
+
+#########################
+# READ THE INPUT FILES
+#########################
+def get_file_type(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in TEXT_EXTENSIONS:
+        return 'text'
+    if extension in PARQUET_EXTENSIONS:
+        return 'parquet'
+    if extension in ARROW_EXTENSIONS:
+        return 'arrow'
+    if extension in JSON_EXTENSIONS:
+        return 'json'
+    if extension in MATRIX_MARKET_EXTENSIONS:
+        return 'matrix_market'
+    raise ValueError(f'The file "{path}" has an unknown extension, the extension must be one of: '
+                     f'{", ".join(TEXT_EXTENSIONS + PARQUET_EXTENSIONS + ARROW_EXTENSIONS + JSON_EXTENSIONS + MATRIX_MARKET_EXTENSIONS)}')
+
+
+def guess_delimiter(path):
+    # The delimiter of a text file is the one of ",", ";" and tab which appears the most in the first line
+    # A file with ";" as the delimiter usually has "," as the decimal delimiter, like "20,01", which is handled by "prepare_numeric_data()"
+    with open(path, encoding='utf-8', errors='replace') as textFile:
+        firstLine = textFile.readline()
+    return max([',', ';', '\t'], key=firstLine.count)
+
+
+def read_input_file(path):
+    # Read a file into a DataFrame, like the data sent by the frontend: one text column with the gene names, and one column for each sample
+    # The Parquet and Arrow files with the columns "gene", "sample", "value", and the Matrix Market files, are read as sparse data (check the file "dataIngestion.py")
+    fileType = get_file_type(path)
+    if fileType == 'text':
+        return pd.read_csv(path, sep=guess_delimiter(path))
+    if fileType == 'parquet':
+        return dataIngestion.arrow_table_to_dataframe(pq.read_table(path))
+    if fileType == 'arrow':
+        return dataIngestion.arrow_table_to_dataframe(paFeather.read_table(path))
+    if fileType == 'matrix_market':
+        return dataIngestion.read_matrix_market(path)
+    # The JSON file is the same as the body sent by the frontend, a list like [{"locus_tag": "gene_1", "H2O_30m_A": 20.01, ...}, ...]
+    with open(path, 'rb') as jsonFile:
+        return pd.DataFrame(data=json.load(jsonFile))
+
+
+def estimate_memory(path):
+    return os.path.getsize(path) * MEMORY_FACTORS[get_file_type(path)]
+#########################
+# End of READ THE INPUT FILES
+#########################
+
+
+#########################
+# DO ONE FILE, IN A PROCESS OF THE POOL
+#########################
+def start_worker(blasThreads):
+    # Each process of the pool uses "--blas-threads" threads for numpy, so the processes do not fight for the CPUs
+    # "threadpoolctl" is installed with scikit-learn
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(blasThreads)
+    # Import the big libraries now with a small PCA, so the time of the first file does not include them (check the file "serverHealth.py")
+    pcaCache.fit_pca(dataIngestion.prepare_numeric_data(serverHealth.make_warm_up_data()))
+
+
+def write_table(table, folder, name, outputFormat):
+    # Write a table as Parquet, JSON, or both, and return the names of the written files
+    fileNames = []
+    if outputFormat in ('parquet', 'both'):
+        fileNames.append(name + '.parquet')
+        table.to_parquet(os.path.join(folder, fileNames[-1]), index=False)
+    if outputFormat in ('json', 'both'):
+        fileNames.append(name + '.json')
+        table.to_json(os.path.join(folder, fileNames[-1]), orient='records', double_precision=15)
+    return fileNames
+
+
+def build_tables(fittedPCA, n_components, topK):
+    # Make the 4 tables of a fitted PCA, with the same numbers as the "generate_*" functions
+    pcaResult = pcaCache.slice_pca(fittedPCA, n_components=n_components)
+    labels = ['PC' + str(i + 1) for i in range(pcaResult['components'].shape[0])]
+    geneColumnName = fittedPCA['index'].name or 'gene'
+
+    scores = pd.DataFrame(pcaResult['scores'], columns=labels)
+    scores.insert(0, 'sample', [str(column) for column in fittedPCA['columns']])
+
+    loadings = pd.DataFrame(pcaResult['components'].T, columns=labels)
+    loadings.insert(0, geneColumnName, fittedPCA['index'].to_numpy())
+
+    explainedVariance = pd.DataFrame({
+        'principal_component': labels,
+        'explained_variance_ratio': pcaResult['explained_variance_ratio'],
+        'cumulative_explained_variance_ratio': np.cumsum(pcaResult['explained_variance_ratio']),
+    })
+
+    # The same 3 lists as "generateTopFiveContributors.py", in one table with the name of the list in the column "list"
+    contributors = topContributorsModule.find_top_contributors(pcaResult['components'], topK)
+    geneNames = fittedPCA['index'].to_numpy()
+    topContributorRecords = []
+    for listName in ['absolute', 'positive', 'negative']:
+        for record in topContributorsModule.to_records(*contributors[listName], geneNames, geneColumnName, labels):
+            topContributorRecords.append({'list': listName, **record})
+    topContributorsTable = pd.DataFrame(topContributorRecords, columns=['list', 'Principal component', geneColumnName, 'Loadings'])
+
+    return {
+        'scores': scores,
+        'loadings': loadings,
+        'explained_variance': explainedVariance,
+        'top_contributors': topContributorsTable,
+    }
+
+
+def process_file(path, outputFolder, options):
+    # Do the PCA of one file and write its results into "outputFolder"
+    # An error does not stop the batch, it is returned and shown in the summary
+    result = {'input': path, 'output': outputFolder, 'input_bytes': os.path.getsize(path)}
+    stepSeconds = {}
+    try:
+        start = time.perf_counter()
+        initialData = read_input_file(path)
+        stepSeconds['read'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        convertedData = dataIngestion.prepare_numeric_data(initialData, dtype=options['dtype'])
+        del initialData
+        stepSeconds['coerce'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fittedPCA = pcaCache.fit_pca(convertedData, solver=options['solver'], dtype=options['dtype'])
+        stepSeconds['fit'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        os.makedirs(outputFolder, exist_ok=True)
+        files = []
+        for name, table in build_tables(fittedPCA, options['n_components'], options['top_k']).items():
+            files += write_table(table, outputFolder, name, options['format'])
+        result.update({
+            'genes': convertedData.shape[0],
+            'samples': convertedData.shape[1],
+            'solver': getattr(fittedPCA['pca'], 'solver', options['solver']),
+            'files': files,
+        })
+        with open(os.path.join(outputFolder, 'summary.json'), 'w') as summaryFile:
+            json.dump({**result, 'step_seconds': stepSeconds}, summaryFile, indent=2)
+        stepSeconds['write'] = time.perf_counter() - start
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+    result['step_seconds'] = stepSeconds
+    return result
+#########################
+# End of DO ONE FILE, IN A PROCESS OF THE POOL
+#########################
+
+
+def get_output_folders(paths, outputDir):
+    # One folder for each input file, with the name of the file without its extension
+    # When 2 files have the same name (in different folders), a number is added, like "data", "data_2"
+    folders = []
+    usedNames = set()
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        uniqueName = name
+        number = 2
+        while uniqueName in usedNames:
+            uniqueName = f'{name}_{number}'
+            number += 1
+        usedNames.add(uniqueName)
+        folders.append(os.path.join(outputDir, uniqueName))
+    return folders
+
+
+def run_batch(paths, outputDir, options, workers, maxMemoryBytes, blasThreads):
+    # Do all the files in a pool of processes, check the NOTICE above, and return the result of each file in the order they finished
+    folders = dict(zip(paths, get_output_folders(paths, outputDir)))
+    # The biggest files first
+    pending = deque(sorted(paths, key=estimate_memory, reverse=True))
+    running = {}
+    results = []
+
+    # The processes are started with "spawn", like the jobs of the backend (check the file "jobQueue.py")
+    # Each process is replaced after "--tasks-per-worker" files, so the memory of the big files is given back to the system
+    # ==> "max_tasks_per_child" only exists since Python 3.11, before that the processes are kept until the end
+    poolOptions = {}
+    if sys.version_info >= (3, 11):
+        poolOptions['max_tasks_per_child'] = options['tasks_per_worker']
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'), initializer=start_worker,
+                             initargs=(blasThreads,), **poolOptions) as executor:
+        while pending or running:
+            # Start the next files while there is a free process and enough memory, at least one file always runs
+            while pending and len(running) < workers and (
+                    not running or sum(running.values()) + estimate_memory(pending[0]) <= maxMemoryBytes):
+                path = pending.popleft()
+                running[executor.submit(process_file, path, folders[path], options)] = estimate_memory(path)
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                del running[future]
+                result = future.result()
+                results.append(result)
+                print_file_result(result)
+    return results
+
+
+def print_file_result(result):
+    if 'error' in result:
+        print(f'FAILED {result["input"]}: {result["error"]}', flush=True)
+        return
+    steps = ', '.join(f'{name} {seconds:.2f} s' for name, seconds in result['step_seconds'].items())
+    print(f'OK     {result["input"]}: {result["genes"]} genes x {result["samples"]} samples, {steps}', flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Do the PCA of many files, with the same code as the backend')
+    parser.add_argument('inputs', nargs='+', help='the input files (CSV, TSV, Parquet, Arrow, JSON or Matrix Market)')
+    parser.add_argument('--output-dir', required=True, help='the folder where the results are written, one folder for each input file')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='parquet', help='the format of the tables')
+    parser.add_argument('--solver', choices=pcaSolvers.SOLVERS, default='auto', help='check the file "pcaSolvers.py"')
+    parser.add_argument('--dtype', choices=pcaCache.DTYPES, default=pcaCache.DEFAULT_DTYPE,
+                        help='the type of the numbers, float32 uses half of the memory, check the file "pcaCache.py"')
+    parser.add_argument('--n-components', type=int, default=8, help='the number of principal components in the tables')
+    parser.add_argument('--top-k', type=int, default=5, help='the number of top contributors of each principal component')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='the number of processes')
+    parser.add_argument('--blas-threads', type=int, default=1, help='the number of threads of numpy in each process')
+    parser.add_argument('--max-memory-mb', type=float, default=4096, help='the estimated memory of all the running files together')
+    parser.add_argument('--tasks-per-worker', type=int, default=20, help='each process is replaced after this number of files (Python 3.11 and later)')
+    arguments = parser.parse_args()
+
+    missingFiles = [path for path in arguments.inputs if not os.path.isfile(path)]
+    if missingFiles:
+        parser.error(f'These files do not exist: {", ".join(missingFiles)}')
+    for path in arguments.inputs:
+        try:
+            get_file_type(path)
+        except ValueError as error:
+            parser.error(str(error))
+    os.makedirs(arguments.output_dir, exist_ok=True)
+
+    options = {
+        'format': arguments.format,
+        'solver': arguments.solver,
+        'dtype': arguments.dtype,
+        'n_components': arguments.n_components,
+        'top_k': arguments.top_k,
+        'tasks_per_worker': arguments.tasks_per_worker,
+    }
+    workers = max(1, min(arguments.workers, len(arguments.inputs)))
+
+    start = time.perf_counter()
+    results = run_batch(arguments.inputs, arguments.output_dir, options, workers, arguments.max_memory_mb * 1024 * 1024, arguments.blas_threads)
+    elapsedSeconds = time.perf_counter() - start
+
+    #########################
+    # THE THROUGHPUT
+    #########################
+    succeeded = [result for result in results if 'error' not in result]
+    inputMegabytes = sum(result['input_bytes'] for result in succeeded) / 1024 / 1024
+    summary = {
+        'datasets': len(results),
+        'succeeded': len(succeeded),
+        'failed': len(results) - len(succeeded),
+        'workers': workers,
+        'seconds': elapsedSeconds,
+        'datasets_per_second': len(succeeded) / elapsedSeconds,
+        'input_megabytes': inputMegabytes,
+        'megabytes_per_second': inputMegabytes / elapsedSeconds,
+        'cells_per_second': sum(result['genes'] * result['samples'] for result in succeeded) / elapsedSeconds,
+        'options': options,
+        'results': results,
+    }
+    with open(os.path.join(arguments.output_dir, 'batch_summary.json'), 'w') as summaryFile:
+        json.dump(summary, summaryFile, indent=2)
+
+    print(f'\n{summary["succeeded"]} of {summary["datasets"]} datasets in {elapsedSeconds:.2f} s with {workers} processes')
+    print(f'==> {summary["datasets_per_second"]:.2f} datasets/s, {summary["megabytes_per_second"]:.2f} MB/s, '
+          f'{summary["cells_per_second"] / 1e6:.2f} million numbers/s')
+    print(f'The summary is written into {os.path.join(arguments.output_dir, "batch_summary.json")}')
+    #########################
+    # End of THE THROUGHPUT
+    #########################
+
+    sys.exit(1 if summary['failed'] else 0)
+
+
+if __name__ == '__main__':
+    main()
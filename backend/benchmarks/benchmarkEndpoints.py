@@ -0,0 +1,240 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark measures the "generate_*" endpoints on a grid of synthetic datasets: number of genes x number of samples x decimal delimiter ("." or ",")
+# The endpoints are called with the test client of Flask, so the whole request is measured, from the JSON body to the JSON result
+# For each endpoint, it reports:
+# ==> the time of each stage of the request, from the "Server-Timing" header of the response (check the file "requestMetrics.py"):
+#     "parse" (read the JSON body), "coerce" (turn the text into numbers, check the file "dataIngestion.py"), "hash" (the hash of the data, check the file "pcaCache.py"),
+#     "scale" (StandardScaler), "fit" (the PCA solver), "serialize" (write the JSON result), and "other" (the rest, mostly making the plots and tables)
+# ==> the peak memory (RSS) during the request, and the size of the request body and of the result
+# Each endpoint is measured twice:
+# ==> "cold": the data is sent in the body and the cache of the PCA is empty, like the first click in the frontend
+# ==> "warm": the data is an uploaded dataset ("dataset_id") which is already fitted, like the next clicks
+#
+# Each dataset of the grid is measured in a new Python process, so one dataset does not change the memory of the others
+# The results are written into a JSON file ("--output"), with the commit and the versions of the libraries
+# ==> two result files can be compared with "--compare", to find the regressions between two commits
+#
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkEndpoints
+# ==> python -m benchmarks.benchmarkEndpoints --genes 1000 10000 --samples 6 100 --decimals . --output before.json
+# ==> python -m benchmarks.benchmarkEndpoints --genes 1000 10000 --samples 6 100 --decimals . --output after.json --compare before.json
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+from benchmarks.benchmarkIngestion import make_synthetic_data
+from benchmarks.benchmarkRequestFormats import peak_rss_megabytes
+
+ENDPOINTS = [
+    '/api/generate_pca',
+    '/api/generate_pca_3d',
+    '/api/generate_scree_plot',
+    '/api/generate_loadings_table',
+    '/api/generate_top_five_contributors',
+]
+
+STAGES = ['parse', 'coerce', 'hash', 'scale', 'fit', 'serialize', 'other']
+
+
+def reset_peak_rss():
+    # On Linux, writing "5" into "/proc/self/clear_refs" resets "VmHWM", so the peak memory of each request can be measured alone
+    # If it is not possible, the peak memory is the peak of the whole process until now
+    try:
+        with open('/proc/self/clear_refs', 'w') as clearRefs:
+            clearRefs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def parse_server_timing(header):
+    # Read the times of the stages from the "Server-Timing" header, like "parse;dur=12.1, coerce;dur=30.5, total;dur=301.0", check the file "requestMetrics.py"
+    stageTimes = {}
+    for item in header.split(','):
+        name, _, duration = item.strip().partition(';dur=')
+        if duration:
+            stageTimes[name] = float(duration) / 1000
+    return stageTimes
+
+
+def measure_request(client, method, url, body):
+    isPeakReset = reset_peak_rss()
+    rssBefore = peak_rss_megabytes()
+    start = time.perf_counter()
+    response = client.open(url, method=method, data=body, content_type='application/json')
+    totalTime = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} returned {response.status_code}: {response.get_data(as_text=True)[:500]}')
+
+    stageTimes = parse_server_timing(response.headers.get('Server-Timing', ''))
+    stages = {stage: stageTimes.get(stage, 0.0) for stage in STAGES}
+    stages['other'] = totalTime - sum(stages[stage] for stage in STAGES if stage != 'other')
+    return {
+        'total_seconds': totalTime,
+        'stage_seconds': stages,
+        'peak_rss_mb': peak_rss_megabytes(),
+        'peak_rss_increase_mb': peak_rss_megabytes() - rssBefore if isPeakReset else None,
+        'response_bytes': len(response.get_data()),
+    }
+
+
+def run_grid_point(numberOfGenes, numberOfSamples, decimalDelimiter, endpoints):
+    # Measure all the endpoints for one dataset of the grid, in this process
+    # One JSON line is printed for each endpoint and each mode, they are read by "main()"
+    import app
+    import pcaCache
+    import serverHealth
+
+    # The warm-up is done before measuring, like in production, so it does not run in the background during the measures (check the file "serverHealth.py")
+    serverHealth.warm_up(app.app)
+    client = app.app.test_client()
+
+    syntheticData = make_synthetic_data(numberOfGenes, numberOfSamples, decimalDelimiter)
+    body = json.dumps(syntheticData.to_dict('records')).encode()
+    del syntheticData
+
+    datasetId = None
+    for endpoint in endpoints:
+        pcaCache.clear_cache()
+        cold = measure_request(client, 'POST', endpoint, body)
+
+        if datasetId is None:
+            datasetId = client.post('/api/datasets', data=body, content_type='application/json').get_json()['dataset_id']
+        # The first request with the "dataset_id" fits the PCA again (the cache was cleared above), the second one is measured
+        client.get(f'{endpoint}?dataset_id={datasetId}')
+        warm = measure_request(client, 'GET', f'{endpoint}?dataset_id={datasetId}', None)
+
+        for mode, result in [('cold', cold), ('warm', warm)]:
+            print(json.dumps({
+                'genes': numberOfGenes,
+                'samples': numberOfSamples,
+                'decimal': decimalDelimiter,
+                'endpoint': endpoint,
+                'mode': mode,
+                'request_bytes': len(body) if mode == 'cold' else 0,
+                **result,
+            }), flush=True)
+
+
+def get_environment():
+    # The commit and the versions, so the result files of two commits can be compared
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'scikit-learn': sklearn.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def get_result_key(result):
+    return (result['genes'], result['samples'], result['decimal'], result['endpoint'], result['mode'])
+
+
+def print_comparison(results, previousPath):
+    # Print the ratio "this run / previous run" of the time and of the peak memory, a ratio above 1 is slower or bigger
+    with open(previousPath) as previousFile:
+        previous = json.load(previousFile)
+    previousResults = {get_result_key(result): result for result in previous['results']}
+    print(f'\nCompared with {previousPath} (commit {previous["environment"].get("commit")})')
+    print(f'{"genes":>7} {"samples":>7} {"dec":>3} {"endpoint":<36} {"mode":>4} {"time":>7} {"memory":>7}')
+    for result in results:
+        previousResult = previousResults.get(get_result_key(result))
+        if previousResult is None:
+            continue
+        timeRatio = result['total_seconds'] / max(previousResult['total_seconds'], 1e-9)
+        memoryRatio = (result['peak_rss_mb'] / previousResult['peak_rss_mb']) if previousResult['peak_rss_mb'] else float('nan')
+        print(f'{result["genes"]:>7} {result["samples"]:>7} {result["decimal"]:>3} {result["endpoint"]:<36} {result["mode"]:>4} {timeRatio:>6.2f}x {memoryRatio:>6.2f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the "generate_*" endpoints on a grid of dataset shapes')
+    parser.add_argument('--genes', type=int, nargs='+', default=[1000, 10000, 50000, 200000])
+    parser.add_argument('--samples', type=int, nargs='+', default=[6, 18, 100, 1000])
+    parser.add_argument('--decimals', nargs='+', default=['.', ','], choices=['.', ','])
+    parser.add_argument('--endpoints', nargs='+', default=ENDPOINTS, choices=ENDPOINTS)
+    parser.add_argument('--max-cells', type=int, default=20_000_000,
+                        help='the datasets with more genes x samples are skipped, 0 to measure all of them')
+    parser.add_argument('--output', default='benchmark_endpoints.json')
+    parser.add_argument('--compare', help='a result file of a previous run, to print the ratios of the time and of the memory')
+    parser.add_argument('--run', nargs=3, metavar=('GENES', 'SAMPLES', 'DECIMAL'), help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.run:
+        run_grid_point(int(arguments.run[0]), int(arguments.run[1]), arguments.run[2], arguments.endpoints)
+        return
+
+    results = []
+    skipped = []
+    print(f'{"genes":>7} {"samples":>7} {"dec":>3} {"endpoint":<36} {"mode":>4} {"total (s)":>9} '
+          + ' '.join(f'{stage:>9}' for stage in STAGES) + f' {"peak (MB)":>9} {"result (KB)":>11}')
+    for numberOfGenes in arguments.genes:
+        for numberOfSamples in arguments.samples:
+            if arguments.max_cells and numberOfGenes * numberOfSamples > arguments.max_cells:
+                skipped.append({'genes': numberOfGenes, 'samples': numberOfSamples, 'reason': f'more than --max-cells {arguments.max_cells}'})
+                continue
+            for decimalDelimiter in arguments.decimals:
+                # Each dataset is measured in a new process, check the NOTICE above
+                process = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.benchmarkEndpoints', '--endpoints', *arguments.endpoints,
+                     '--run', str(numberOfGenes), str(numberOfSamples), decimalDelimiter],
+                    capture_output=True, text=True)
+                if process.returncode != 0:
+                    skipped.append({'genes': numberOfGenes, 'samples': numberOfSamples, 'decimal': decimalDelimiter,
+                                    'reason': process.stderr.strip().splitlines()[-1] if process.stderr.strip() else f'exit code {process.returncode}'})
+                    print(f'{numberOfGenes:>7} {numberOfSamples:>7} {decimalDelimiter:>3} failed: {skipped[-1]["reason"]}')
+                    continue
+                for line in process.stdout.splitlines():
+                    if not line.startswith('{'):
+                        continue
+                    result = json.loads(line)
+                    results.append(result)
+                    print(f'{numberOfGenes:>7} {numberOfSamples:>7} {decimalDelimiter:>3} {result["endpoint"]:<36} {result["mode"]:>4} '
+                          f'{result["total_seconds"]:>9.3f} '
+                          + ' '.join(f'{result["stage_seconds"][stage]:>9.3f}' for stage in STAGES)
+                          + f' {result["peak_rss_mb"]:>9.0f} {result["response_bytes"] / 1024:>11.0f}')
+
+    with open(arguments.output, 'w') as outputFile:
+        json.dump({'environment': get_environment(), 'results': results, 'skipped': skipped}, outputFile, indent=2)
+    print(f'\nThe results are written into {arguments.output}')
+    for skippedPoint in skipped:
+        print(f'Skipped: {skippedPoint}')
+
+    if arguments.compare:
+        print_comparison(results, arguments.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark compares the PCA in float64 and in float32 ("?dtype=float32", check the file "pcaCache.py"), for different shapes of data and each solver
+# For each case, it reports:
+# ==> the memory of the "convertedData", the time (the best of "--runs" runs) and the peak memory (measured with "tracemalloc") of the StandardScaler and the PCA
+# ==> how far the float32 result is from the float64 result, for the first "--compared-components" principal components:
+#     the largest difference of the explained variance ratio, and the largest difference of the scores and of the loadings, relative to their largest value
+#     (the sign of each principal component is aligned before comparing)
+# It is also the accuracy check of the float32 mode: the script exits with the code 1 when a difference is bigger than "--max-ratio-deviation" or "--max-deviation"
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkFloat32
+# ==> python -m benchmarks.benchmarkFloat32 --shapes 24x60000 200x60000 --solvers gram randomized --runs 5
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import pcaCache
+from benchmarks.benchmarkSolvers import make_standardized_data
+
+# The shapes are "samples x genes", like in the file "benchmarkSolvers.py"
+DEFAULT_SHAPES = ['18x2000', '24x20000', '96x60000', '200x60000']
+DEFAULT_SOLVERS = ['auto', 'sklearn', 'gram', 'randomized', 'svds']
+
+
+def make_converted_data(numberOfSamples, numberOfGenes, dtype):
+    # The "convertedData" of "prepare_numeric_data()" (check the file "dataIngestion.py"): one row for each gene, one column for each sample
+    # The values are moved and scaled, so the StandardScaler has something to do
+    data = make_standardized_data(numberOfSamples, numberOfGenes).T * 3 + 10
+    return pd.DataFrame(
+        np.asfortranarray(data, dtype=dtype),
+        index=pd.Index([f'gene_{i + 1}' for i in range(numberOfGenes)], name='gene'),
+        columns=[f'sample_{i + 1}' for i in range(numberOfSamples)],
+    )
+
+
+def measure_fit(convertedData, solver, dtype, runs):
+    # The best time of "runs" runs, then the peak memory in one more run, because "tracemalloc" makes the code slower
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fittedPCA = pcaCache.fit_pca(convertedData, solver=solver, dtype=dtype)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    pcaCache.fit_pca(convertedData, solver=solver, dtype=dtype)
+    peakBytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return fittedPCA, min(times), peakBytes
+
+
+def compare_fits(fittedPCA, referencePCA, n_components):
+    # The differences between the float32 and the float64 results, check the NOTICE above
+    n = min(n_components, len(fittedPCA['explained_variance_ratio']), len(referencePCA['explained_variance_ratio']))
+    components = fittedPCA['components'][:n].astype(np.float64)
+    referenceComponents = referencePCA['components'][:n]
+    signs = np.sign(np.sum(components * referenceComponents, axis=1))
+    return {
+        'explained_variance_ratio': np.max(np.abs(fittedPCA['explained_variance_ratio'][:n] - referencePCA['explained_variance_ratio'][:n])),
+        'scores': np.max(np.abs(fittedPCA['scores'][:, :n] * signs - referencePCA['scores'][:, :n])) / np.max(np.abs(referencePCA['scores'][:, :n])),
+        'components': np.max(np.abs(components * signs[:, np.newaxis] - referenceComponents)) / np.max(np.abs(referenceComponents)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark and check the accuracy of the PCA in float32')
+    parser.add_argument('--shapes', nargs='+', default=DEFAULT_SHAPES,
+                        help='Shapes of the data as "samplesxgenes", like 24x20000')
+    parser.add_argument('--solvers', nargs='+', default=DEFAULT_SOLVERS)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--compared-components', type=int, default=8,
+                        help='the number of principal components which are compared, the plots and tables use at most 8')
+    parser.add_argument('--max-ratio-deviation', type=float, default=1e-4,
+                        help='the largest accepted difference of the explained variance ratio')
+    parser.add_argument('--max-deviation', type=float, default=1e-3,
+                        help='the largest accepted difference of the scores and of the loadings, relative to their largest value')
+    arguments = parser.parse_args()
+
+    # Warm up, so the first time does not include the import of scikit-learn and scipy
+    pcaCache.fit_pca(make_converted_data(10, 100, np.float64))
+
+    isFailed = False
+    print(f'{"shape":>12} {"solver":>16} {"data (MB)":>14} {"time (s)":>15} {"speed-up":>9} {"peak (MB)":>15} {"memory":>7} '
+          f'{"diff ratio":>11} {"diff scores":>12} {"diff loadings":>14}')
+    for shape in arguments.shapes:
+        numberOfSamples, numberOfGenes = (int(value) for value in shape.split('x'))
+        data64 = make_converted_data(numberOfSamples, numberOfGenes, np.float64)
+        data32 = data64.astype(np.float32)
+        dataMegabytes = [data.memory_usage(index=False).sum() / 1024 / 1024 for data in (data64, data32)]
+
+        for solver in arguments.solvers:
+            fit64, time64, peak64 = measure_fit(data64, solver, 'float64', arguments.runs)
+            fit32, time32, peak32 = measure_fit(data32, solver, 'float32', arguments.runs)
+            differences = compare_fits(fit32, fit64, arguments.compared_components)
+            isCaseFailed = (differences['explained_variance_ratio'] > arguments.max_ratio_deviation
+                            or max(differences['scores'], differences['components']) > arguments.max_deviation)
+            isFailed = isFailed or isCaseFailed
+
+            name = f'auto={fit64["pca"].solver}' if solver == 'auto' else solver
+            print(f'{shape:>12} {name:>16} {dataMegabytes[0]:>6.1f} -> {dataMegabytes[1]:>4.1f} {time64:>6.3f} -> {time32:>5.3f} '
+                  f'{time64 / time32:>8.2f}x {peak64 / 1024 / 1024:>6.1f} -> {peak32 / 1024 / 1024:>5.1f} {peak32 / peak64:>6.0%} '
+                  f'{differences["explained_variance_ratio"]:>11.2e} {differences["scores"]:>12.2e} {differences["components"]:>14.2e}'
+                  + ('  FAILED' if isCaseFailed else ''))
+
+    print(f'\nThe accepted differences: {arguments.max_ratio_deviation:.0e} for the explained variance ratio, '
+          f'{arguments.max_deviation:.0e} for the scores and the loadings')
+    print('==> FAILED' if isFailed else '==> OK')
+    sys.exit(1 if isFailed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark compares the old preparation steps, which were copied in every "generate_*" function, with "prepare_numeric_data()" in the file "dataIngestion.py"
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkIngestion --genes 60000 --samples 200
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import dataIngestion
+
+
+def legacy_prepare_numeric_data(convertedData):
+    # This is the code that was in every "generate_*" function before "dataIngestion.py" was created
+    non_numeric_columns = [col for col in convertedData.columns if not dataIngestion.is_number_or_not(
+        convertedData[col].iloc[0])]
+    if len(non_numeric_columns) > 1:
+        convertedData.drop(non_numeric_columns[1:], axis=1, inplace=True)
+    convertedData.set_index(non_numeric_columns[0], inplace=True)
+
+    convertedData = convertedData.replace(',', '.', regex=True)
+    convertedData = convertedData.astype(float)
+    convertedData = convertedData.dropna()
+    return convertedData
+
+
+def make_synthetic_data(numberOfGenes, numberOfSamples, decimalDelimiter, seed=0):
+    # Create a DataFrame which looks like the data sent by the frontend: a "locus_tag" column, a "name" column and one text column per sample
+    randomGenerator = np.random.default_rng(seed)
+    values = randomGenerator.gamma(2.0, 50.0, size=(numberOfGenes, numberOfSamples))
+    data = {
+        'locus_tag': [f'gene_{i}' for i in range(numberOfGenes)],
+        'name': [f'name_{i}' for i in range(numberOfGenes)],
+    }
+    for j in range(numberOfSamples):
+        column = pd.Series(values[:, j]).map('{:.4f}'.format)
+        if decimalDelimiter == ',':
+            column = column.str.replace('.', ',', regex=False)
+        data[f'Condition{j % 6}_30m_{j}'] = column.to_numpy()
+    return pd.DataFrame(data)
+
+
+def time_function(function, makeInput, repeat):
+    # Return the best time of "repeat" runs, the input is created again for every run because the old code modifies it in place
+    bestTime = float('inf')
+    result = None
+    for _ in range(repeat):
+        inputData = makeInput()
+        start = time.perf_counter()
+        result = function(inputData)
+        bestTime = min(bestTime, time.perf_counter() - start)
+    return bestTime, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the numeric data preparation')
+    parser.add_argument('--genes', type=int, default=60000)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--decimal', choices=[',', '.'], default=',')
+    parser.add_argument('--repeat', type=int, default=3)
+    arguments = parser.parse_args()
+
+    syntheticData = make_synthetic_data(arguments.genes, arguments.samples, arguments.decimal)
+
+    legacyTime, legacyResult = time_function(
+        legacy_prepare_numeric_data, syntheticData.copy, arguments.repeat)
+    newTime, newResult = time_function(
+        dataIngestion.prepare_numeric_data, syntheticData.copy, arguments.repeat)
+
+    # Both ways must give the same numbers
+    np.testing.assert_allclose(newResult.to_numpy(), legacyResult.to_numpy())
+
+    print(f'Data: {arguments.genes} genes x {arguments.samples} samples, decimal delimiter "{arguments.decimal}"')
+    print(f'Old preparation (regex replace + astype): {legacyTime:.3f} s')
+    print(f'prepare_numeric_data():                   {newTime:.3f} s')
+    print(f'Speed-up: {legacyTime / newTime:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark compares the JSON encoders of the file "jsonEncoding.py" with a result as big as the loadings table
+# ==> "default": the normal encoder of Flask, as before
+# ==> "orjson": the encoder with "orjson", if it is installed
+# Each encoder is measured without rounding, then with "?precision=6" and "?precision=4", and the size of the JSON is printed
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkJsonEncoding
+# ==> python -m benchmarks.benchmarkJsonEncoding --genes 20000 100000 --precision 4 6
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import time
+
+import numpy as np
+from flask import Flask
+
+import jsonEncoding
+
+
+def make_loadings_table(numberOfGenes, numberOfComponents, precision, randomGenerator):
+    # The same records as "build_loadings_table()" in the file "generateLoadingsTable.py", like [{"Gene": "gene_0", "PC1": 0.042, ...}, ...]
+    loadings = randomGenerator.normal(scale=0.01, size=(numberOfGenes, numberOfComponents))
+    if precision is not None:
+        loadings = jsonEncoding.round_significant(loadings, precision)
+    labelPrincipalComponents = ['PC' + str(i+1) for i in range(numberOfComponents)]
+    return [
+        {'Gene': f'gene_{i}', **dict(zip(labelPrincipalComponents, values))}
+        for i, values in enumerate(loadings.tolist())
+    ]
+
+
+def best_time(function, repeat):
+    bestTime = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        bestTime = min(bestTime, time.perf_counter() - start)
+    return bestTime, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the JSON encoders and the rounding of the numbers')
+    parser.add_argument('--genes', type=int, nargs='+', default=[20000, 100000])
+    parser.add_argument('--components', type=int, default=4)
+    parser.add_argument('--precision', type=int, nargs='+', default=[6, 4])
+    parser.add_argument('--repeat', type=int, default=3)
+    arguments = parser.parse_args()
+
+    app = Flask(__name__)
+    providers = {'default': jsonEncoding.NumpyJSONProvider(app)}
+    if jsonEncoding.orjson is not None:
+        providers['orjson'] = jsonEncoding.OrjsonProvider(app)
+    else:
+        print('"orjson" is not installed, only the default encoder is measured')
+
+    randomGenerator = np.random.default_rng(0)
+    print(f'{"genes":>8} {"precision":>9} {"encoder":>8} {"time":>11} {"size":>10}')
+    for numberOfGenes in arguments.genes:
+        for precision in [None] + arguments.precision:
+            table = make_loadings_table(numberOfGenes, arguments.components, precision, randomGenerator)
+            with app.app_context():
+                results = {}
+                for name, provider in providers.items():
+                    encodeTime, response = best_time(lambda: provider.response(table), arguments.repeat)
+                    results[name] = response.get_data()
+                    print(f'{numberOfGenes:>8} {str(precision):>9} {name:>8} {encodeTime * 1000:>8.1f} ms {len(response.get_data()) / 1024:>7.0f} KB')
+            # Both encoders must write the same values
+            if len(results) == 2:
+                assert providers['default'].loads(results['default']) == providers['default'].loads(results['orjson'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark compares the whole loadings table ("/api/generate_loadings_table") with one page of it ("/api/query_loadings_table")
+# Both use an uploaded dataset (check the file "datasetSessions.py"), so only the time of the table itself is measured, not the PCA
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkLoadingsQuery
+# ==> python -m benchmarks.benchmarkLoadingsQuery --genes 100000 --samples 24
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import time
+
+import serverHealth
+from app import app
+from benchmarks.benchmarkIngestion import make_synthetic_data
+
+QUERIES = [
+    'page=1&page_size=50',
+    'page=100&page_size=50&sort_by=PC1',
+    'page=1&page_size=50&sort_by=PC2&abs=true',
+    'page=1&page_size=50&sort_by=gene&order=asc',
+    'page=1&page_size=50&sort_by=PC1&search=gene_12',
+]
+
+
+def time_request(client, url, repeat, method='get'):
+    bestTime = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = getattr(client, method)(url)
+        bestTime = min(bestTime, time.perf_counter() - start)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return bestTime, len(response.get_data())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the paginated loadings table')
+    parser.add_argument('--genes', type=int, default=100000)
+    parser.add_argument('--samples', type=int, default=24)
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+
+    # Warm up first, otherwise the first request starts the warm-up in the background, check the file "serverHealth.py"
+    serverHealth.warm_up(app)
+    client = app.test_client()
+    syntheticData = make_synthetic_data(arguments.genes, arguments.samples, '.')
+    datasetId = client.post('/api/datasets', json=syntheticData.to_dict('records')).get_json()['dataset_id']
+
+    # The first calls fit the PCA and make the index of the loadings, they are not measured
+    client.post(f'/api/generate_loadings_table?dataset_id={datasetId}')
+    start = time.perf_counter()
+    client.get(f'/api/query_loadings_table?dataset_id={datasetId}')
+    print(f'Data: {arguments.genes} genes x {arguments.samples} samples, index of the loadings made in {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    fullTime, fullBytes = time_request(
+        client, f'/api/generate_loadings_table?dataset_id={datasetId}', arguments.repeat, method='post')
+    print(f'{"whole table":<45} {fullTime * 1000:>9.2f} ms {fullBytes / 1024:>10.1f} KB')
+    for query in QUERIES:
+        pageTime, pageBytes = time_request(
+            client, f'/api/query_loadings_table?dataset_id={datasetId}&{query}', arguments.repeat)
+        print(f'{query:<45} {pageTime * 1000:>9.2f} ms {pageBytes / 1024:>10.1f} KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark starts several worker processes which all need the same dataset and its fitted PCA, like the workers of a production server
+# It compares:
+# ==> "parse": each worker reads and prepares the data itself, then fits the PCA, as without the store
+# ==> "store": the data and the PCA are saved once in the store of the file "matrixStore.py", then each worker opens them with "mmap_mode"
+# For each worker, it reports the time and the memory: "RSS" counts the shared pages of the files in every worker, "PSS" divides them between the workers
+# The sum of the PSS of all workers is the real memory used by all of them together (PSS is only available on Linux)
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkMatrixStore --genes 200000 --samples 100 --workers 4
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.benchmarkIngestion import make_synthetic_data
+
+
+def read_memory_megabytes():
+    # Return the RSS and the PSS of this process in MB, from "/proc/self/smaps_rollup" (Linux only)
+    memory = {'Rss': 0, 'Pss': 0}
+    if os.path.exists('/proc/self/smaps_rollup'):
+        with open('/proc/self/smaps_rollup') as smaps:
+            for line in smaps:
+                key = line.split(':')[0]
+                if key in memory:
+                    memory[key] = int(line.split()[1]) / 1024
+    return memory['Rss'], memory['Pss']
+
+
+def run_worker(mode, parquetPath, datasetHash, readyPath):
+    # Imported here, so "PCA_MATRIX_STORE_DIR" is already set by the parent process
+    import dataIngestion
+    import matrixStore
+    import pcaCache
+
+    start = time.perf_counter()
+    if mode == 'parse':
+        convertedData = dataIngestion.prepare_numeric_data(pd.read_parquet(parquetPath))
+        fittedPCA = pcaCache.fit_pca(convertedData)
+    else:
+        convertedData = matrixStore.load_dataset(datasetHash)
+        fittedPCA = matrixStore.load_fit(datasetHash, 'auto', convertedData)
+    # Touch all the numbers, like a request which uses the whole dataset and the whole PCA
+    float(convertedData.to_numpy().sum() + fittedPCA['scores'].sum() + fittedPCA['components'].sum())
+    totalTime = time.perf_counter() - start
+
+    # Wait until all the workers are loaded, so the shared pages are counted by all of them at the same time
+    open(readyPath + str(os.getpid()), 'w').close()
+    while len([name for name in os.listdir(os.path.dirname(readyPath)) if name.startswith(os.path.basename(readyPath))]) < int(os.environ['BENCHMARK_WORKERS']):
+        time.sleep(0.05)
+    rss, pss = read_memory_megabytes()
+    print(json.dumps({'seconds': totalTime, 'rss_mb': rss, 'pss_mb': pss}))
+    time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the on-disk matrix store with several workers')
+    parser.add_argument('--genes', type=int, default=100000)
+    parser.add_argument('--samples', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--worker', nargs=4, metavar=('MODE', 'PARQUET', 'HASH', 'READY'), help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.worker:
+        run_worker(*arguments.worker)
+        return
+
+    with tempfile.TemporaryDirectory() as temporaryFolder:
+        storeDir = os.path.join(temporaryFolder, 'store')
+        os.environ['PCA_MATRIX_STORE_DIR'] = storeDir
+        os.environ['BENCHMARK_WORKERS'] = str(arguments.workers)
+        import dataIngestion
+        import matrixStore
+        import pcaCache
+
+        syntheticData = make_synthetic_data(arguments.genes, arguments.samples, '.')
+        for column in syntheticData.columns[2:]:
+            syntheticData[column] = syntheticData[column].astype(float)
+        parquetPath = os.path.join(temporaryFolder, 'data.parquet')
+        syntheticData.to_parquet(parquetPath, index=False)
+
+        # Fill the store once, like the first request would do
+        convertedData = dataIngestion.prepare_numeric_data(syntheticData)
+        datasetHash = pcaCache.hash_converted_data(convertedData)
+        matrixStore.save_dataset(datasetHash, convertedData)
+        matrixStore.save_fit(datasetHash, 'auto', pcaCache.fit_pca(convertedData))
+
+        print(f'Data: {arguments.genes} genes x {arguments.samples} samples, {arguments.workers} workers')
+        print(f'{"mode":>6} {"time per worker (s)":>20} {"RSS per worker (MB)":>20} {"sum of PSS (MB)":>16}')
+        for mode in ['parse', 'store']:
+            readyPath = os.path.join(temporaryFolder, f'ready-{mode}-')
+            workers = [
+                subprocess.Popen(
+                    [sys.executable, '-m', 'benchmarks.benchmarkMatrixStore', '--worker', mode, parquetPath, datasetHash, readyPath],
+                    stdout=subprocess.PIPE, text=True)
+                for _ in range(arguments.workers)
+            ]
+            results = [json.loads(worker.communicate()[0]) for worker in workers]
+            print(f'{mode:>6} {sum(result["seconds"] for result in results) / len(results):20.2f} '
+                  f'{sum(result["rss_mb"] for result in results) / len(results):20.0f} {sum(result["pss_mb"] for result in results):16.0f}')
+
+
+if __name__ == '__main__':
+    main()
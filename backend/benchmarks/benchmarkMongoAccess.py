@@ -0,0 +1,111 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark measures the latency of reading a Micromix document with the functions in the file "mongoAccess.py", with many requests at the same time
+# It compares:
+# ==> reading the whole document, and reading only the "filtered_dataframe" field (projection)
+# ==> the normal functions in a pool of threads, and the async functions
+# By default, it uses "mongomock" as an in-process stand-in for MongoDB, so it can run without MongoDB
+# To use a real MongoDB, give its address, for example:
+# ==> python -m benchmarks.benchmarkMongoAccess --uri mongodb://localhost:27017
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import mongoAccess
+from benchmarks.benchmarkIngestion import make_synthetic_data
+
+
+def make_document(numberOfGenes, numberOfSamples):
+    # A document like the ones created by Micromix, with the dataframe stored as Parquet bytes
+    # The "transformed_dataframe" is also stored, so reading the whole document reads twice as many bytes
+    buffer = io.BytesIO()
+    make_synthetic_data(numberOfGenes, numberOfSamples, '.').to_parquet(buffer, index=False)
+    dataframeBytes = buffer.getvalue()
+    return {
+        'filtered_dataframe': dataframeBytes,
+        'transformed_dataframe': dataframeBytes,
+        'config': {'plugin': 'pca'},
+    }
+
+
+def summarize(latencies, totalTime):
+    latencies = np.array(latencies) * 1000
+    return (f'p50 {np.percentile(latencies, 50):8.2f} ms   p95 {np.percentile(latencies, 95):8.2f} ms   '
+            f'p99 {np.percentile(latencies, 99):8.2f} ms   {len(latencies) / totalTime:8.1f} reads/s')
+
+
+def run_threads(objectId, fields, concurrency, numberOfReads):
+    def timed_read(_):
+        start = time.perf_counter()
+        mongoAccess.find_visualization(objectId, fields)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed_read, range(numberOfReads)))
+    return latencies, time.perf_counter() - start
+
+
+async def run_async(objectId, fields, concurrency, numberOfReads):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed_read():
+        async with semaphore:
+            start = time.perf_counter()
+            await mongoAccess.find_visualization_async(objectId, fields)
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(timed_read() for _ in range(numberOfReads)))
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the MongoDB access under concurrent load')
+    parser.add_argument('--uri', help='Address of a real MongoDB, otherwise "mongomock" is used')
+    parser.add_argument('--genes', type=int, default=20000)
+    parser.add_argument('--samples', type=int, default=50)
+    parser.add_argument('--reads', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    arguments = parser.parse_args()
+
+    if arguments.uri:
+        mongoAccess.MONGO_URI = arguments.uri
+        mongoAccess.MONGO_COLLECTION = 'benchmark_visualizations'
+    else:
+        import mongomock
+        mongoAccess.set_client(mongomock.MongoClient())
+
+    collection = mongoAccess.get_collection()
+    objectId = collection.insert_one(make_document(arguments.genes, arguments.samples)).inserted_id
+    try:
+        print(f'MongoDB: {arguments.uri or "mongomock (in-process)"}, document with {arguments.genes} genes x {arguments.samples} samples')
+        for label, fields in [('whole document', None), ('projection', ['filtered_dataframe'])]:
+            for concurrency in arguments.concurrency:
+                latencies, totalTime = run_threads(objectId, fields, concurrency, arguments.reads)
+                print(f'{label:>15} threads x{concurrency:<3} {summarize(latencies, totalTime)}')
+                latencies, totalTime = asyncio.run(run_async(objectId, fields, concurrency, arguments.reads))
+                print(f'{label:>15} async   x{concurrency:<3} {summarize(latencies, totalTime)}')
+    finally:
+        collection.delete_one({'_id': objectId})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark measures how the parallel analysis (check the file "parallelAnalysis.py") scales with the number of processes
+# For each shape of data and each number of processes, it reports the time, the speedup compared with 1 process, and the efficiency (speedup / processes)
+# It also checks that the result is the same for all the numbers of processes, as the random seeds only depend on "--seed"
+# The time to start the processes is not measured, the pool is started and warmed up before
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkParallelAnalysis
+# ==> python -m benchmarks.benchmarkParallelAnalysis --shapes 18x20000 --permutations 1000 --workers 1 2 4 8
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+import jobQueue
+import parallelAnalysis
+from benchmarks.benchmarkSolvers import make_standardized_data
+
+
+def get_default_workers():
+    # 1, 2, 4, ... up to the number of CPUs
+    workers = [1]
+    while workers[-1] * 2 <= (os.cpu_count() or 1):
+        workers.append(workers[-1] * 2)
+    if workers[-1] != (os.cpu_count() or 1):
+        workers.append(os.cpu_count())
+    return workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the parallel analysis with different numbers of processes')
+    parser.add_argument('--shapes', nargs='+', default=['18x20000', '100x20000'],
+                        help='Shapes of the data as "samplesxgenes", like 18x20000')
+    parser.add_argument('--permutations', type=int, default=1000)
+    parser.add_argument('--n-components', type=int, default=parallelAnalysis.DEFAULT_N_COMPONENTS)
+    parser.add_argument('--workers', type=int, nargs='+', default=get_default_workers())
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    print(f'{"shape":>12} {"processes":>9} {"time (s)":>9} {"speedup":>8} {"efficiency":>10} {"same result":>11}')
+    for shape in arguments.shapes:
+        numberOfSamples, numberOfGenes = (int(value) for value in shape.split('x'))
+        standardizedData = make_standardized_data(numberOfSamples, numberOfGenes)
+
+        referenceTime = None
+        referenceResult = None
+        for workers in arguments.workers:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=get_context(jobQueue.JOB_START_METHOD),
+                                     initializer=parallelAnalysis.start_worker) as executor:
+                # Warm up: start all the processes of the pool
+                parallelAnalysis.run_parallel_analysis(
+                    standardizedData, parallelAnalysis.BATCH_SIZE * workers, arguments.n_components, executor=executor)
+
+                start = time.perf_counter()
+                result = parallelAnalysis.run_parallel_analysis(
+                    standardizedData, arguments.permutations, arguments.n_components, seed=arguments.seed, executor=executor)
+                elapsed = time.perf_counter() - start
+
+            if referenceTime is None:
+                referenceTime, referenceResult = elapsed, result
+            speedup = referenceTime / elapsed
+            print(f'{shape:>12} {workers:>9} {elapsed:>9.3f} {speedup:>7.2f}x {speedup / workers:>10.0%} {str(np.array_equal(result, referenceResult)):>11}')
+
+
+if __name__ == '__main__':
+    main()
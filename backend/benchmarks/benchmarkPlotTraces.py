@@ -0,0 +1,65 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark compares the size of the JSON of the plots with the "per_sample" and the "grouped" layouts of the traces (check the file "plotTraces.py")
+# For each number of samples, it reports the number of traces, the size of the JSON and the time to build and serialize it
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkPlotTraces
+# ==> python -m benchmarks.benchmarkPlotTraces --samples 18 200 1000 --genes 2000
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import json
+import time
+
+import dataIngestion
+import generateBundle
+import pcaCache
+from benchmarks.benchmarkIngestion import make_synthetic_data
+
+SECTIONS = ['pca', 'pca_3d', 'top_five_contributors']
+
+
+def build_and_serialize(fittedPCA, section, traceLayout, repeat):
+    bestTime = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = generateBundle.build_sections(fittedPCA, [section], traceLayout=traceLayout)[section]
+        payload = json.dumps(result)
+        bestTime = min(bestTime, time.perf_counter() - start)
+    return len(result['loadingsPlotCoordinates' if section == 'top_five_contributors' else 'data']), len(payload), bestTime
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the layouts of the Plotly traces')
+    parser.add_argument('--samples', type=int, nargs='+', default=[18, 200, 1000])
+    parser.add_argument('--genes', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+
+    print(f'{"samples":>8} {"section":>22} {"layout":>11} {"traces":>7} {"JSON (KB)":>10} {"time (ms)":>10}')
+    for numberOfSamples in arguments.samples:
+        # The synthetic samples are named like "Condition0_30m_0", so there are 6 conditions
+        convertedData = dataIngestion.prepare_numeric_data(make_synthetic_data(arguments.genes, numberOfSamples, '.'))
+        fittedPCA = pcaCache.fit_pca(convertedData)
+        for section in SECTIONS:
+            sizes = {}
+            for traceLayout in ['per_sample', 'grouped']:
+                numberOfTraces, payloadBytes, buildTime = build_and_serialize(fittedPCA, section, traceLayout, arguments.repeat)
+                sizes[traceLayout] = payloadBytes
+                print(f'{numberOfSamples:>8} {section:>22} {traceLayout:>11} {numberOfTraces:>7} {payloadBytes / 1024:>10.1f} {buildTime * 1000:>10.2f}')
+            print(f'{"":>8} {"":>22} {"":>11} {"":>7} {sizes["grouped"] / sizes["per_sample"]:>9.0%} of per_sample')
+
+
+if __name__ == '__main__':
+    main()
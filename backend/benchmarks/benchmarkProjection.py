@@ -0,0 +1,89 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark compares the ways to place new samples on the PCA of a dataset, check the file "projectSamples.py"
+# For each shape, the first samples are the dataset and the last "--new-samples" samples are the new samples, then it reports:
+# ==> "project": the time to project the new samples on the PCA of the dataset, without changing the PCA
+# ==> "incremental": the time of the incremental refit, and how far its result is from the full refit
+#     With "--rank", only the first principal components of the dataset are used by the incremental refit, which is faster but not exact
+# ==> "full": the time of the StandardScaler and the PCA of the dataset with the new samples, from the start
+# The times are the best of "--runs" runs, the differences are for the first 8 principal components (the sign of each one is aligned before comparing)
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkProjection
+# ==> python -m benchmarks.benchmarkProjection --shapes 200x60000 --new-samples 1 10 --rank 20
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import time
+
+import numpy as np
+
+import pcaCache
+import projectSamples
+from benchmarks.benchmarkFloat32 import compare_fits, make_converted_data
+
+DEFAULT_SHAPES = ['24x20000', '96x60000', '200x60000']
+DEFAULT_NEW_SAMPLES = [1, 6]
+
+
+def measure(function, runs):
+    # The best time of "runs" runs, and the result of the last run
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the projection and the incremental refit of new samples')
+    parser.add_argument('--shapes', nargs='+', default=DEFAULT_SHAPES,
+                        help='Shapes of the dataset with the new samples as "samplesxgenes", like 24x20000')
+    parser.add_argument('--new-samples', type=int, nargs='+', default=DEFAULT_NEW_SAMPLES)
+    parser.add_argument('--rank', type=int, default=None,
+                        help='the number of principal components of the dataset used by the incremental refit, all of them by default')
+    parser.add_argument('--runs', type=int, default=3)
+    arguments = parser.parse_args()
+
+    # Warm up, so the first time does not include the import of scikit-learn and scipy
+    pcaCache.fit_pca(make_converted_data(10, 100, np.float64))
+
+    print(f'{"shape":>12} {"new":>4} {"project (ms)":>13} {"incremental (s)":>16} {"full (s)":>9} {"speed-up":>9} {"diff ratio":>11} {"diff scores":>12}')
+    for shape in arguments.shapes:
+        numberOfSamples, numberOfGenes = (int(value) for value in shape.split('x'))
+        convertedData = make_converted_data(numberOfSamples, numberOfGenes, np.float64)
+        for numberOfNewSamples in arguments.new_samples:
+            baseData = convertedData.iloc[:, :-numberOfNewSamples]
+            newData = convertedData.iloc[:, -numberOfNewSamples:]
+            fittedPCA = pcaCache.fit_pca(baseData)
+
+            def project():
+                values, _ = projectSamples.align_samples(fittedPCA, newData)
+                return projectSamples.project_samples(fittedPCA, values, projectSamples.DEFAULT_N_COMPONENTS)
+
+            def update():
+                values, _ = projectSamples.align_samples(fittedPCA, newData)
+                return projectSamples.update_fit(fittedPCA, values, convertedData.columns, rank=arguments.rank)
+
+            _, projectTime = measure(project, arguments.runs)
+            updatedPCA, updateTime = measure(update, arguments.runs)
+            fullPCA, fullTime = measure(lambda: pcaCache.fit_pca(convertedData), arguments.runs)
+            differences = compare_fits(updatedPCA, fullPCA, 8)
+
+            print(f'{shape:>12} {numberOfNewSamples:>4} {projectTime * 1000:>13.1f} {updateTime:>16.3f} {fullTime:>9.3f} '
+                  f'{fullTime / updateTime:>8.2f}x {differences["explained_variance_ratio"]:>11.2e} {differences["scores"]:>12.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark compares the formats of the request body which can be read by "decode_request_body()" in the file "dataIngestion.py"
+# For each format, it reports the size of the body, the time to read and prepare the data, and the peak memory (RSS)
+# Each format is read in a new Python process, so the peak memory of one format does not affect the others
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkRequestFormats --genes 60000 --samples 200
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import gzip
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import dataIngestion
+from benchmarks.benchmarkIngestion import make_synthetic_data
+
+# The formats: name ==> (Content-Type, Content-Encoding)
+FORMATS = {
+    'json': ('application/json', None),
+    'json+gzip': ('application/json', 'gzip'),
+    'json+zstd': ('application/json', 'zstd'),
+    'arrow': ('application/vnd.apache.arrow.stream', None),
+    'arrow+zstd': ('application/vnd.apache.arrow.stream', 'zstd'),
+    'parquet': ('application/vnd.apache.parquet', None),
+}
+
+
+def encode_body(syntheticData, formatName):
+    # Create the request body of a format, the same way as the frontend would send it
+    mimetype, contentEncoding = FORMATS[formatName]
+    if mimetype == 'application/json':
+        body = json.dumps(syntheticData.to_dict('records')).encode()
+    elif mimetype == 'application/vnd.apache.arrow.stream':
+        table = pa.Table.from_pandas(syntheticData, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        body = sink.getvalue().to_pybytes()
+    else:
+        buffer = io.BytesIO()
+        pq.write_table(pa.Table.from_pandas(syntheticData, preserve_index=False), buffer)
+        body = buffer.getvalue()
+
+    if contentEncoding == 'gzip':
+        body = gzip.compress(body)
+    elif contentEncoding == 'zstd':
+        body = dataIngestion.zstandard.ZstdCompressor().compress(body)
+    return body
+
+
+def peak_rss_megabytes():
+    # On Linux, "VmHWM" in "/proc/self/status" is the peak memory of this process
+    # ==> "ru_maxrss" is not used on Linux, because it also keeps the peak memory of the parent process before the new process was started
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    # "ru_maxrss" is in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 / 1024
+
+
+def decode_in_this_process(formatName, path):
+    # Read the body from the file, then decode and prepare it, like "get_request_data()" in the file "datasetSessions.py"
+    mimetype, contentEncoding = FORMATS[formatName]
+    with open(path, 'rb') as file:
+        body = file.read()
+    rssBefore = peak_rss_megabytes()
+
+    start = time.perf_counter()
+    requestBody = dataIngestion.decode_request_body(body, mimetype, contentEncoding)
+    decodeTime = time.perf_counter() - start
+    if not isinstance(requestBody, pd.DataFrame):
+        requestBody = pd.DataFrame(data=requestBody)
+    convertedData = dataIngestion.prepare_numeric_data(requestBody)
+    totalTime = time.perf_counter() - start
+
+    print(json.dumps({
+        'decode_seconds': decodeTime,
+        'total_seconds': totalTime,
+        'peak_rss_mb': peak_rss_megabytes(),
+        'peak_rss_increase_mb': peak_rss_megabytes() - rssBefore,
+        'shape': list(convertedData.shape),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the formats of the request body')
+    parser.add_argument('--genes', type=int, default=60000)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--decode', nargs=2, metavar=('FORMAT', 'PATH'), help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.decode:
+        decode_in_this_process(*arguments.decode)
+        return
+
+    # Numbers are sent as numbers here (not as text), as the Arrow and Parquet formats keep the type of each column
+    syntheticData = make_synthetic_data(arguments.genes, arguments.samples, '.')
+    for column in syntheticData.columns[2:]:
+        syntheticData[column] = syntheticData[column].astype(float)
+
+    print(f'Data: {arguments.genes} genes x {arguments.samples} samples')
+    print(f'{"format":>12} {"body (MB)":>10} {"decode (s)":>11} {"total (s)":>10} {"peak RSS (MB)":>14} {"RSS increase (MB)":>18}')
+    with tempfile.TemporaryDirectory() as temporaryFolder:
+        for formatName in FORMATS:
+            if FORMATS[formatName][1] == 'zstd' and dataIngestion.zstandard is None:
+                print(f'{formatName:>12} skipped, the "zstandard" library is not installed')
+                continue
+            path = os.path.join(temporaryFolder, formatName)
+            body = encode_body(syntheticData, formatName)
+            with open(path, 'wb') as file:
+                file.write(body)
+
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.benchmarkRequestFormats', '--decode', formatName, path],
+                capture_output=True, text=True, check=True).stdout
+            result = json.loads(output)
+            print(f'{formatName:>12} {len(body) / 1024 / 1024:10.1f} {result["decode_seconds"]:11.3f} {result["total_seconds"]:10.3f} '
+                  f'{result["peak_rss_mb"]:14.0f} {result["peak_rss_increase_mb"]:18.0f}')
+
+
+if __name__ == '__main__':
+    main()
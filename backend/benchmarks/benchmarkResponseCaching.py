@@ -0,0 +1,70 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark measures the ETag and the compression of the file "responseCaching.py" with the loadings table of an uploaded dataset
+# For each case, it reports the time of the request and the size of the response body:
+# ==> no compression, then each available compression ("Accept-Encoding")
+# ==> the same request again with "If-None-Match", which returns "304 Not Modified"
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkResponseCaching
+# ==> python -m benchmarks.benchmarkResponseCaching --genes 20000 100000 --samples 12
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import time
+
+import app
+import responseCaching
+import serverHealth
+from benchmarks.benchmarkIngestion import make_synthetic_data
+
+
+def best_time(function, repeat):
+    bestTime = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        bestTime = min(bestTime, time.perf_counter() - start)
+    return bestTime, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ETag and the compression of the responses')
+    parser.add_argument('--genes', type=int, nargs='+', default=[20000, 100000])
+    parser.add_argument('--samples', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    arguments = parser.parse_args()
+
+    # Like the server in production, the backend is warmed up before the measures
+    serverHealth.warm_up(app.app)
+    client = app.app.test_client()
+    print(f'{"genes":>8} {"case":>12} {"status":>6} {"time":>11} {"size":>10}')
+    for numberOfGenes in arguments.genes:
+        syntheticData = make_synthetic_data(numberOfGenes, arguments.samples, '.').drop(columns=['name'])
+        datasetId = client.post('/api/datasets', json=syntheticData.to_dict('records')).get_json()['dataset_id']
+        url = f'/api/generate_loadings_table?dataset_id={datasetId}'
+        # The first request fits the PCA, so the cases below only measure the JSON, the compression and the ETag
+        etag = client.get(url).headers['ETag']
+
+        cases = {'identity': {'Accept-Encoding': 'identity'}}
+        for encoding in responseCaching.get_compressors():
+            cases[encoding] = {'Accept-Encoding': encoding}
+        cases['304'] = {'If-None-Match': etag}
+
+        for name, headers in cases.items():
+            requestTime, response = best_time(lambda: client.get(url, headers=headers), arguments.repeat)
+            print(f'{numberOfGenes:>8} {name:>12} {response.status_code:>6} {requestTime * 1000:>8.1f} ms {len(response.data) / 1024:>7.0f} KB')
+
+
+if __name__ == '__main__':
+    main()
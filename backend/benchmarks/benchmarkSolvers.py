@@ -0,0 +1,84 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark compares the solvers in the file "pcaSolvers.py" for different shapes of data
+# It also checks that every solver gives the same result as PCA() of scikit-learn, up to the sign of each principal component
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkSolvers
+# ==> python -m benchmarks.benchmarkSolvers --shapes 24x20000 96x60000
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+import pcaSolvers
+
+# The shapes are "samples x genes", after the data is transposed
+DEFAULT_SHAPES = ['18x2000', '24x20000', '96x60000', '200x60000', '3000x3000']
+
+# The number of principal components which are compared between the solvers
+COMPARED_COMPONENTS = 8
+
+
+def make_standardized_data(numberOfSamples, numberOfGenes, seed=0):
+    # Create data with a few strong principal components, like real expression data, then standardize it
+    randomGenerator = np.random.default_rng(seed)
+    latentFactors = randomGenerator.normal(size=(numberOfSamples, 10)) * np.linspace(10, 1, 10)
+    data = latentFactors @ randomGenerator.normal(size=(10, numberOfGenes))
+    data += randomGenerator.normal(size=(numberOfSamples, numberOfGenes))
+    return StandardScaler().fit_transform(data)
+
+
+def compare_with_reference(result, scores, referenceResult, referenceScores):
+    # Return the largest difference with the reference, for the first "COMPARED_COMPONENTS" principal components
+    # The sign of each principal component is arbitrary, so the sign is aligned before comparing
+    n = min(COMPARED_COMPONENTS, result.n_components_, referenceResult.n_components_)
+    signs = np.sign(np.sum(result.components_[:n] * referenceResult.components_[:n], axis=1))
+    return {
+        'explained_variance_ratio': np.max(np.abs(result.explained_variance_ratio_[:n] - referenceResult.explained_variance_ratio_[:n])),
+        'components': np.max(np.abs(result.components_[:n] * signs[:, np.newaxis] - referenceResult.components_[:n])),
+        'scores': np.max(np.abs(scores[:, :n] * signs - referenceScores[:, :n])) / np.max(np.abs(referenceScores[:, :n])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the PCA solvers')
+    parser.add_argument('--shapes', nargs='+', default=DEFAULT_SHAPES,
+                        help='Shapes of the data as "samplesxgenes", like 24x20000')
+    arguments = parser.parse_args()
+
+    print(f'{"shape":>12} {"solver":>15} {"time (s)":>9} {"speed-up":>9} {"max diff ratio":>15} {"max diff comp.":>15} {"max diff scores":>16}')
+    for shape in arguments.shapes:
+        numberOfSamples, numberOfGenes = (int(value) for value in shape.split('x'))
+        X = make_standardized_data(numberOfSamples, numberOfGenes)
+
+        start = time.perf_counter()
+        referenceResult, referenceScores = pcaSolvers.fit_pca(X, solver='sklearn')
+        referenceTime = time.perf_counter() - start
+        print(f'{shape:>12} {"sklearn":>15} {referenceTime:9.3f} {1:9.1f}')
+
+        for solver in ['gram', 'randomized', 'auto']:
+            start = time.perf_counter()
+            result, scores = pcaSolvers.fit_pca(X, solver=solver)
+            solverTime = time.perf_counter() - start
+            differences = compare_with_reference(result, scores, referenceResult, referenceScores)
+            name = f'auto={result.solver}' if solver == 'auto' else solver
+            print(f'{shape:>12} {name:>15} {solverTime:9.3f} {referenceTime / solverTime:9.1f} '
+                  f'{differences["explained_variance_ratio"]:15.2e} {differences["components"]:15.2e} {differences["scores"]:16.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark compares the dense and the sparse data (check the file "dataIngestion.py") for count data with different shares of non-zero values
+# For each shape and each density, the same data is given to "fit_pca()" of the file "pcaCache.py", once as a dense DataFrame and once as a sparse DataFrame
+# It reports the memory of the "convertedData", the time and the peak memory of the StandardScaler and the PCA (measured with "tracemalloc", which sees the numpy arrays)
+# It also checks that both give the same result, up to the sign of each principal component
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkSparseInput
+# ==> python -m benchmarks.benchmarkSparseInput --shapes 24x60000 --densities 0.01 0.05
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import scipy.sparse
+
+import dataIngestion
+import pcaCache
+from benchmarks.benchmarkSolvers import COMPARED_COMPONENTS
+
+DEFAULT_SHAPES = ['24x20000', '96x60000']
+DEFAULT_DENSITIES = [0.01, 0.05, 0.2]
+
+
+def make_count_data(numberOfSamples, numberOfGenes, density, seed=0):
+    # Create count data with about "density" non-zero values, with a different level of expression for each gene
+    randomGenerator = np.random.default_rng(seed)
+    matrix = scipy.sparse.random(numberOfGenes, numberOfSamples, density=density, format='csc', random_state=randomGenerator,
+                                 data_rvs=lambda size: randomGenerator.poisson(5, size=size) + 1.0)
+    matrix = scipy.sparse.csc_matrix(scipy.sparse.diags(randomGenerator.integers(1, 50, size=numberOfGenes).astype(float)) @ matrix)
+    index = pd.Index([f'gene_{i + 1}' for i in range(numberOfGenes)], name='gene')
+    columns = [f'sample_{i + 1}' for i in range(numberOfSamples)]
+    sparseData = dataIngestion.make_sparse_data(matrix, index, columns)
+    denseData = pd.DataFrame(matrix.toarray(), index=sparseData.index, columns=columns)
+    return denseData, sparseData
+
+
+def measure_fit(convertedData):
+    # The time and the peak memory of the StandardScaler and the PCA
+    # They are measured in 2 different runs, because "tracemalloc" makes the code much slower
+    start = time.perf_counter()
+    fittedPCA = pcaCache.fit_pca(convertedData)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    pcaCache.fit_pca(convertedData)
+    peakBytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return fittedPCA, elapsed, peakBytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the dense and the sparse data')
+    parser.add_argument('--shapes', nargs='+', default=DEFAULT_SHAPES,
+                        help='Shapes of the data as "samplesxgenes", like 24x20000')
+    parser.add_argument('--densities', type=float, nargs='+', default=DEFAULT_DENSITIES,
+                        help='The shares of non-zero values, like 0.05')
+    arguments = parser.parse_args()
+
+    print(f'{"shape":>12} {"density":>8} {"data":>7} {"solver":>11} {"data (MB)":>10} {"time (s)":>9} {"peak (MB)":>10} {"max diff ratio":>15} {"max diff scores":>16}')
+    for shape in arguments.shapes:
+        numberOfSamples, numberOfGenes = (int(value) for value in shape.split('x'))
+        for density in arguments.densities:
+            denseData, sparseData = make_count_data(numberOfSamples, numberOfGenes, density)
+            # Warm up, so the time of the first fit does not include the import of scikit-learn and scipy
+            pcaCache.fit_pca(denseData.iloc[:100])
+            pcaCache.fit_pca(sparseData.iloc[:100])
+            denseFit, denseTime, densePeak = measure_fit(denseData)
+            sparseFit, sparseTime, sparsePeak = measure_fit(sparseData)
+
+            n = min(COMPARED_COMPONENTS, len(sparseFit['explained_variance_ratio']), len(denseFit['explained_variance_ratio']))
+            signs = np.sign(np.sum(sparseFit['components'][:n] * denseFit['components'][:n], axis=1))
+            ratioDifference = np.max(np.abs(sparseFit['explained_variance_ratio'][:n] - denseFit['explained_variance_ratio'][:n]))
+            scoresDifference = np.max(np.abs(sparseFit['scores'][:, :n] * signs - denseFit['scores'][:, :n])) / np.max(np.abs(denseFit['scores'][:, :n]))
+
+            for name, convertedData, fittedPCA, elapsed, peakBytes in [
+                    ('dense', denseData, denseFit, denseTime, densePeak),
+                    ('sparse', sparseData, sparseFit, sparseTime, sparsePeak)]:
+                dataMegabytes = convertedData.memory_usage(index=False).sum() / 1024 / 1024
+                line = (f'{shape:>12} {density:>8.2f} {name:>7} {fittedPCA["pca"].solver:>11} {dataMegabytes:>10.1f} '
+                        f'{elapsed:>9.3f} {peakBytes / 1024 / 1024:>10.1f}')
+                if name == 'sparse':
+                    line += f' {ratioDifference:>15.2e} {scoresDifference:>16.2e}'
+                print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark compares the peak memory and the time of the normal PCA ("pcaCache.py") with the streaming PCA ("streamingPCA.py")
+# The data is written once into a Parquet file, then each mode reads this file in a new Python process, so their peak memory do not affect each other
+# It also checks that the streaming PCA gives the same explained variance as the normal PCA
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkStreamingPCA --genes 200000 --samples 200 --chunk-sizes 16 64
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import dataIngestion
+import pcaCache
+import streamingPCA
+from benchmarks.benchmarkIngestion import make_synthetic_data
+from benchmarks.benchmarkRequestFormats import peak_rss_megabytes
+
+COMPARED_COMPONENTS = 4
+
+
+def run_in_this_process(mode, path, chunkSize):
+    rssBefore = peak_rss_megabytes()
+    start = time.perf_counter()
+    if mode == 'normal':
+        # Like "get_request_data()" in the file "datasetSessions.py" with a Parquet body
+        convertedData = dataIngestion.prepare_numeric_data(pd.read_parquet(path))
+        fittedPCA = pcaCache.fit_pca(convertedData)
+    else:
+        fittedPCA = streamingPCA.fit_streaming_pca(streamingPCA.open_source(path), chunkSize=chunkSize)
+    totalTime = time.perf_counter() - start
+
+    print(json.dumps({
+        'total_seconds': totalTime,
+        'peak_rss_increase_mb': peak_rss_megabytes() - rssBefore,
+        'explained_variance_ratio': fittedPCA['explained_variance_ratio'][:COMPARED_COMPONENTS].tolist(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the streaming PCA')
+    parser.add_argument('--genes', type=int, default=100000)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[16, 64])
+    parser.add_argument('--run', nargs=3, metavar=('MODE', 'PATH', 'CHUNK_SIZE'), help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.run:
+        run_in_this_process(arguments.run[0], arguments.run[1], int(arguments.run[2]))
+        return
+
+    syntheticData = make_synthetic_data(arguments.genes, arguments.samples, '.').drop(columns=['name'])
+    for column in syntheticData.columns[1:]:
+        syntheticData[column] = syntheticData[column].astype(float)
+
+    with tempfile.TemporaryDirectory() as temporaryFolder:
+        path = os.path.join(temporaryFolder, 'data.parquet')
+        syntheticData.to_parquet(path, index=False)
+        dataMegabytes = arguments.genes * arguments.samples * 8 / 1024 / 1024
+        print(f'Data: {arguments.genes} genes x {arguments.samples} samples ({dataMegabytes:.0f} MB as float64), Parquet file {os.path.getsize(path) / 1024 / 1024:.0f} MB')
+        print(f'{"mode":>20} {"time (s)":>9} {"peak RSS increase (MB)":>23} {"max diff of explained variance":>31}')
+
+        reference = None
+        for mode, chunkSize in [('normal', 0)] + [('streaming', chunkSize) for chunkSize in arguments.chunk_sizes]:
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.benchmarkStreamingPCA', '--run', mode, path, str(chunkSize)],
+                capture_output=True, text=True, check=True).stdout
+            result = json.loads(output)
+            ratios = np.array(result['explained_variance_ratio'])
+            if reference is None:
+                reference = ratios
+            label = mode if mode == 'normal' else f'{mode} (chunk {chunkSize})'
+            print(f'{label:>20} {result["total_seconds"]:9.2f} {result["peak_rss_increase_mb"]:23.0f} {np.max(np.abs(ratios - reference)):31.2e}')
+
+
+if __name__ == '__main__':
+    main()
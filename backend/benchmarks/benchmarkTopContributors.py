@@ -0,0 +1,82 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This benchmark compares the old way to find the top contributors (one pandas sort for each principal component) with "find_top_contributors()" in the file "topContributors.py"
+# It also checks that both ways find the same genes
+# Run it from the "backend" folder, for example:
+# ==> python -m benchmarks.benchmarkTopContributors
+# ==> python -m benchmarks.benchmarkTopContributors --genes 1000 100000 --k 5 50
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import topContributors
+
+
+def legacy_top_contributors(loadings, geneNames, k):
+    # The old code of "generateTopFiveContributors.py", with "head(k)" instead of "head(5)"
+    labelPrincipalComponents = ['PC' + str(i+1) for i in range(loadings.shape[0])]
+    loadings_df = pd.DataFrame(loadings.T, index=geneNames, columns=labelPrincipalComponents)
+    result = []
+    for pc in labelPrincipalComponents:
+        contributors = loadings_df[pc].map(abs).sort_values(
+            ascending=False).head(k).index.to_series().map(loadings_df[pc])
+        for gene, value in contributors.items():
+            result.append({"Principal component": pc, "Gene": gene, "Loadings": value})
+    return result
+
+
+def new_top_contributors(loadings, geneNames, k):
+    labelPrincipalComponents = ['PC' + str(i+1) for i in range(loadings.shape[0])]
+    indices, values = topContributors.find_top_contributors(loadings, k)['absolute']
+    return topContributors.to_records(indices, values, geneNames, "Gene", labelPrincipalComponents)
+
+
+def best_time(function, repeat, *arguments):
+    bestTime = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*arguments)
+        bestTime = min(bestTime, time.perf_counter() - start)
+    return bestTime, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the search of the top contributors')
+    parser.add_argument('--genes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--k', type=int, nargs='+', default=[5, 50])
+    parser.add_argument('--components', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args()
+
+    randomGenerator = np.random.default_rng(0)
+    print(f'{"genes":>8} {"k":>4} {"old (pandas sort)":>18} {"argpartition":>14} {"speed-up":>9}')
+    for numberOfGenes in arguments.genes:
+        loadings = randomGenerator.normal(size=(arguments.components, numberOfGenes))
+        geneNames = np.array([f'gene{i}' for i in range(numberOfGenes)], dtype=object)
+        for k in arguments.k:
+            legacyTime, legacyResult = best_time(legacy_top_contributors, arguments.repeat, loadings, geneNames, k)
+            newTime, newResult = best_time(new_top_contributors, arguments.repeat, loadings, geneNames, k)
+
+            # Both ways must find the same genes in the same order
+            assert [row['Gene'] for row in legacyResult] == [row['Gene'] for row in newResult]
+
+            print(f'{numberOfGenes:>8} {k:>4} {legacyTime * 1000:>15.2f} ms {newTime * 1000:>11.2f} ms {legacyTime / newTime:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
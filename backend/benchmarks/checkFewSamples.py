@@ -0,0 +1,103 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This script checks the datasets with very few samples, like 2 or 3, which have fewer principal components with some variance than the plots need
+# ==> after centering, 2 samples have only 1 principal component with some variance, but the 2D PCA plot needs PC1 and PC2
+# ==> the solvers of the file "pcaSolvers.py" must still return min(n_samples, n_features) principal components, like PCA() of scikit-learn
+# For each number of samples and each solver, it checks 2 things:
+# ==> the "generate_*" endpoints return "200 OK", they are called with the test client of Flask
+# ==> the explained variance ratio and the scores are the same as PCA() of scikit-learn, up to the sign of each principal component
+#
+# The script exits with the code 1 when a check fails, so it can be run in the CI after each change:
+# ==> python -m benchmarks.checkFewSamples
+# ==> python -m benchmarks.checkFewSamples --samples 2 3 4 --genes 500
+# Run it from the "backend" folder
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import sys
+
+import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import StandardScaler
+
+import pcaCache
+import pcaSolvers
+from app import app
+from benchmarks.benchmarkFloat32 import make_converted_data
+
+# Each endpoint, its other options in the URL, and the smallest number of samples it needs
+# ==> the 3D PCA plot needs PC3, so at least 3 samples, like before
+# ==> the bundle is also checked without the 3D PCA plot, so it is checked with 2 samples too
+ENDPOINTS = [
+    ('/api/generate_pca', '', 2),
+    ('/api/generate_pca_3d', '', 3),
+    ('/api/generate_scree_plot', '', 2),
+    ('/api/generate_loadings_table', '', 2),
+    ('/api/generate_top_five_contributors', '', 2),
+    ('/api/generate_bundle', '', 3),
+    ('/api/generate_bundle', '&sections=pca,scree_plot,loadings_table,top_five_contributors', 2),
+]
+
+
+def make_request_body(convertedData):
+    # The same JSON as the frontend sends: one object for each gene, with the gene name and one value for each sample
+    rows = convertedData.reset_index().rename(columns={'gene': 'locus_tag'})
+    return rows.to_dict(orient='records')
+
+
+def compare_with_sklearn(fittedPCA, convertedData):
+    # The largest difference of the explained variance ratio and of the scores with PCA() of scikit-learn
+    referencePCA = PCA()
+    referenceScores = referencePCA.fit_transform(StandardScaler().fit_transform(convertedData.to_numpy().T))
+    if len(fittedPCA['explained_variance_ratio']) != len(referencePCA.explained_variance_ratio_):
+        return np.inf
+    signs = np.where(np.sum(fittedPCA['scores'] * referenceScores, axis=0) < 0, -1, 1)
+    return max(np.max(np.abs(fittedPCA['explained_variance_ratio'] - referencePCA.explained_variance_ratio_)),
+               np.max(np.abs(fittedPCA['scores'] * signs - referenceScores)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the PCA of datasets with very few samples')
+    parser.add_argument('--samples', type=int, nargs='+', default=[2, 3])
+    parser.add_argument('--genes', type=int, default=200)
+    parser.add_argument('--max-deviation', type=float, default=1e-6,
+                        help='the largest accepted difference with PCA() of scikit-learn')
+    arguments = parser.parse_args()
+
+    client = app.test_client()
+    isFailed = False
+    for numberOfSamples in arguments.samples:
+        convertedData = make_converted_data(numberOfSamples, arguments.genes, np.float64)
+        requestBody = make_request_body(convertedData)
+        for solver in pcaSolvers.SOLVERS:
+            problems = []
+            for endpoint, options, minimumSamples in ENDPOINTS:
+                if numberOfSamples < minimumSamples:
+                    continue
+                response = client.post(f'{endpoint}?solver={solver}{options}', json=requestBody)
+                if response.status_code != 200:
+                    problems.append(f'{endpoint}{options} returned {response.status_code}')
+            deviation = compare_with_sklearn(pcaCache.fit_pca(convertedData, solver=solver), convertedData)
+            if deviation > arguments.max_deviation:
+                problems.append(f'the difference with scikit-learn is {deviation:.2e}')
+
+            isFailed = isFailed or bool(problems)
+            print(f'{numberOfSamples:>3} samples {solver:>11}: ' + ('; '.join(problems) if problems else 'OK'))
+
+    print('==> FAILED' if isFailed else '==> OK')
+    sys.exit(1 if isFailed else 0)
+
+
+if __name__ == '__main__':
+    main()
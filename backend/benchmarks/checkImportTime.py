@@ -0,0 +1,130 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This script checks the time budget of "import app", which is the cold start of the backend (a new worker, or "python app.py")
+# It checks 2 things:
+# ==> the time of "import app" in a new Python process, the best of "--runs" runs, must be lower than "--budget" seconds
+#     The budget can also be set with the environment variable "PCA_IMPORT_BUDGET_SECONDS"
+# ==> the big libraries (pandas, scikit-learn, scipy, pyarrow, pymongo) must NOT be imported by "import app", check the file "lazyImports.py"
+#     If one of them is imported, the name of the file which imported it is shown, so the import could be made lazy again
+# The slowest modules are printed from "python -X importtime", to know where the time goes
+#
+# The script exits with the code 1 when the budget is not met, so it can be run in the CI after each change:
+# ==> python -m benchmarks.checkImportTime
+# ==> python -m benchmarks.checkImportTime --budget 0.3 --runs 10
+# Run it from the "backend" folder
+# ⭐⭐⭐
+#
+#########################
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ['pandas', 'sklearn', 'scipy', 'pyarrow', 'pymongo', 'bson', 'motor']
+
+# The code run in the new process: import the backend, then print the time and the big libraries which are imported
+IMPORT_CODE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+seconds = time.perf_counter() - start
+heavyModules = [name for name in %r if name in sys.modules]
+print(json.dumps({'seconds': seconds, 'heavy_modules': heavyModules}))
+''' % (HEAVY_MODULES,)
+
+# The code run to find which file imported a big library: the first frame outside of the import system is the culprit
+FIND_IMPORTER_CODE = '''
+import builtins, sys, traceback
+originalImport = builtins.__import__
+def tracing_import(name, *arguments, **keywordArguments):
+    if name.split('.')[0] == %r and name.split('.')[0] not in sys.modules:
+        for frame in reversed(traceback.extract_stack()[:-1]):
+            if '<frozen' not in frame.filename and 'lazyImports' not in frame.filename:
+                print(f'{frame.filename}:{frame.lineno}')
+                break
+        builtins.__import__ = originalImport
+    return originalImport(name, *arguments, **keywordArguments)
+builtins.__import__ = tracing_import
+import app
+'''
+
+
+def get_backend_folder():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(code, extraArguments=()):
+    return subprocess.run([sys.executable, *extraArguments, '-c', code], capture_output=True, text=True, cwd=get_backend_folder())
+
+
+def measure_import():
+    process = run_python(IMPORT_CODE)
+    if process.returncode != 0:
+        raise RuntimeError(f'"import app" failed:\n{process.stderr}')
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def find_importer(moduleName):
+    process = run_python(FIND_IMPORTER_CODE % moduleName)
+    lines = process.stdout.strip().splitlines()
+    return lines[0] if lines else 'unknown'
+
+
+def get_slowest_imports(count):
+    # "-X importtime" writes one line for each module into stderr: "import time: self [us] | cumulative | imported package"
+    process = run_python('import app', ['-X', 'importtime'])
+    imports = []
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, selfTime, cumulativeTime, moduleName = line.replace('import time:', '|', 1).split('|')
+        # The name is indented with 2 spaces for each level, "app" is level 0, the files of the backend are level 1, and what they import is level 2
+        # The deeper levels are already in the cumulative time of their parent
+        level = (len(moduleName) - len(moduleName.lstrip()) - 1) // 2
+        if 1 <= level <= 2:
+            imports.append((int(cumulativeTime), int(selfTime), moduleName.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the time budget of "import app"')
+    parser.add_argument('--budget', type=float, default=float(os.environ.get('PCA_IMPORT_BUDGET_SECONDS', 0.5)),
+                        help='the maximum time of "import app", in seconds')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='the number of the slowest imports to print')
+    arguments = parser.parse_args()
+
+    measurements = [measure_import() for _ in range(arguments.runs)]
+    bestSeconds = min(measurement['seconds'] for measurement in measurements)
+    heavyModules = measurements[0]['heavy_modules']
+
+    print('The slowest imports of "import app" (cumulative time, in milliseconds):')
+    for cumulativeTime, selfTime, moduleName in get_slowest_imports(arguments.top):
+        print(f'{cumulativeTime / 1000:>9.1f} {moduleName}')
+
+    isFailed = False
+    print(f'\n"import app": {bestSeconds:.3f} s (the best of {arguments.runs} runs), the budget is {arguments.budget:.3f} s')
+    if bestSeconds > arguments.budget:
+        isFailed = True
+        print('==> FAILED, "import app" is slower than the budget')
+    for moduleName in heavyModules:
+        isFailed = True
+        print(f'==> FAILED, "{moduleName}" is imported by "import app", from {find_importer(moduleName)}')
+    if not isFailed:
+        print('==> OK')
+    sys.exit(1 if isFailed else 0)
+
+
+if __name__ == '__main__':
+    main()
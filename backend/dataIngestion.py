@@ -0,0 +1,306 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "dataIngestion.py" file turns the data sent from the frontend into a numeric DataFrame which is ready for the PCA
+# Before, every "generate_*" function had its own copy of the same preparation steps:
+# ==> check the first row with "is_number_or_not()", then "replace(',', '.', regex=True)" on the whole DataFrame, then "astype(float)", then "dropna()"
+# The regex replace on every cell is very slow for big datasets (for example 60000 genes x 200 samples), so now all of them use "prepare_numeric_data()" below, which:
+# ==> checks a sample of rows instead of only the first row to know which columns are numeric
+# ==> skips the columns which are already numbers (for example, when the JSON has 20.01 and not "20,01")
+# ==> converts the text columns one by one with the vectorized string functions of pandas, instead of a regex on every cell
+# ==> writes all numeric columns into ONE float array, then removes the rows with NaN values from that array
+#
+# The data can also be sent in other formats than JSON, which are much smaller and faster to read, check the function "decode_request_body()" below
+#
+# Count data (like RNA-seq counts) is mostly zeros, so it can also be sent as a sparse matrix, where only the non-zero values are sent and kept in memory
+# ==> as Matrix Market ("application/x-matrix-market"), one row for each gene and one column for each sample
+# ==> as Parquet or Arrow with exactly the 3 columns "gene", "sample", "value", one row for each non-zero value (the "triplets")
+# Then the "convertedData" is a DataFrame with sparse columns, and the StandardScaler and the PCA keep it sparse, check the files "pcaCache.py" and "pcaSolvers.py"
+# ⭐⭐⭐
+#
+#########################
+
+import gzip
+import json
+import zlib
+from io import BytesIO
+
+import numpy as np
+
+import lazyImports
+
+# The big libraries are only imported when they are used for the first time, check the file "lazyImports.py"
+pd = lazyImports.lazy_module('pandas')
+pa = lazyImports.lazy_module('pyarrow')
+pq = lazyImports.lazy_module('pyarrow.parquet')
+scipySparse = lazyImports.lazy_module('scipy.sparse')
+scipyIo = lazyImports.lazy_module('scipy.io')
+
+# The "zstandard" library is only needed if the frontend sends data compressed with zstd
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The number of rows which are checked to decide if a column is numeric or not
+SAMPLE_ROWS_FOR_TYPE_CHECK = 100
+
+# The formats of the request body (the "Content-Type" header) which can be read, other than JSON
+ARROW_STREAM_MIMETYPES = ['application/vnd.apache.arrow.stream']
+ARROW_FILE_MIMETYPES = ['application/vnd.apache.arrow.file']
+PARQUET_MIMETYPES = ['application/vnd.apache.parquet', 'application/x-parquet', 'application/parquet']
+MATRIX_MARKET_MIMETYPES = ['application/x-matrix-market', 'text/x-matrix-market']
+
+# A Parquet or Arrow table with exactly these columns is read as a sparse matrix, check the NOTICE above
+SPARSE_TRIPLET_COLUMNS = ['gene', 'sample', 'value']
+
+
+def is_number_or_not(s):
+    # This "is_number_or_not()" function checks if a string is a number
+    # Actually, there is a function called "is_number()" from pandas, but the "is_number()" only check number with dot as the decimal delimiter but not with comma
+    # ==> for example, "1.33" is considered as a number by "is_number()" but "1,33" is not
+    # That's why we have "is_number_or_not()", in which we use s.replace(',', '') to handle the data that may contain comma as the decimal delimiter
+    # This function is then used to identify which columns contain non-numeric value
+    try:
+        # If the value is a string, then replace the comma with an empty string, then check if it is a number
+        if isinstance(s, str):
+            s = s.replace(',', '')
+        # If the value is already a number, then convert it to a float
+        float(s)
+    except (TypeError, ValueError):
+        return False
+    else:
+        return True
+
+
+def is_numeric_column(column, sampleRowPositions):
+    # A column which pandas already stores as numbers (int or float) does not need to be checked
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return True
+    # Otherwise, check the values at the sampled rows, empty cells are ignored
+    # ==> the column is numeric if all the sampled values are numbers
+    sampledValues = column.iloc[sampleRowPositions].dropna()
+    return all(is_number_or_not(value) for value in sampledValues)
+
+
+def to_float_column(column):
+    # Convert one column to float numbers
+    # If the column is already numeric, we just take its values
+    if pd.api.types.is_numeric_dtype(column.dtype):
+        return column.to_numpy(dtype=float, na_value=np.nan)
+    # Otherwise, replace the comma with the dot, like "20,01" ==> "20.01", then convert the text to numbers
+    # The "regex=False" is IMPORTANT here, a plain text replace is much faster than a regex
+    textColumn = column.astype(str).str.replace(',', '.', regex=False)
+    try:
+        # This is the fast way, it works when all the values are numbers
+        return textColumn.to_numpy(dtype=object).astype(float)
+    except ValueError:
+        # This is the slow way, the values that could not be converted, like empty cells, become NaN, and these rows are removed later
+        return pd.to_numeric(textColumn, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+
+def prepare_numeric_data(convertedData, dtype=np.float64):
+    # Prepare the "convertedData" DataFrame, which is created from the data sent by the frontend, so it can be used for the PCA
+    # For example, the "convertedData" is like this:
+    # |-----------|-----------|-----------|-----------|-------------|-------------|
+    # | locus_tag |  name     | H2O_30m_A | H2O_30m_B | PNA79_30m_A | PNA79_30m_B |
+    # |-----------|-----------|-----------|-----------|-------------|-------------|
+    # | gene_1    |  gene_1   | 20,01     | 10,77     | 20,65       | 19,87       |
+    # | gene_2    |  gene_2   | 21,68     | 23,13     | 37,43       | 49,37       |
+    # | gene_3    |  gene_3   | 41,70     |           | 41,95       | 28,21       |
+    # | ...       |  ...      | ...       | ...       | ...         | ...         |
+    # | gene_n    |  gene_n   | 11,96     | 12,23     | 32,27       | 12,31       |
+    # |-----------|-----------|-----------|-----------|-------------|-------------|
+    #
+    # Then the result will be like this:
+    #              |-----------|-----------|-------------|-------------|
+    #              | H2O_30m_A | H2O_30m_B | PNA79_30m_A | PNA79_30m_B |
+    #              |-----------|-----------|-------------|-------------|
+    #  gene_1      | 20.01     | 10.77     | 20.65       | 19.87       |
+    #  gene_2      | 21.68     | 23.13     | 37.43       | 49.37       |
+    #  ...         | ...       | ...       | ...         | ...         |
+    #  gene_n      | 11.96     | 12.23     | 32.27       | 12.31       |
+    #              |-----------|-----------|-------------|-------------|
+    # ==> the first non-numeric column "locus_tag" becomes the index, the other non-numeric columns like "name" are removed
+    # ==> the "gene_3" row is removed, because it has an empty cell
+
+    # The numbers are written as "dtype", which is float64 by default, or float32 with "?dtype=float32" in the URL (check the file "pcaCache.py")
+    # Sparse data is already prepared when it is read, check the function "make_sparse_data()" below
+    if is_sparse_data(convertedData):
+        return convertedData.astype(pd.SparseDtype(dtype, 0)) if convertedData.dtypes.iloc[0].subtype != dtype else convertedData
+
+    #########################
+    # FIND THE NON-NUMERIC COLUMNS
+    #########################
+    # Take up to "SAMPLE_ROWS_FOR_TYPE_CHECK" rows, spread evenly from the first row to the last row
+    # ==> so a column which has a number in the first row but text in the other rows is still found as non-numeric
+    numberOfRows = len(convertedData)
+    sampleRowPositions = np.unique(np.linspace(
+        0, max(numberOfRows - 1, 0), num=min(numberOfRows, SAMPLE_ROWS_FOR_TYPE_CHECK)).astype(int))
+
+    non_numeric_columns = []
+    numeric_columns = []
+    for col in convertedData.columns:
+        if is_numeric_column(convertedData[col], sampleRowPositions):
+            numeric_columns.append(col)
+        else:
+            non_numeric_columns.append(col)
+
+    if len(non_numeric_columns) == 0:
+        raise ValueError(
+            'The data needs at least one non-numeric column, like the gene names, to be used as the index')
+    #########################
+    # End of FIND THE NON-NUMERIC COLUMNS
+    #########################
+
+    #########################
+    # CONVERT THE NUMERIC COLUMNS INTO ONE FLOAT ARRAY
+    #########################
+    # The array is created in the "Fortran" order, which means the values of each column are next to each other in memory
+    # ==> so writing one column at a time is fast
+    # ==> and the transposed array "numericValues.T", which is used for the StandardScaler, is a normal (C order) contiguous array
+    numericValues = np.empty((numberOfRows, len(numeric_columns)), dtype=dtype, order='F')
+    for position, col in enumerate(numeric_columns):
+        numericValues[:, position] = to_float_column(convertedData[col])
+
+    # Only the first non-numeric column is kept, as the index
+    index = pd.Index(convertedData[non_numeric_columns[0]], name=non_numeric_columns[0])
+
+    # Remove rows with NaN values
+    rowsWithoutNaN = ~np.isnan(numericValues).any(axis=1)
+    if not rowsWithoutNaN.all():
+        numericValues = np.asfortranarray(numericValues[rowsWithoutNaN])
+        index = index[rowsWithoutNaN]
+    #########################
+    # End of CONVERT THE NUMERIC COLUMNS INTO ONE FLOAT ARRAY
+    #########################
+
+    return pd.DataFrame(numericValues, index=index, columns=pd.Index(numeric_columns), copy=False)
+
+
+#########################
+# SPARSE DATA
+#########################
+def is_sparse_data(convertedData):
+    # True if the "convertedData" was made by "make_sparse_data()" below, which means all its columns are sparse
+    return len(convertedData.columns) > 0 and all(isinstance(dtype, pd.SparseDtype) for dtype in convertedData.dtypes)
+
+
+def make_sparse_data(matrix, index, columns, dtype=np.float64):
+    # Make the "convertedData" of a sparse matrix, with one row for each gene and one column for each sample, like "prepare_numeric_data()" does for the dense data
+    # ==> each column is a "SparseArray" of pandas, which only keeps the non-zero values and their positions
+    # ==> the genes with a NaN value are removed, like the rows with an empty cell in "prepare_numeric_data()"
+    matrix = scipySparse.csc_matrix(matrix, dtype=dtype)
+    matrix.sum_duplicates()
+    genesWithNaN = np.unique(matrix.indices[np.isnan(matrix.data)])
+    if len(genesWithNaN) > 0:
+        rowsWithoutNaN = np.ones(matrix.shape[0], dtype=bool)
+        rowsWithoutNaN[genesWithNaN] = False
+        matrix = matrix[rowsWithoutNaN]
+        index = index[rowsWithoutNaN]
+    matrix.eliminate_zeros()
+
+    # The columns are made one by one with "fill_value=0", "DataFrame.sparse.from_spmatrix()" is not used because its empty cells are NaN in recent versions of pandas
+    return pd.DataFrame(
+        {position: pd.arrays.SparseArray.from_spmatrix(matrix[:, position]) for position in range(matrix.shape[1])},
+        index=index,
+    ).set_axis(pd.Index(columns), axis=1)
+
+
+def get_sparse_matrix(convertedData):
+    # The opposite of "make_sparse_data()": the sparse matrix of the "convertedData", one row for each gene and one column for each sample
+    return convertedData.sparse.to_coo().tocsc()
+
+
+def triplets_to_sparse_data(triplets):
+    # Make the "convertedData" from the "triplets" DataFrame, which has one row for each non-zero value, like this:
+    # |--------|-----------|-------|
+    # | gene   | sample    | value |
+    # |--------|-----------|-------|
+    # | gene_1 | H2O_30m_A | 20.01 |
+    # | gene_1 | PNA79_30m | 3     |
+    # | gene_2 | H2O_30m_A | 7     |
+    # |--------|-----------|-------|
+    # ==> the genes and the samples are in the order they first appear, and the values of the same gene and sample are added together
+    # ==> a gene which is 0 in all the samples has no row, so it is not in the result, it would have no variance and a loading of 0 anyway
+    geneCodes, geneNames = pd.factorize(triplets['gene'])
+    sampleCodes, sampleNames = pd.factorize(triplets['sample'])
+    if (geneCodes < 0).any() or (sampleCodes < 0).any():
+        raise ValueError('The columns "gene" and "sample" of the sparse data must not have empty cells')
+    matrix = scipySparse.coo_matrix(
+        (to_float_column(triplets['value']), (geneCodes, sampleCodes)), shape=(len(geneNames), len(sampleNames)))
+    return make_sparse_data(matrix, pd.Index(geneNames, name='gene'), [str(name) for name in sampleNames])
+
+
+def read_matrix_market(matrixMarketFile):
+    # Make the "convertedData" from a Matrix Market file, with one row for each gene and one column for each sample
+    # The Matrix Market format has no names, so the genes are named "gene_1", "gene_2", ... and the samples "sample_1", "sample_2", ...
+    matrix = scipyIo.mmread(matrixMarketFile)
+    numberOfGenes, numberOfSamples = matrix.shape
+    return make_sparse_data(
+        matrix,
+        pd.Index([f'gene_{i + 1}' for i in range(numberOfGenes)], name='gene'),
+        [f'sample_{i + 1}' for i in range(numberOfSamples)],
+    )
+#########################
+# End of SPARSE DATA
+#########################
+
+
+def decompress_body(body, contentEncoding):
+    # Decompress the request body, depending on the "Content-Encoding" header, like "gzip" or "zstd"
+    # If there is no "Content-Encoding" header, the body is not compressed
+    contentEncoding = (contentEncoding or '').strip().lower()
+    if contentEncoding in ('', 'identity'):
+        return body
+    if contentEncoding in ('gzip', 'x-gzip'):
+        return gzip.decompress(body)
+    if contentEncoding == 'deflate':
+        return zlib.decompress(body)
+    if contentEncoding == 'zstd':
+        if zstandard is None:
+            raise ValueError('The "zstandard" library needs to be installed to read data compressed with zstd')
+        return zstandard.ZstdDecompressor().stream_reader(BytesIO(body)).read()
+    raise ValueError(f'The content encoding "{contentEncoding}" is not supported')
+
+
+def arrow_table_to_dataframe(table):
+    # Convert an Arrow table to a DataFrame, column by column
+    # "split_blocks" and "self_destruct" let pandas take the columns one by one and free the Arrow memory at the same time, so the data is not held twice in memory
+    # A table with the columns "gene", "sample", "value" is the sparse data, check the NOTICE above
+    if table.column_names == SPARSE_TRIPLET_COLUMNS:
+        return triplets_to_sparse_data(table.to_pandas(split_blocks=True, self_destruct=True))
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def decode_request_body(body, mimetype, contentEncoding=None):
+    # Read the request body sent by the frontend, depending on its format ("Content-Type" header) and its compression ("Content-Encoding" header)
+    # The formats are:
+    # ==> JSON (the default), like [{"locus_tag": "gene_1", "H2O_30m_A": 20.01, ...}, ...]
+    # ==> Apache Arrow IPC stream ("application/vnd.apache.arrow.stream") or file ("application/vnd.apache.arrow.file")
+    # ==> Parquet ("application/vnd.apache.parquet")
+    # ==> Matrix Market ("application/x-matrix-market"), which is sparse, check the NOTICE above
+    # For JSON, the parsed JSON (a list or a dict) is returned, and for the other formats, a DataFrame is returned
+    body = decompress_body(body, contentEncoding)
+    mimetype = (mimetype or '').lower()
+
+    if mimetype in ARROW_STREAM_MIMETYPES:
+        return arrow_table_to_dataframe(pa.ipc.open_stream(pa.py_buffer(body)).read_all())
+    if mimetype in ARROW_FILE_MIMETYPES:
+        return arrow_table_to_dataframe(pa.ipc.open_file(pa.py_buffer(body)).read_all())
+    if mimetype in PARQUET_MIMETYPES:
+        return arrow_table_to_dataframe(pq.read_table(pa.BufferReader(body)))
+    if mimetype in MATRIX_MARKET_MIMETYPES:
+        return read_matrix_market(BytesIO(body))
+
+    if not body:
+        return None
+    return json.loads(body)
@@ -0,0 +1,246 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "datasetSessions.py" file lets the frontend upload a dataset only ONCE, then use it again by its "dataset_id"
+# Before, the frontend sent the whole dataset again with every click (scree plot, PCA plot, loadings table, ...)
+# Now the flow can be:
+# ==> the frontend sends the dataset to "/api/datasets", the backend prepares it (check the file "dataIngestion.py") and keeps it in memory
+# ==> the backend returns a "dataset_id"
+# ==> the frontend calls the "generate_*" endpoints with the "dataset_id" in the URL and no data, like "/api/generate_pca?dataset_id=..."
+#
+# Each dataset is removed after "DATASET_TTL_SECONDS" seconds without being used
+# When all the datasets together are bigger than "DATASET_MAX_BYTES", the least recently used datasets are removed first
+# The "dataset_id" is a hash of the content of the data, so uploading the same dataset twice gives the same "dataset_id"
+# ⭐⭐⭐
+#
+#########################
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Blueprint, abort, g, jsonify, request
+
+import dataIngestion
+import lazyImports
+import matrixStore
+import pcaCache
+import requestMetrics
+
+# The big libraries are only imported when they are used for the first time, check the file "lazyImports.py"
+pd = lazyImports.lazy_module('pandas')
+
+bp = Blueprint('datasetSessions', __name__)
+
+# How long a dataset is kept without being used, and the maximum memory for all datasets
+# They could be changed with the environment variables "PCA_DATASET_TTL_SECONDS" and "PCA_DATASET_MAX_BYTES"
+DATASET_TTL_SECONDS = int(os.environ.get('PCA_DATASET_TTL_SECONDS', 60 * 60))
+DATASET_MAX_BYTES = int(os.environ.get('PCA_DATASET_MAX_BYTES', 1024 * 1024 * 1024))
+
+_datasets = OrderedDict()
+_lock = threading.Lock()
+_totalBytes = 0
+
+
+def _remove_dataset(datasetId):
+    # Must be called with the lock
+    global _totalBytes
+    removedDataset = _datasets.pop(datasetId)
+    _totalBytes -= removedDataset['nbytes']
+
+
+def _remove_expired_datasets(now):
+    # Must be called with the lock
+    # The datasets are ordered from the least recently used to the most recently used, so we only need to check from the start
+    while _datasets:
+        datasetId, dataset = next(iter(_datasets.items()))
+        if now - dataset['lastUsed'] < DATASET_TTL_SECONDS:
+            break
+        _remove_dataset(datasetId)
+
+
+def _put_dataset(datasetId, convertedData):
+    # Keep a prepared dataset in memory, with "datasetId" as its key
+    global _totalBytes
+    nbytes = int(convertedData.memory_usage(index=True, deep=True).sum())
+    now = time.monotonic()
+
+    with _lock:
+        _remove_expired_datasets(now)
+        if datasetId in _datasets:
+            _datasets[datasetId]['lastUsed'] = now
+            _datasets.move_to_end(datasetId)
+        else:
+            _datasets[datasetId] = {
+                'data': convertedData,
+                'nbytes': nbytes,
+                'lastUsed': now,
+            }
+            _totalBytes += nbytes
+        # Remove the least recently used datasets until all datasets fit into "DATASET_MAX_BYTES"
+        # The dataset we just stored is always kept
+        while len(_datasets) > 1 and _totalBytes > DATASET_MAX_BYTES:
+            _remove_dataset(next(iter(_datasets)))
+
+
+def store_dataset(convertedData):
+    # Keep the prepared "convertedData" in memory and return its "dataset_id"
+    # If the on-disk store is used, the dataset is also saved there, so the other workers can use the same "dataset_id", check the file "matrixStore.py"
+    datasetId = pcaCache.hash_converted_data(convertedData)
+    _put_dataset(datasetId, convertedData)
+    if matrixStore.is_enabled():
+        matrixStore.save_dataset(datasetId, convertedData)
+    return datasetId
+
+
+def get_dataset(datasetId):
+    # Return the "convertedData" of a stored dataset
+    # If the dataset is not in the memory of this worker, it is loaded from the on-disk store (if it is used), without copying the numbers into memory
+    # If the dataset does not exist or was removed, the response is "404 Not Found", then the frontend needs to upload the dataset again
+    now = time.monotonic()
+    with _lock:
+        _remove_expired_datasets(now)
+        dataset = _datasets.get(datasetId)
+        if dataset is not None:
+            dataset['lastUsed'] = now
+            _datasets.move_to_end(datasetId)
+            return dataset['data']
+
+    convertedData = matrixStore.load_dataset(datasetId) if matrixStore.is_enabled() else None
+    if convertedData is None:
+        abort(404, description=f'The dataset "{datasetId}" does not exist or has expired, please upload it again')
+    pcaCache.remember_hash(convertedData, datasetId)
+    _put_dataset(datasetId, convertedData)
+    return convertedData
+
+
+def hash_request_body():
+    # The hash of the raw body of the request, with its format, it is only used to find a body which was already seen in the on-disk store
+    hashObject = hashlib.sha256()
+    hashObject.update(f'{request.mimetype}\x1f{request.headers.get("Content-Encoding", "")}\x1f'.encode())
+    hashObject.update(request.get_data())
+    return hashObject.hexdigest()
+
+
+def get_request_body():
+    # Read the body of the current request, which can be JSON, Arrow or Parquet, and can be compressed with gzip or zstd
+    # Check the function "decode_request_body()" in the file "dataIngestion.py" for the detail explanation
+    # The result is kept in "g" (the storage of Flask for the current request), so the body is only read once
+    # The time is added to the stage "parse" of the request, check the file "requestMetrics.py"
+    if 'requestBody' not in g:
+        with requestMetrics.stage('parse'):
+            g.requestBody = dataIngestion.decode_request_body(
+                request.get_data(), request.mimetype, request.headers.get('Content-Encoding'))
+    return g.requestBody
+
+
+def get_request_data():
+    # Return the prepared "convertedData" for the current request, it is used by all the "generate_*" functions
+    # The data can come from:
+    # ==> a "dataset_id" in the URL, like "/api/generate_pca?dataset_id=...", or in a JSON object like {"dataset_id": "..."}
+    # ==> the data itself in the request, as a JSON array (the same as before), or in a JSON object like {"data": [...]}
+    # ==> the data itself in the request, as Arrow or Parquet, check the file "dataIngestion.py"
+    datasetId = request.args.get('dataset_id')
+    if datasetId:
+        return get_dataset(datasetId)
+
+    # If the on-disk store is used and the same body was already sent before (to any worker), the prepared dataset is loaded from the store
+    # ==> the body is not parsed and prepared again, check the file "matrixStore.py"
+    bodyHash = None
+    if matrixStore.is_enabled() and request.content_length:
+        bodyHash = hash_request_body()
+        datasetId = matrixStore.find_body(bodyHash)
+        if datasetId:
+            return get_dataset(datasetId)
+
+    requestBody = get_request_body()
+    if isinstance(requestBody, dict) and ('data' in requestBody or 'dataset_id' in requestBody):
+        datasetId = requestBody.get('dataset_id')
+        requestBody = requestBody.get('data')
+
+    if datasetId:
+        return get_dataset(datasetId)
+
+    if requestBody is None:
+        raise ValueError('The request has no data and no "dataset_id"')
+    convertedData = prepare_request_data(requestBody)
+
+    if bodyHash is not None:
+        datasetId = pcaCache.hash_converted_data(convertedData)
+        matrixStore.save_dataset(datasetId, convertedData)
+        matrixStore.remember_body(bodyHash, datasetId)
+    return convertedData
+
+
+def prepare_request_data(requestBody):
+    # Convert the data into a DataFrame (if it is not already one, when it was sent as Arrow or Parquet), then prepare it
+    # Check the files "generatePCA.py" and "dataIngestion.py" for the detail explanation
+    if not isinstance(requestBody, pd.DataFrame):
+        requestBody = pd.DataFrame(data=requestBody)
+    # The numbers are kept as float64, or as float32 with "?dtype=float32" in the URL, check the file "pcaCache.py"
+    dtype = pcaCache.check_dtype(request.args.get('dtype', pcaCache.DEFAULT_DTYPE))
+    with requestMetrics.stage('coerce'):
+        return dataIngestion.prepare_numeric_data(requestBody, dtype=dtype)
+
+
+def get_int_arg(name, default, minimum=1, maximum=None):
+    # Read a whole number from the URL, like "?k=10", and check that it is between "minimum" and "maximum"
+    # A wrong value raises a ValueError, which is returned as "400 Bad Request" (check the file "app.py")
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f'The parameter "{name}" must be a whole number, but it is "{value}"')
+    if value < minimum:
+        raise ValueError(f'The parameter "{name}" must be at least {minimum}, but it is {value}')
+    if maximum is not None and value > maximum:
+        raise ValueError(f'The parameter "{name}" must be at most {maximum}, but it is {value}')
+    return value
+
+
+def describe_dataset(datasetId, convertedData):
+    return {
+        'dataset_id': datasetId,
+        'genes': convertedData.shape[0],
+        'samples': convertedData.shape[1],
+        'sample_names': list(convertedData.columns),
+        'sparse': dataIngestion.is_sparse_data(convertedData),
+        'dtype': pcaCache.get_data_dtype(convertedData).name,
+        'expires_in_seconds': DATASET_TTL_SECONDS,
+    }
+
+
+@bp.route('/api/datasets', methods=['POST'])
+def upload_dataset():
+    # Upload a dataset, the data is sent in the same way as for the "generate_*" functions
+    convertedData = get_request_data()
+    datasetId = store_dataset(convertedData)
+    return jsonify(describe_dataset(datasetId, convertedData)), 201
+
+
+@bp.route('/api/datasets/<datasetId>', methods=['GET'])
+def get_dataset_info(datasetId):
+    # Check if a dataset still exists, this also resets its expiry time
+    return jsonify(describe_dataset(datasetId, get_dataset(datasetId)))
+
+
+@bp.route('/api/datasets/<datasetId>', methods=['DELETE'])
+def delete_dataset(datasetId):
+    with _lock:
+        if datasetId in _datasets:
+            _remove_dataset(datasetId)
+    if matrixStore.is_enabled():
+        matrixStore.delete_dataset(datasetId)
+    return '', 204
@@ -0,0 +1,118 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# Check the file "generatePCA.py" for the detail explanation, as the first part of the code here is similar to the code in "generatePCA.py"
+# This "generateBundle.py" file returns the results of several "generate_*" functions in ONE response
+# ==> the frontend sends the data only once, the PCA is done only once, and the result of each part is made by the same "build_*()" functions used by the other files
+# ⭐⭐⭐
+#
+#########################
+
+from flask import Blueprint, jsonify, request
+
+import datasetSessions
+import generateLoadingsTable
+import generatePCA
+import generatePCA3D
+import generateScreePlot
+import generateTopFiveContributors
+import jsonEncoding
+import pcaCache
+import responseCaching
+
+bp = Blueprint('generateBundle', __name__)
+
+# The name of each section that can be asked for, and the function which makes the result of that section
+# The result of each section is the same as the result of its own API endpoint, for example:
+# ==> the "pca" section is the same as the result of "/api/generate_pca"
+# ==> the "loadings_table" section is the same as the result of "/api/generate_loadings_table"
+SECTION_BUILDERS = {
+    'pca': generatePCA.build_pca_plot,
+    'pca_3d': generatePCA3D.build_pca_3d_plot,
+    'scree_plot': generateScreePlot.build_scree_plot,
+    'loadings_table': generateLoadingsTable.build_loadings_table,
+    'top_five_contributors': generateTopFiveContributors.build_top_five_contributors,
+}
+
+# The sections which draw points, their layout of the traces could be chosen with "?trace_layout=...", check the file "plotTraces.py"
+TRACE_SECTIONS = ['pca', 'pca_3d', 'top_five_contributors']
+
+
+def build_sections(fittedPCA, sections, traceLayout='per_sample'):
+    # Make the result of each section from the same "fittedPCA", it is also used by the file "streamingPCA.py"
+    return {
+        section: SECTION_BUILDERS[section](fittedPCA, traceLayout=traceLayout) if section in TRACE_SECTIONS else SECTION_BUILDERS[section](fittedPCA)
+        for section in sections
+    }
+
+
+def get_sections():
+    # The sections are read from the URL first, like "?sections=pca,scree_plot", then from a JSON object like {"data": [...], "sections": [...]}
+    # Only a JSON object can have "sections", so a JSON array, Arrow or Parquet body is never parsed here
+    # ==> when the body was already prepared before, "get_request_data()" did not parse it, and it is not parsed here either
+    # A compressed JSON body can not be checked without decompressing it, so it is parsed like before
+    if request.args.get('sections'):
+        return request.args.get('sections').split(',')
+    if request.is_json and (request.headers.get('Content-Encoding') or request.get_data().lstrip()[:1] == b'{'):
+        requestBody = datasetSessions.get_request_body()
+        if isinstance(requestBody, dict) and requestBody.get('sections') is not None:
+            return requestBody['sections']
+    return list(SECTION_BUILDERS)
+
+
+@bp.route('/api/generate_bundle', methods=['GET', 'POST'])
+def generate_bundle():
+    #########################
+    # GET THE DATA AND THE SECTIONS
+    #########################
+    # The data can be sent in 2 ways:
+    # ==> the same JSON array as for the other "generate_*" functions, then all the sections are returned
+    # ==> a JSON object like {"data": [...], "sections": ["pca", "scree_plot"]}, then only the sections in "sections" are returned
+    # Instead of the data, the "dataset_id" of an uploaded dataset can be sent, check the file "datasetSessions.py" for the detail explanation
+    # The sections can also be chosen with the URL, like "/api/generate_bundle?sections=pca,scree_plot"
+    # Like the other "generate_*" functions, the solver of the PCA can be chosen with the URL, like "?solver=gram"
+    # The data is read first, so a body which was already prepared before is not parsed again (check "get_request_data()" in the file "datasetSessions.py")
+    convertedData = datasetSessions.get_request_data()
+    sections = get_sections()
+
+    unknownSections = [section for section in sections if section not in SECTION_BUILDERS]
+    if unknownSections:
+        return jsonify({
+            'error': f'Unknown sections: {", ".join(unknownSections)}',
+            'available_sections': list(SECTION_BUILDERS),
+        }), 400
+    #########################
+    # End of GET THE DATA AND THE SECTIONS
+    #########################
+
+    #########################
+    # CODE SIMILAR TO "generatePCA.py"
+    #########################
+    # If the frontend already has the result for this data and these options, "304 Not Modified" is returned here, check the file "responseCaching.py"
+    responseCaching.check_not_modified(convertedData)
+    fittedPCA = pcaCache.get_fitted_pca(
+        convertedData, solver=request.args.get('solver', 'auto'), dtype=request.args.get('dtype'))
+    #########################
+    # End of CODE SIMILAR TO "generatePCA.py"
+    #########################
+
+    # Make the result of each asked section from the same "fittedPCA"
+    # The result will be like this:
+    # {
+    #     "pca": {"data": [...], "layout": {...}},
+    #     "scree_plot": {"data": [...], "layout": {...}},
+    #     ...
+    # }
+    # The numbers could be rounded with the URL, like "?precision=4", check the file "jsonEncoding.py"
+    fittedPCA = jsonEncoding.get_rounded_pca(fittedPCA)
+    result = build_sections(fittedPCA, sections, traceLayout=request.args.get('trace_layout', 'per_sample'))
+
+    return jsonify(result)
@@ -14,67 +14,114 @@
 #
 #########################
 
-import pandas as pd
 from flask import Blueprint, jsonify, request
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
 
-bp = Blueprint('generateLoadingsTable', __name__)
+import datasetSessions
+import jsonEncoding
+import lazyImports
+import loadingsIndex as loadingsIndexModule
+import pcaCache
+import responseCaching
 
+# The big libraries are only imported when they are used for the first time, check the file "lazyImports.py"
+pd = lazyImports.lazy_module('pandas')
 
-def is_number_or_not(s):
-    # Check file "generatePCA.py" for the detail explanation
-    try:
-        if isinstance(s, str):
-            s = s.replace(',', '')
-        float(s)
-    except ValueError:
-        return False
-    else:
-        return True
+bp = Blueprint('generateLoadingsTable', __name__)
 
 
-@bp.route('/api/generate_loadings_table', methods=['POST'])
+@bp.route('/api/generate_loadings_table', methods=['GET', 'POST'])
 def generate_loadings_table():
 
     #########################
     # CODE SIMILAR TO "generatePCA.py"
     #########################
-    initialData = request.json
-    convertedData = pd.DataFrame(data=initialData)
-
-    non_numeric_columns = [col for col in convertedData.columns if not is_number_or_not(
-        convertedData[col].iloc[0])]
-    if len(non_numeric_columns) > 1:
-        convertedData.drop(non_numeric_columns[1:], axis=1, inplace=True)
-    convertedData.set_index(non_numeric_columns[0], inplace=True)
-
-    # Store the name of the first column
-    first_column_name = non_numeric_columns[0]
-
-    convertedData = convertedData.replace(',', '.', regex=True)
-    convertedData = convertedData.astype(float)
-    convertedData = convertedData.dropna()
-
-    standardScalerObject = StandardScaler()
-    dataAfterStandardization = standardScalerObject.fit_transform(
-        convertedData.T)
-
-    # The "n_components" parameter is used to specify the number of principal components to be created
-    # If not specified, then default value of "n_components" is min(n_samples, n_features)
-    # For example, if the number of samples is 24 and the number of genes is 1000, then the default value of "n_components" will be 24
-    # If the number of samples is 24 and the number of genes is 10, then the default value of "n_components" will be 10
-    pcaObject = PCA(n_components=4)
-    pcaObject.fit_transform(dataAfterStandardization)
-
+    # Check the file "datasetSessions.py" for the detail explanation
+    convertedData = datasetSessions.get_request_data()
+    # If the frontend already has the result for this data and these options, "304 Not Modified" is returned here, check the file "responseCaching.py"
+    responseCaching.check_not_modified(convertedData)
+
+    # The standardization and the PCA are done only once per dataset, and shared by all "generate_*" functions
+    # Check the file "pcaCache.py" for the detail explanation
+    # Then in "build_loadings_table()", we take only the first 4 principal components, as before with "n_components=4"
+    fittedPCA = pcaCache.get_fitted_pca(
+        convertedData, solver=request.args.get('solver', 'auto'), dtype=request.args.get('dtype'))
     #########################
     # End of CODE SIMILAR TO "generatePCA.py"
     #########################
 
+    # The function "build_loadings_table()" below is also used by the file "generateBundle.py"
+    # The numbers could be rounded with the URL, like "?precision=4", check the file "jsonEncoding.py"
+    fittedPCA = jsonEncoding.get_rounded_pca(fittedPCA)
+    return jsonify(build_loadings_table(fittedPCA))
+
+
+@bp.route('/api/query_loadings_table', methods=['GET', 'POST'])
+def query_loadings_table():
+    # Return only ONE page of the loadings table, check the file "loadingsIndex.py" for the detail explanation
+    # The data is sent in the same way as for "/api/generate_loadings_table", or better with a "dataset_id", like:
+    # ==> "/api/query_loadings_table?dataset_id=...&page=2&page_size=50&sort_by=PC1&order=desc&abs=true&search=cds-C4N14_04"
+    # The parameters in the URL are:
+    # ==> "page" and "page_size": which page, starting from 1, and how many genes in one page
+    # ==> "sort_by": "PC1", "PC2", ... or "gene", if it is not set, the genes are in the same order as in the data
+    # ==> "order": "desc" (the default) or "asc"
+    # ==> "abs": "true" to sort by the absolute value of the loadings
+    # ==> "search": only the genes whose names start with this text
+    # ==> "n_components": the number of principal components in the table, 4 by default, the same as "/api/generate_loadings_table"
+    convertedData = datasetSessions.get_request_data()
+    # If the frontend already has the result for this data and these options, "304 Not Modified" is returned here, check the file "responseCaching.py"
+    responseCaching.check_not_modified(convertedData)
+    fittedPCA = pcaCache.get_fitted_pca(
+        convertedData, solver=request.args.get('solver', 'auto'), dtype=request.args.get('dtype'))
+
+    order = request.args.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        raise ValueError(f'Unknown "order" "{order}", it must be "asc" or "desc"')
+
+    loadingsIndex = loadingsIndexModule.get_loadings_index(
+        fittedPCA, n_components=datasetSessions.get_int_arg('n_components', 4))
+    page = loadingsIndexModule.query_loadings(
+        loadingsIndex,
+        page=datasetSessions.get_int_arg('page', 1),
+        page_size=datasetSessions.get_int_arg('page_size', 50, maximum=loadingsIndexModule.MAX_PAGE_SIZE),
+        sort_by=request.args.get('sort_by') or None,
+        descending=order == 'desc',
+        absolute=request.args.get('abs', 'false').lower() == 'true',
+        search=request.args.get('search'),
+    )
+
+    # The "rows" have the same format as the result of "/api/generate_loadings_table", so the frontend can render them in the same way
+    first_column_name = fittedPCA['index'].name
+    labelPrincipalComponents = loadingsIndex['labelPrincipalComponents']
+    # The loadings of the page could be rounded with the URL, like "?precision=4", check the file "jsonEncoding.py"
+    # Only the loadings of this page are rounded, the sorting and the search still use the exact loadings
+    precision = jsonEncoding.get_precision(fittedPCA)
+    if precision is not None:
+        page['loadings'] = jsonEncoding.round_significant(page['loadings'], precision)
+    rows = [
+        {first_column_name: geneName, **dict(zip(labelPrincipalComponents, values))}
+        for geneName, values in zip(page['geneNames'].tolist(), page['loadings'].tolist())
+    ]
+
+    return jsonify({
+        'total': page['total'],
+        'page': page['page'],
+        'page_size': page['page_size'],
+        'pages': page['pages'],
+        'columns': [first_column_name] + labelPrincipalComponents,
+        'rows': rows,
+    })
+
+
+def build_loadings_table(fittedPCA):
+    pcaResult = pcaCache.slice_pca(fittedPCA, n_components=4)
+
+    # Store the name of the first column, which is the name of the index, like "locus_tag"
+    first_column_name = fittedPCA['index'].name
+
     #########################
     # GET THE LOADINGS AND CREATE THE JSON DATA
     #########################
-    # Use the "components_" attribute of the PCA object to get the loadings
+    # The loadings are the "components_" attribute of the PCA object
     # The "loadings" is a 2D array, where each row represents a principal component and each column represents a gene
     # The "loadings" will look like this:
     #
@@ -88,7 +135,7 @@ def generate_loadings_table():
     #      gene_1   gene_2   gene_3          gene_n
     # ]
     #
-    loadings = pcaObject.components_
+    loadings = pcaResult['components']
 
     # Then create an array of the names principal components, like "PC1", "PC2", etc.
     # Because above, we set "n_components=4", so we will have 4 principal components
@@ -115,7 +162,7 @@ def generate_loadings_table():
     loadings_df = pd.DataFrame(
         # At here we transpose the "loadings" to make PC1, PC2, PC3, PC4 become the columns
         loadings.T,
-        index=convertedData.index,
+        index=fittedPCA['index'],
         columns=labelPrincipalComponents
     )
 
@@ -192,11 +239,10 @@ def generate_loadings_table():
     loadings_list = loadings_df.reset_index().rename(
         columns={'index': first_column_name}).to_dict('records')
 
-    # Then now we convert the "loadings_list" to a JSON object
+    # Then the "loadings_list" is returned, and converted to a JSON object in the function "generate_loadings_table()" above
     # While reading here, read the frontend file "frontend/app/page.js", at the function "generateLoadingsTable()" and "renderLoadingsTable()" to see the flow in frontend about loadings table
-    result_json = jsonify(loadings_list)
     #########################
     # End of GET THE LOADINGS AND CREATE THE JSON DATA
     #########################
 
-    return result_json
+    return loadings_list
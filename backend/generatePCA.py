@@ -5,35 +5,20 @@
 #
 # --------------------------------
 
-import pandas as pd
 from flask import Blueprint, jsonify, request
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
+
+import datasetSessions
+import jsonEncoding
+import pcaCache
+import plotTraces
+import responseCaching
 
 # Create a Blueprint for the generatePCA.py file
 # The blueprint is used to define the route and will be added to the main file "app.py"
 bp = Blueprint('generatePCA', __name__)
 
 
-def is_number_or_not(s):
-    # This "is_number_or_not()" function checks if a string is a number
-    # Actually, there is a function called "is_number()" from pandas, but the "is_number()" only check number with dot as the decimal delimiter but not with comma
-    # ==> for example, "1.33" is considered as a number by "is_number()" but "1,33" is not
-    # That's why we have "is_number_or_not()", in which we use s.replace(',', '') to handle the data that may contain comma as the decimal delimiter
-    # This function is then used to identify which columns contain non-numeric value
-    try:
-        # If the value is a string, then replace the comma with an empty string, then check if it is a number
-        if isinstance(s, str):
-            s = s.replace(',', '')
-        # If the value is already a number, then convert it to a float
-        float(s)
-    except ValueError:
-        return False
-    else:
-        return True
-
-
-@bp.route('/api/generate_pca', methods=['POST'])
+@bp.route('/api/generate_pca', methods=['GET', 'POST'])
 def generate_pca():
     #########################
     # GET INITIAL DATA, DO INITIAL PREPARATIONS
@@ -41,9 +26,11 @@ def generate_pca():
     # Get the data from the request, which means from the frontend
     # The data is sent from the frontend as a JSON object
     # While reading here, read the file "frontend/app/page.js", at the function "generatePCAPlot()" to see how the data is sent to the backend here
-    initialData = request.json
+    # Instead of the data, the frontend can also send the "dataset_id" of a dataset which was uploaded before to "/api/datasets", like "/api/generate_pca?dataset_id=..."
+    # ==> then the data which is already prepared is used, check the file "datasetSessions.py" for the detail explanation
+    # Both cases are handled by the function "get_request_data()" in the file "datasetSessions.py", which does the steps below
 
-    # Now we convert the data into a DataFrame
+    # Firstly, the data is converted into a DataFrame
     # So let assume that after converting the "initialData" into a Dataframe, the "convertedData" is like this:
     # |-----------|-----------|-----------|-----------|-------------|-------------|
     # | locus_tag |  name     | H2O_30m_A | H2O_30m_B | PNA79_30m_A | PNA79_30m_B |
@@ -55,52 +42,14 @@ def generate_pca():
     # | ...       |  ...      | ...       | ...       | ...         | ...         |
     # | gene_n    |  gene_n   | 11.96     | 12.23     | 32.27       | 12.31       |
     # |-----------|-----------|-----------|-----------|-------------|-------------|
-    convertedData = pd.DataFrame(data=initialData)
-
-    # Identify columns in the first row that contain non-numeric values
-    # For example, with the data above we have:
-    # |-----------|-----------|-----------|-----------|-------------|-------------|
-    # | locus_tag |  name     | H2O_30m_A | H2O_30m_B | PNA79_30m_A | PNA79_30m_B |
-    # |-----------|-----------|-----------|-----------|-------------|-------------|
-    # | gene_1    |  gene_1   | 20.01     | 10.77     | 20.65       | 19.87       |
-    # | gene_2    |  gene_2   | 21.68     | 23.13     | 37.43       | 49.37       |
-    # | gene_3    |  gene_3   | 41.70     | 39.89     | 41.95       | 28.21       |
-    # | gene_4    |  gene_4   | 24.46     | 19.94     | 30.98       | 30.68       |
-    # | ...       |  ...      | ...       | ...       | ...         | ...         |
-    # | gene_n    |  gene_n   | 11.96     | 12.23     | 32.27       | 12.31       |
-    # |-----------|-----------|-----------|-----------|-------------|-------------|
 
-    # ==> so it will take the first row and check:
-    # |-----------|-----------|-----------|-----------|-------------|-------------|
-    # | gene_1    |  gene_1   | 20.01     | 10.77     | 20.65       | 19.87       |
-    # |-----------|-----------|-----------|-----------|-------------|-------------|
-
-    # ==> then the "locus_tag" and "name" columns will be identified as non-numeric columns
-    # ==> then the result we have is:
-    # non_numeric_columns = ['locus_tag', 'name']
-    non_numeric_columns = [col for col in convertedData.columns if not is_number_or_not(
-        convertedData[col].iloc[0])]
-
-    # At here, if there are more than one non-numeric columns, just keep the first one, and remove the rest
-    # ==> in the example above, the "locus_tag" and "name" columns are non-numeric columns, so we only keep the "locus_tag" column, and remove the "name" column
-    # The "axis=1" means that we need column to be dropped, not row. Because row is axis=0, and column is axis=1
-    # The "inplace=True" means that the DataFrame will be modified directly, without creating a new DataFrame
-    # So now the "convertedData" DataFrame will be like this:
-    # |-----------|-----------|-----------|-------------|-------------|
-    # | locus_tag | H2O_30m_A | H2O_30m_B | PNA79_30m_A | PNA79_30m_B |
-    # |-----------|-----------|-----------|-------------|-------------|
-    # | gene_1    | 20.01     | 10.77     | 20.65       | 19.87       |
-    # | gene_2    | 21.68     | 23.13     | 37.43       | 49.37       |
-    # | gene_3    | 41.70     | 39.89     | 41.95       | 28.21       |
-    # | gene_4    | 24.46     | 19.94     | 30.98       | 30.68       |
-    # | ...       | ...       | ...       | ...         | ...         |
-    # | gene_n    | 11.96     | 12.23     | 32.27       | 12.31       |
-    # |-----------|-----------|-----------|-------------|-------------|
-    if len(non_numeric_columns) > 1:
-        convertedData.drop(non_numeric_columns[1:], axis=1, inplace=True)
-
-    # Now we set the first non-numeric column as the index of the DataFrame
-    # ==> in the example above, the "locus_tag" column is now set as the index
+    # Then we prepare the "convertedData" so it only contains numbers, which is needed for the PCA
+    # This is done by the function "prepare_numeric_data()" in the file "dataIngestion.py", which does these steps:
+    # ==> find the columns that contain non-numeric values, like the "locus_tag" and "name" columns above
+    # ==> if there are more than one non-numeric columns, just keep the first one ("locus_tag"), and remove the rest ("name")
+    # ==> set the first non-numeric column as the index of the DataFrame
+    # ==> convert the values to float, in which the comma is also accepted as the decimal delimiter, like "20,01"
+    # ==> remove rows with NaN values
     # So now the "convertedData" DataFrame will be like this:
     #              |-----------|-----------|-------------|-------------|
     #              | H2O_30m_A | H2O_30m_B | PNA79_30m_A | PNA79_30m_B |
@@ -112,14 +61,10 @@ def generate_pca():
     #  ...         | ...       | ...       | ...         | ...         |
     #  gene_n      | 11.96     | 12.23     | 32.27       | 12.31       |
     #              |-----------|-----------|-------------|-------------|
-    convertedData.set_index(non_numeric_columns[0], inplace=True)
-
-    # Replace comma with dot in the DataFrame
-    convertedData = convertedData.replace(',', '.', regex=True)
-    # Convert string values to float
-    convertedData = convertedData.astype(float)
-    # Remove rows with NaN values
-    convertedData = convertedData.dropna()
+    # Check the file "dataIngestion.py" for the detail explanation
+    convertedData = datasetSessions.get_request_data()
+    # If the frontend already has the result for this data and these options, "304 Not Modified" is returned here, check the file "responseCaching.py"
+    responseCaching.check_not_modified(convertedData)
     #########################
     # End of GET INITIAL DATA, DO INITIAL PREPARATIONS
     #########################
@@ -127,29 +72,40 @@ def generate_pca():
     #########################
     # STANDARDIZE THE DATA
     #########################
-    # Create a scaling object by using StandardScaler() of scikit-learn
-    standardScalerObject = StandardScaler()
-    # If we put the data into the scaling object, the data will be standardized
+    # The data is standardized by using StandardScaler() of scikit-learn
     # At here, the data is transposed because the StandardScaler object expects the data to be in the form of [n_samples, n_features].
     # ==> so after transposing, samples (rows) are somethings like "H2O_30m_A", "H2O_30m_B", etc.; and features (columns) are somethings like "gene1", "gene2", etc.
-    dataAfterStandardization = standardScalerObject.fit_transform(
-        convertedData.T)
+    #
+    # The standardization and the PCA below are done only ONCE for each dataset, in the function "get_fitted_pca()" of the file "pcaCache.py"
+    # The result is kept in a cache, so the scree plot, the 3D PCA plot, the loadings table, etc. of the same dataset can reuse it instead of computing it again
+    # The way the PCA is computed can be chosen with the URL, like "/api/generate_pca?solver=gram", check the file "pcaSolvers.py" for the available solvers
+    # The type of the numbers can be chosen with the URL, like "/api/generate_pca?dtype=float32", which uses half of the memory, check the file "pcaCache.py"
+    fittedPCA = pcaCache.get_fitted_pca(
+        convertedData, solver=request.args.get('solver', 'auto'), dtype=request.args.get('dtype'))
     #########################
     # End of STANDARDIZE THE DATA
     #########################
 
+    # Then we prepare the result for the PCA plot from the "fittedPCA" in the function "build_pca_plot()" below, and return it as a JSON object
+    # The function "build_pca_plot()" is separated from this function so that it can also be used by the file "generateBundle.py"
+    # The layout of the traces could be chosen with the URL, like "?trace_layout=grouped", check the file "plotTraces.py"
+    # The numbers could be rounded with the URL, like "?precision=4", check the file "jsonEncoding.py"
+    fittedPCA = jsonEncoding.get_rounded_pca(fittedPCA)
+    return jsonify(build_pca_plot(fittedPCA, traceLayout=request.args.get('trace_layout', 'per_sample')))
+
+
+def build_pca_plot(fittedPCA, traceLayout='per_sample'):
     #########################
     # DO THE PCA
     #########################
-    # Create a PCA object by using PCA() of scikit-learn
-    # The "n_components" parameter is used to specify the number of principal components to be created
+    # The PCA in "pcaCache.py" is created by using PCA() of scikit-learn, without the "n_components" parameter
     # If not specified, then default value of "n_components" is min(n_samples, n_features)
     # For example, if the number of samples is 24 and the number of genes is 1000, then the default value of "n_components" will be 24
     # If the number of samples is 24 and the number of genes is 10, then the default value of "n_components" will be 10
-    pcaObject = PCA(n_components=2)
+    # For the 2D PCA plot, we only need the first 2 principal components, so we take them by using "slice_pca()" with "n_components=2"
+    pcaResult = pcaCache.slice_pca(fittedPCA, n_components=2)
 
-    # Then pass the standardized data above into the PCA object
-    # A notice is that the "dataAfterStandardization" was already transposed above, so now the "pcaData" will be like this:
+    # A notice is that the data was already transposed before the standardization, so now the "pcaData" will be like this:
     # |-----------|-----------|
     # |   PC1     |   PC2     |
     # |-----------|-----------|
@@ -162,7 +118,7 @@ def generate_pca():
     # ==> for example, the point for "H2O_30m_A" will be at coordinate x = -24.46, y = -6.99 in the plot
     #
     #
-    # NOTICE: if above, the "n_components" is set to another number, then the "pcaData" will have that number of columns, not only 2 columns
+    # NOTICE: if above, the "n_components" of "slice_pca()" is set to another number, then the "pcaData" will have that number of columns, not only 2 columns
     # ==> for example, if "n_components=5", then the "pcaData" will have 5 columns, including PC1, PC2, PC3, PC4, and PC5
     # ==> so the "pcaData" will be like this:
     # |-----------|-----------|-----------|-----------|-----------|
@@ -173,12 +129,12 @@ def generate_pca():
     # | 15.28     | -5.62     | 12.14     | 7.56      | 9.67      |   --> this is for PNA79_30m_A
     # | 16.87     | -6.93     | 13.57     | 9.67      | 12.78     |   --> this is for PNA79_30m_B
     # |-----------|-----------|-----------|-----------|-----------|
-    pcaData = pcaObject.fit_transform(dataAfterStandardization)
+    pcaData = pcaResult['scores']
 
-    # Now we get the variance percentage of each principal component by using the "explained_variance_ratio_" attribute of the PCA object
+    # Now we get the variance percentage of each principal component, which comes from the "explained_variance_ratio_" attribute of the PCA object
     # ==> so the "pcaVariancePercentage" will be an array, in which the first element is the variance percentage of the first principal component, the second element is the variance percentage of the second principal component, and so on
     # ==> for example, if the "pcaVariancePercentage" is [0.7419, 0.2581], it means that the first principal component explains 74.19% of the variance, and the second principal component explains 25.81% of the variance
-    pcaVariancePercentage = pcaObject.explained_variance_ratio_
+    pcaVariancePercentage = pcaResult['explained_variance_ratio']
     #########################
     # End of DO THE PCA
     #########################
@@ -211,16 +167,23 @@ def generate_pca():
     #########################
     # PREPARE THE RESULT --- Prepare the "data" for the <Plot/> component in frontend
     #########################
-    pcaScatterCoordinates = [
-        {
+    # With the default "per_sample" layout, each sample is ONE trace, like this:
+    # {
+    #     'type': 'scatter',
+    #     'mode': 'markers',
+    #     'name': 'H2O_30m_A',
+    #     'x': [-24.46],  ==> "x" is the (row i, first column) of the "pcaData" array, which is the PC1
+    #     'y': [-6.99],   ==> "y" is the (row i, second column) of the "pcaData" array, which is the PC2
+    #     'marker': {...},
+    # }
+    # With the "grouped" layout, the samples of the same condition are in ONE trace, check the file "plotTraces.py" for the detail explanation
+    pcaScatterCoordinates = plotTraces.build_traces(
+        names=fittedPCA['columns'],
+        axes={'x': pcaData[:, 0].tolist(), 'y': pcaData[:, 1].tolist()},
+        baseTrace={
             # For more information about the "type", "mode", "marker", etc. refer to this link: https://plotly.com/javascript/reference/
             'type': 'scatter',
             'mode': 'markers',
-            'name': convertedData.columns[i],
-            # "x" is the (row i, first column) of the "pcaData" array, which is the PC1
-            'x': [pcaData[i, 0]],
-            # "y" is the (row i, second column) of the "pcaData" array, which is the PC2
-            'y': [pcaData[i, 1]],
             'marker': {
                 'size': 12,
                 "color": defaultColor,
@@ -230,8 +193,9 @@ def generate_pca():
                     'width': 2,
                 }
             },
-        } for i in range(len(convertedData.columns))
-    ]
+        },
+        traceLayout=traceLayout,
+    )
     #########################
     # End of PREPARE THE RESULT --- Prepare the "data" for the <Plot/> component in frontend
     #########################
@@ -280,7 +244,7 @@ def generate_pca():
     #########################
     # PREPARE THE RESULT --- Combine "data" and "layout"
     #########################
-    # Combine the "data" and the "layout" into a dictionary and return it as a JSON object
+    # Combine the "data" and the "layout" into a dictionary, which is returned as a JSON object
     # While reading here, read the file "frontend/app/page.js", at the function "generatePCAPlot()" to see how the data is received from the backend here
     # So in the frontend, at the file "frontend/app/page.js", at the function "generatePCAPlot()", it will receive a JSON object, which contains the "data" and the "layout", which we will then use to put in the <Plot> component of Plotly.js in React frontend
     result = {
@@ -295,5 +259,5 @@ def generate_pca():
     # End of PREPARE THE RESULT
     #########################
 
-    # Return the result as a JSON object
-    return jsonify(result)
+    # Return the result, which is then converted to a JSON object in the function "generate_pca()" above
+    return result
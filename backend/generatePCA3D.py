@@ -16,75 +16,62 @@
 #
 #########################
 
-import pandas as pd
 from flask import Blueprint, jsonify, request
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
 
-
-def is_number_or_not(s):
-    # Check file "generatePCA.py" for the detail explanation
-    try:
-        if isinstance(s, str):
-            s = s.replace(',', '')
-        float(s)
-    except ValueError:
-        return False
-    else:
-        return True
+import datasetSessions
+import jsonEncoding
+import pcaCache
+import plotTraces
+import responseCaching
 
 
 bp = Blueprint('generatePCA3D', __name__)
 
 
-@bp.route('/api/generate_pca_3d', methods=['POST'])
+@bp.route('/api/generate_pca_3d', methods=['GET', 'POST'])
 def generate_pca_3d():
     #########################
     # CODE SIMILAR TO "generatePCA.py"
     #########################
-    initialData = request.json
-    convertedData = pd.DataFrame(data=initialData)
-
-    non_numeric_columns = [col for col in convertedData.columns if not is_number_or_not(
-        convertedData[col].iloc[0])]
-    if len(non_numeric_columns) > 1:
-        convertedData.drop(non_numeric_columns[1:], axis=1, inplace=True)
-    convertedData.set_index(non_numeric_columns[0], inplace=True)
-
-    convertedData = convertedData.replace(',', '.', regex=True)
-    convertedData = convertedData.astype(float)
-    convertedData = convertedData.dropna()
-
-    standardScalerObject = StandardScaler()
-    dataAfterStandardization = standardScalerObject.fit_transform(
-        convertedData.T)
-
-    # The "n_components" parameter is used to specify the number of principal components to be created
-    # If not specified, then default value of "n_components" is min(n_samples, n_features)
-    # For example, if the number of samples is 24 and the number of genes is 1000, then the default value of "n_components" will be 24
-    # If the number of samples is 24 and the number of genes is 10, then the default value of "n_components" will be 10
-    pcaObject = PCA(n_components=3)
-    pcaData = pcaObject.fit_transform(dataAfterStandardization)
-
-    pcaVariancePercentage = pcaObject.explained_variance_ratio_
+    # Check the file "datasetSessions.py" for the detail explanation
+    convertedData = datasetSessions.get_request_data()
+    # If the frontend already has the result for this data and these options, "304 Not Modified" is returned here, check the file "responseCaching.py"
+    responseCaching.check_not_modified(convertedData)
+
+    # The standardization and the PCA are done only once per dataset, and shared by all "generate_*" functions
+    # Check the file "pcaCache.py" for the detail explanation
+    # Then in "build_pca_3d_plot()", we take only the first 3 principal components, as before with "n_components=3"
+    fittedPCA = pcaCache.get_fitted_pca(
+        convertedData, solver=request.args.get('solver', 'auto'), dtype=request.args.get('dtype'))
     #########################
     # End of CODE SIMILAR TO "generatePCA.py"
     #########################
 
+    # The function "build_pca_3d_plot()" below is also used by the file "generateBundle.py"
+    # The layout of the traces could be chosen with the URL, like "?trace_layout=grouped", check the file "plotTraces.py"
+    # The numbers could be rounded with the URL, like "?precision=4", check the file "jsonEncoding.py"
+    fittedPCA = jsonEncoding.get_rounded_pca(fittedPCA)
+    return jsonify(build_pca_3d_plot(fittedPCA, traceLayout=request.args.get('trace_layout', 'per_sample')))
+
+
+def build_pca_3d_plot(fittedPCA, traceLayout='per_sample'):
+    pcaResult = pcaCache.slice_pca(fittedPCA, n_components=3)
+    pcaData = pcaResult['scores']
+
+    pcaVariancePercentage = pcaResult['explained_variance_ratio']
+
     defaultColor = "#272E3F"
     defaultBorderColor = "#000000"
     defaultTitleFontColor = "#000000"
 
-    pcaScatterCoordinates = [
-        {
+    pcaScatterCoordinates = plotTraces.build_traces(
+        names=fittedPCA['columns'],
+        # In the PCA 2D, at the file "generatePCA.py", we use only x and y coordinates
+        # In the PCA 3D, at this file, we use x, y, and z coordinates
+        axes={'x': pcaData[:, 0].tolist(), 'y': pcaData[:, 1].tolist(), 'z': pcaData[:, 2].tolist()},
+        baseTrace={
             'type': 'scatter3d',
             'mode': 'markers',
-            'name': convertedData.columns[i],
-            # In the PCA 2D, at the file "generatePCA.py", we use only x and y coordinates
-            # In the PCA 3D, at this file, we use x, y, and z coordinates
-            'x': [pcaData[i, 0]],
-            'y': [pcaData[i, 1]],
-            'z': [pcaData[i, 2]],
             'marker': {
                 'size': 12,
                 'color': defaultColor,
@@ -93,8 +80,9 @@ def generate_pca_3d():
                     'width': 2,
                 }
             },
-        } for i in range(len(convertedData.columns))
-    ]
+        },
+        traceLayout=traceLayout,
+    )
 
     layoutPCAPlotForReact = {
         'autosize': True,
@@ -131,4 +119,4 @@ def generate_pca_3d():
         'layout': layoutPCAPlotForReact
     }
 
-    return jsonify(result)
+    return result
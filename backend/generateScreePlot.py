@@ -17,63 +17,48 @@
 
 
 import numpy as np
-import pandas as pd
 from flask import Blueprint, jsonify, request
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-
-bp = Blueprint('generateScreePlot', __name__)
 
+import datasetSessions
+import jsonEncoding
+import pcaCache
+import responseCaching
 
-def is_number_or_not(s):
-    # Check file "generatePCA.py" for the detail explanation
-    try:
-        if isinstance(s, str):
-            s = s.replace(',', '')
-        float(s)
-    except ValueError:
-        return False
-    else:
-        return True
+bp = Blueprint('generateScreePlot', __name__)
 
 
-@bp.route('/api/generate_scree_plot', methods=['POST'])
+@bp.route('/api/generate_scree_plot', methods=['GET', 'POST'])
 def generate_scree_plot():
 
     #########################
     # CODE SIMILAR TO "generatePCA.py"
     #########################
-    initialData = request.json
-    convertedData = pd.DataFrame(data=initialData)
-
-    non_numeric_columns = [col for col in convertedData.columns if not is_number_or_not(
-        convertedData[col].iloc[0])]
-
-    if len(non_numeric_columns) > 1:
-        convertedData.drop(non_numeric_columns[1:], axis=1, inplace=True)
-    convertedData.set_index(non_numeric_columns[0], inplace=True)
-
-    convertedData = convertedData.replace(',', '.', regex=True)
-    convertedData = convertedData.astype(float)
-    convertedData = convertedData.dropna()
-
-    standardScalerObject = StandardScaler()
-    dataAfterStandardization = standardScalerObject.fit_transform(
-        convertedData.T)
-
-    # The "n_components" parameter is used to specify the number of principal components to be created
-    # If not specified, then default value of "n_components" is min(n_samples, n_features)
-    # For example, if the number of samples is 24 and the number of genes is 1000, then the default value of "n_components" will be 24
-    # If the number of samples is 24 and the number of genes is 10, then the default value of "n_components" will be 10
-    pcaObject = PCA(n_components=8)
-    pcaObject.fit_transform(dataAfterStandardization)
+    # Check the file "datasetSessions.py" for the detail explanation
+    convertedData = datasetSessions.get_request_data()
+    # If the frontend already has the result for this data and these options, "304 Not Modified" is returned here, check the file "responseCaching.py"
+    responseCaching.check_not_modified(convertedData)
+
+    # The standardization and the PCA are done only once per dataset, and shared by all "generate_*" functions
+    # Check the file "pcaCache.py" for the detail explanation
+    # Then in "build_scree_plot()", we take only the first 8 principal components, as before with "n_components=8"
+    fittedPCA = pcaCache.get_fitted_pca(
+        convertedData, solver=request.args.get('solver', 'auto'), dtype=request.args.get('dtype'))
     #########################
     # End of CODE SIMILAR TO "generatePCA.py"
     #########################
 
+    # The function "build_scree_plot()" below is also used by the file "generateBundle.py"
+    # The numbers could be rounded with the URL, like "?precision=4", check the file "jsonEncoding.py"
+    fittedPCA = jsonEncoding.get_rounded_pca(fittedPCA)
+    return jsonify(build_scree_plot(fittedPCA))
+
+
+def build_scree_plot(fittedPCA):
+    pcaResult = pcaCache.slice_pca(fittedPCA, n_components=8)
+
     # Get the percentage of variance of each principal component
     percentageOfVariance = np.round(
-        pcaObject.explained_variance_ratio_ * 100, decimals=1)
+        pcaResult['explained_variance_ratio'] * 100, decimals=1)
 
     # Create the labels for the principal components, like "PC1", "PC2", etc.
     labels = ['PC' + str(x) for x in range(1, len(percentageOfVariance)+1)]
@@ -83,8 +68,9 @@ def generate_scree_plot():
     cumulativeVariance = np.cumsum(percentageOfVariance)
 
     # Find the index where the cumulative variance exceeds 80%
-    index_80 = next(i for i, v in enumerate(
-        cumulativeVariance.tolist()) if v >= 80)
+    # With many samples, the first 8 principal components may explain less than 80% of the variance, then "index_80" is None and there is no dashed line
+    index_80 = next((i for i, v in enumerate(
+        cumulativeVariance.tolist()) if v >= 80), None)
 
     # Default colors
     defaultColor = '#272E3F'
@@ -155,7 +141,7 @@ def generate_scree_plot():
         'showlegend': False,
         'height': 400,
         # Add a dashed line at the 80% cumulative variance
-        'shapes': [
+        'shapes': [] if index_80 is None else [
             {
                 'type': 'line',
                 'xref': 'x',
@@ -181,4 +167,4 @@ def generate_scree_plot():
         'layout': layoutScreePlotForReact
     }
 
-    return jsonify(result)
+    return result
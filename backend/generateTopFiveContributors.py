@@ -16,132 +16,108 @@
 #########################
 
 
-import pandas as pd
 from flask import Blueprint, jsonify, request
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
-
-bp = Blueprint('generateTopFiveContributors', __name__)
 
+import datasetSessions
+import jsonEncoding
+import pcaCache
+import plotTraces
+import responseCaching
+import topContributors as topContributorsModule
 
-def is_number_or_not(s):
-    # Check file "generatePCA.py" for the detail explanation
-    try:
-        if isinstance(s, str):
-            s = s.replace(',', '')
-        float(s)
-    except ValueError:
-        return False
-    else:
-        return True
+bp = Blueprint('generateTopFiveContributors', __name__)
 
 
-@bp.route('/api/generate_top_five_contributors', methods=['POST'])
+@bp.route('/api/generate_top_five_contributors', methods=['GET', 'POST'])
 def generate_top_five_contributors():
 
     #########################
     # CODE SIMILAR TO "generatePCA.py"
     #########################
-    initialData = request.json
-    convertedData = pd.DataFrame(data=initialData)
-
-    non_numeric_columns = [col for col in convertedData.columns if not is_number_or_not(
-        convertedData[col].iloc[0])]
-    if len(non_numeric_columns) > 1:
-        convertedData.drop(non_numeric_columns[1:], axis=1, inplace=True)
-    convertedData.set_index(non_numeric_columns[0], inplace=True)
-
-    # Store the name of the first column
-    first_column_name = non_numeric_columns[0]
-
-    convertedData = convertedData.replace(',', '.', regex=True)
-    convertedData = convertedData.astype(float)
-    convertedData = convertedData.dropna()
-
-    standardScalerObject = StandardScaler()
-    dataAfterStandardization = standardScalerObject.fit_transform(
-        convertedData.T)
-
-    # The "n_components" parameter is used to specify the number of principal components to be created
-    # If not specified, then default value of "n_components" is min(n_samples, n_features)
-    # For example, if the number of samples is 24 and the number of genes is 1000, then the default value of "n_components" will be 24
-    # If the number of samples is 24 and the number of genes is 10, then the default value of "n_components" will be 10
-    pcaObject = PCA(n_components=4)
-    pcaObject.fit_transform(dataAfterStandardization)
+    # Check the file "datasetSessions.py" for the detail explanation
+    convertedData = datasetSessions.get_request_data()
+    # If the frontend already has the result for this data and these options, "304 Not Modified" is returned here, check the file "responseCaching.py"
+    responseCaching.check_not_modified(convertedData)
+
+    # The standardization and the PCA are done only once per dataset, and shared by all "generate_*" functions
+    # Check the file "pcaCache.py" for the detail explanation
+    # Then in "build_top_five_contributors()", we take only the first 4 principal components, as before with "n_components=4"
+    # The number of contributors and the number of principal components could be changed with the URL, like "?k=10&n_components=6"
+    fittedPCA = pcaCache.get_fitted_pca(
+        convertedData, solver=request.args.get('solver', 'auto'), dtype=request.args.get('dtype'))
     #########################
     # End of CODE SIMILAR TO "generatePCA.py"
     #########################
 
+    # The function "build_top_five_contributors()" below is also used by the file "generateBundle.py"
+    # The layout of the traces of the plot could be chosen with the URL, like "?trace_layout=grouped", check the file "plotTraces.py"
+    # The numbers could be rounded with the URL, like "?precision=4", check the file "jsonEncoding.py"
+    n_components = datasetSessions.get_int_arg('n_components', 4)
+    fittedPCA = jsonEncoding.get_rounded_pca(fittedPCA, n_components=max(n_components, jsonEncoding.ROUNDED_COMPONENTS))
+    return jsonify(build_top_five_contributors(
+        fittedPCA,
+        k=datasetSessions.get_int_arg('k', 5),
+        n_components=n_components,
+        traceLayout=request.args.get('trace_layout', 'per_sample')))
+
+
+def build_top_five_contributors(fittedPCA, k=5, n_components=4, traceLayout='per_sample'):
+    # "k" is the number of contributors for each principal component, and "n_components" is the number of principal components
+    # By default, they are 5 and 4, the same as before
+    pcaResult = pcaCache.slice_pca(fittedPCA, n_components=n_components)
+
+    # Store the name of the first column, which is the name of the index, like "locus_tag"
+    first_column_name = fittedPCA['index'].name
+
     #########################
-    # FIND THE TOP FIVE CONTRIBUTORS FOR EACH PRINCIPAL COMPONENT
+    # FIND THE TOP CONTRIBUTORS FOR EACH PRINCIPAL COMPONENT
     #########################
-    # Use the "components_" attribute of the PCA object to get the loadings
-    loadings = pcaObject.components_
+    # The loadings are the "components_" attribute of the PCA object
+    # It is a 2D array, one row for each principal component, one column for each gene
+    loadings = pcaResult['components']
 
     # Create the labels for the principal components, like "PC1", "PC2", etc.
     labelPrincipalComponents = [
         'PC' + str(i+1) for i in range(loadings.shape[0])]
 
-    # Create a DataFrame from the loadings
-    # The data frame will look like this:
-    #       |  PC1  |  PC2  |  PC3  | ... | PCn  |
-    # gene1 | 0.042 | 0.021 | -0.03 | ... | 0.12 |
-    # gene2 | 0.563 | 0.241 | 0.123 | ... | 0.8  |
-    # gene3 | 0.012 | 0.222 | 0.333 | ... | 0.011|
-    # ...   | ...   | ...   | ...   | ... | ...  |
-    # geneN | -0.23 | 0.512 | -0.215| ... | 0.033|
-    loadings_df = pd.DataFrame(
-        loadings.T,
-        index=convertedData.index,
-        columns=labelPrincipalComponents
-    )
-
-    top_five_contributors = []
-
-    # The "labelPrincipalComponents" is ["PC1", "PC2", "PC3", ...]
-    # So "for pc in labelPrincipalComponents" will iterate over each element in the "labelPrincipalComponents" list, which is "PC1", "PC2", "PC3", ...
-    for pc in labelPrincipalComponents:
-        # loadings_df[pc].map(abs): This make the value to be absolute to each element in the column "pc" of the "loadings_df"
-        # sort_values(ascending=False): Then this sorts the absolute values in the column "pc" of the "loadings_df" in descending order
-        # head(5): Then, this gets the first 5 elements in the sorted column pc of the DataFrame loadings_df
-        # .index.to_series(): This gets the index of these top 5 rows and converts it into a pandas Series. The index is basically the gene name, like "gene47", "gene89", "gene136", "gene277", "gene342"
-        # .map(loadings_df[pc]): This maps the index back to the original values in the "pc" column of "loadings_df". So, the result will like this:
-        # |-----------|----------|
-        # |  gene47   |  0.0782  |
-        # |  gene89   |  0.0775  |
-        # |  gene136  |  0.0773  |
-        # |  gene277  |  0.0761  |
-        # |  gene342  |  0.0758  |
-        # |-----------|----------|
-
-        contributors = loadings_df[pc].map(abs).sort_values(
-            ascending=False).head(5).index.to_series().map(loadings_df[pc])
-
-        # for gene, value in contributors.items(): This loop iterates over each item in the "contributors".
-        # top_five_contributors.append({"Principal component": pc, "Gene": gene, "Loadings": value}): This line appends a dictionary to the "top_five_contributors" list.
-        for gene, value in contributors.items():
-            top_five_contributors.append({
-                "Principal component": pc,
-                first_column_name: gene,
-                "Loadings": value
-            })
+    # Find the top "k" contributors of ALL the principal components at the same time
+    # Before, the genes were sorted again for each principal component with "loadings_df[pc].map(abs).sort_values(ascending=False).head(5)"
+    # Check the file "topContributors.py" for the detail explanation
+    topContributors = topContributorsModule.find_top_contributors(loadings, k)
+    geneNames = fittedPCA['index'].to_numpy()
+
+    # The result will look like this, the same as before:
+    # [
+    #     {"Principal component": "PC1", "locus_tag": "gene47", "Loadings": 0.0782},
+    #     {"Principal component": "PC1", "locus_tag": "gene89", "Loadings": 0.0775},
+    #     ...
+    #     {"Principal component": "PC2", "locus_tag": "gene12", "Loadings": -0.0691},
+    #     ...
+    # ]
+    top_five_contributors, top_positive_contributors, top_negative_contributors = [
+        topContributorsModule.to_records(
+            *topContributors[listName], geneNames, first_column_name, labelPrincipalComponents)
+        for listName in ['absolute', 'positive', 'negative']
+    ]
 
     # The default colors of the points in the PCA plot
     defaultColor = "#272E3F"
     defaultBorderColor = "#000000"
     defaultTileFontColor = "#000000"
 
-    pcaScatterCoordinates = [
-        {
+    # With the default "per_sample" layout, each contributor is ONE trace
+    # With the "grouped" layout, the contributors of the same principal component are in ONE trace, check the file "plotTraces.py"
+    pcaScatterCoordinates = plotTraces.build_traces(
+        names=[contributor[first_column_name] for contributor in top_five_contributors],
+        axes={
+            'x': [contributor["Principal component"] for contributor in top_five_contributors],
+            'y': [contributor["Loadings"] for contributor in top_five_contributors],
+        },
+        baseTrace={
             'type': 'scatter',
             # The mode is 'markers+text' is IMPORTANT here, because it will show the name next to the point on the chart
             # If we use 'markers' only, the name will not be shown
             'mode': 'markers+text',
-            'name': contributor[first_column_name],
-            'x': [contributor["Principal component"]],
-            'y': [contributor["Loadings"]],
-            # "text" here is the name of the contributor (which means the name of the gene in the original data set)
-            'text': [contributor[first_column_name]],
             # Position the text, we have "top", "bottom", "left", "top center", etc.
             'textposition': 'right',
             'marker': {
@@ -152,8 +128,12 @@ def generate_top_five_contributors():
                     'width': 2,
                 }
             },
-        } for contributor in top_five_contributors
-    ]
+        },
+        traceLayout=traceLayout,
+        # "text" here is the name of the contributor (which means the name of the gene in the original data set)
+        text=[contributor[first_column_name] for contributor in top_five_contributors],
+        groupKeys=[contributor["Principal component"] for contributor in top_five_contributors],
+    )
 
     # Prepare the layout for the PCA plot
     layoutPCAPlotForReact = {
@@ -178,19 +158,20 @@ def generate_top_five_contributors():
     }
 
     #########################
-    # End of FIND THE TOP FIVE CONTRIBUTORS FOR EACH PRINCIPAL COMPONENT
+    # End of FIND THE TOP CONTRIBUTORS FOR EACH PRINCIPAL COMPONENT
     #########################
 
-    # Convert the list to JSON
+    # Return the result, which is converted to JSON in the function "generate_top_five_contributors()" above
     # Read the frontend file "frontend/app/page.js" at the function "generateTopFiveContributors" to see the flow in frontend
-    result_json = jsonify({
+    return {
         # this one for the top 5 contributors TABLE
+        # The name is kept as before, even when "k" is not 5
         "top_five_contributors": top_five_contributors,
+        # the genes with the largest positive and the most negative loadings, "k" genes for each principal component
+        "top_positive_contributors": top_positive_contributors,
+        "top_negative_contributors": top_negative_contributors,
         # this one for the top 5 contributors PLOT
         "loadingsPlotCoordinates": pcaScatterCoordinates,
         # this one for the top 5 contributors PLOT
         "layout": layoutPCAPlotForReact
-    })
-
-    # Return the JSON data
-    return result_json
+    }
@@ -5,20 +5,196 @@
 #
 # --------------------------------
 
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 from io import BytesIO
 
-import pandas as pd
-from bson.json_util import ObjectId, loads
-from flask import Blueprint, Response, request
-from pymongo import MongoClient
+from flask import Blueprint, Response, jsonify, request
+
+import lazyImports
+import mongoAccess
+import requestMetrics
+
+# The big libraries are only imported when they are used for the first time, check the file "lazyImports.py"
+pd = lazyImports.lazy_module('pandas')
+pa = lazyImports.lazy_module('pyarrow')
+bsonJsonUtil = lazyImports.lazy_module('bson.json_util')
 
 # Create a Blueprint for the generatePCA.py file
 # The blueprint is used to define the route and will be added to the main app.py file
 bp = Blueprint('getDataFromDB', __name__)
 
-client = MongoClient()
-db = client.test
-visualizations = db.visualizations
+# The connection to MongoDB is in the file "mongoAccess.py"
+
+#########################
+# CACHE OF THE DECODED DATAFRAMES
+#########################
+# When the same Micromix "config" is opened again, the dataframe is not decoded from Parquet and converted to JSON again
+# ==> the decoded DataFrame, the original bytes and the JSON text are kept in an LRU cache (Least Recently Used), with the "config" as the key
+# To know if the document in MongoDB was changed, each entry of the cache has a "version":
+# ==> if the document has one of the "VERSION_FIELDS" (like an update timestamp or a hash), this field is the version, and only this field is read from MongoDB to check the cache
+# ==> otherwise, the version is a hash of the dataframe bytes, so the bytes are read again, but not decoded again
+# The maximum size of the cache could be changed with the environment variable "PCA_DB_CACHE_MAX_BYTES"
+DB_CACHE_MAX_BYTES = int(os.environ.get('PCA_DB_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+VERSION_FIELDS = ['updated_at', 'modified_at', 'dataframe_hash']
+DATAFRAME_FIELDS = ['filtered_dataframe', 'transformed_dataframe']
+
+_frameCache = OrderedDict()
+_frameCacheLock = threading.Lock()
+_frameCacheStats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,
+    'bytes': 0,
+}
+
+# The formats which can be returned, and their "Content-Type"
+RESPONSE_MIMETYPES = {
+    'json': 'application/json',
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.stream',
+}
+
+
+def get_version(db_entry, dataframeBytes):
+    # Return the version of a document, check "CACHE OF THE DECODED DATAFRAMES" above
+    for field in VERSION_FIELDS:
+        if db_entry.get(field) is not None:
+            return field, str(db_entry[field])
+    return None, hashlib.sha256(dataframeBytes).hexdigest()
+
+
+def get_dataframe_bytes(db_entry):
+    # Return the dataframe stored in the document
+    # It is the "filtered_dataframe" if it exists, otherwise the "transformed_dataframe"
+    # The dataframe is usually stored as Parquet bytes, but the "transformed_dataframe" can also be stored as a JSON text
+    if isinstance(db_entry.get('filtered_dataframe'), bytes):
+        return db_entry['filtered_dataframe']
+    transformedDataframe = db_entry['transformed_dataframe']
+    if isinstance(transformedDataframe, bytes):
+        return transformedDataframe
+    return transformedDataframe.encode()
+
+
+def decode_dataframe(dataframeBytes):
+    # Parquet files always start with the 4 bytes "PAR1", otherwise the dataframe is a JSON text
+    if dataframeBytes[:4] == b'PAR1':
+        return pd.read_parquet(BytesIO(dataframeBytes)), True
+    return pd.read_json(BytesIO(dataframeBytes), orient='records'), False
+
+
+def _get_cached_entry(configNumber, versionField, version):
+    # Return the entry of the cache if its version is still the same, otherwise None
+    with _frameCacheLock:
+        entry = _frameCache.get(configNumber)
+        if entry is not None and entry['versionField'] == versionField and entry['version'] == version:
+            _frameCache.move_to_end(configNumber)
+            _frameCacheStats['hits'] += 1
+            return entry
+        return None
+
+
+def _put_cached_entry(configNumber, entry):
+    with _frameCacheLock:
+        oldEntry = _frameCache.pop(configNumber, None)
+        if oldEntry is not None:
+            _frameCacheStats['bytes'] -= oldEntry['nbytes']
+        _frameCache[configNumber] = entry
+        _frameCacheStats['bytes'] += entry['nbytes']
+        # Remove the least recently used entries until the cache is within its limit, the entry we just added is always kept
+        while len(_frameCache) > 1 and _frameCacheStats['bytes'] > DB_CACHE_MAX_BYTES:
+            _, removedEntry = _frameCache.popitem(last=False)
+            _frameCacheStats['bytes'] -= removedEntry['nbytes']
+            _frameCacheStats['evictions'] += 1
+
+
+def _add_entry_bytes(entry, nbytes):
+    with _frameCacheLock:
+        entry['nbytes'] += nbytes
+        if _frameCache.get(entry['configNumber']) is entry:
+            _frameCacheStats['bytes'] += nbytes
+
+
+def get_cached_dataframe(configNumber):
+    # Return the cache entry of the dataframe of a Micromix "config", read it from MongoDB if it is not in the cache or was changed
+    # VERY IMPORTANT: the config number here must be in the JSON string format, so we need to put it as f'"{configNumber}"'
+    # For example, it should be like '"123123123"', with double quotes and single quotes
+    db_entry_id = bsonJsonUtil.ObjectId(bsonJsonUtil.loads(f'"{configNumber}"'))
+
+    # If we know that this document has a version field, firstly we only read this field, which is very small, to check the cache
+    with _frameCacheLock:
+        cachedEntry = _frameCache.get(configNumber)
+        knownVersionField = cachedEntry['versionField'] if cachedEntry is not None else None
+    if knownVersionField is not None:
+        versionEntry = mongoAccess.find_visualization(db_entry_id, VERSION_FIELDS)
+        if versionEntry is not None and versionEntry.get(knownVersionField) is not None:
+            entry = _get_cached_entry(configNumber, knownVersionField, str(versionEntry[knownVersionField]))
+            if entry is not None:
+                return entry
+
+    # Otherwise, read the dataframe, and only decode it if its version has changed
+    db_entry = mongoAccess.find_visualization(db_entry_id, VERSION_FIELDS + DATAFRAME_FIELDS)
+    if db_entry is None:
+        raise ValueError(f'The config "{configNumber}" does not exist')
+    dataframeBytes = get_dataframe_bytes(db_entry)
+    versionField, version = get_version(db_entry, dataframeBytes)
+    entry = _get_cached_entry(configNumber, versionField, version)
+    if entry is not None:
+        return entry
+
+    with _frameCacheLock:
+        _frameCacheStats['misses'] += 1
+    with requestMetrics.stage('parse'):
+        dataframe, isParquet = decode_dataframe(dataframeBytes)
+    entry = {
+        'configNumber': configNumber,
+        'versionField': versionField,
+        'version': version,
+        'dataframe': dataframe,
+        # The original Parquet bytes are kept, so they can be returned directly with "format=parquet"
+        'parquet': dataframeBytes if isParquet else None,
+        # If the dataframe was stored as a JSON text, this text is returned as it is, the same as before
+        # Otherwise, the JSON text and the Arrow bytes are only created the first time they are asked for
+        'json': None if isParquet else dataframeBytes.decode(),
+        'arrow': None,
+        'nbytes': int(dataframe.memory_usage(index=True, deep=True).sum()) + len(dataframeBytes),
+    }
+    _put_cached_entry(configNumber, entry)
+    return entry
+
+
+def get_entry_as(entry, responseFormat):
+    # Return the dataframe of a cache entry in the asked format, the result is kept in the entry for the next time
+    if entry[responseFormat] is None:
+        if responseFormat == 'json':
+            content = entry['dataframe'].to_json(orient='records')
+        elif responseFormat == 'parquet':
+            buffer = BytesIO()
+            entry['dataframe'].to_parquet(buffer, index=False)
+            content = buffer.getvalue()
+        else:
+            table = pa.Table.from_pandas(entry['dataframe'], preserve_index=False)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            content = sink.getvalue().to_pybytes()
+        entry[responseFormat] = content
+        _add_entry_bytes(entry, len(content))
+    return entry[responseFormat]
+
+
+def get_db_cache_stats():
+    with _frameCacheLock:
+        return {
+            **_frameCacheStats,
+            'entries': len(_frameCache),
+            'max_bytes': DB_CACHE_MAX_BYTES,
+        }
+#########################
+# End of CACHE OF THE DECODED DATAFRAMES
+#########################
 
 
 @bp.route('/api/getDataFromDB', methods=['GET', 'POST'])
@@ -26,18 +202,24 @@ def getDataFromDB():
     # While reading here, read the frontend file "frontend/app/page.js", at the function "fetchDataFromDB" to see the flow in frontend
     configNumber = request.json['config']
 
-    if configNumber != "undefined":
-        # VERY IMPORTANT: the config number here must be in the JSON string format, so we need to put it as f'"{configNumber}"'
-        # For example, it should be like '"123123123"', with double quotes and single quotes
-        db_entry_id = ObjectId(loads(f'"{configNumber}"'))
-        db_entry = db.visualizations.find_one({"_id": db_entry_id})
-        try:
-            data = pd.read_parquet(
-                BytesIO(db_entry['filtered_dataframe'])).to_json(orient='records')
-        except:
-            if type(db_entry['transformed_dataframe']) == bytes:
-                data = pd.read_parquet(
-                    BytesIO(db_entry['transformed_dataframe'])).to_json(orient='records')
-            else:
-                data = db_entry['transformed_dataframe']
-    return Response(data, mimetype="application/json")
+    # The format of the result can be chosen with "format" in the request, like {"config": "...", "format": "arrow"}, or in the URL, like "?format=arrow"
+    # ==> "json" (the default): the dataframe as a JSON array, the same as before
+    # ==> "parquet": the Parquet bytes stored in MongoDB, without any conversion
+    # ==> "arrow": the dataframe as an Apache Arrow IPC stream
+    # The "parquet" and "arrow" results can be sent directly to the "generate_*" endpoints or to "/api/datasets", check the file "dataIngestion.py"
+    responseFormat = request.json.get('format') or request.args.get('format', 'json')
+    if responseFormat not in RESPONSE_MIMETYPES:
+        raise ValueError(f'Unknown format "{responseFormat}", the format must be one of: {", ".join(RESPONSE_MIMETYPES)}')
+
+    if configNumber == "undefined":
+        raise ValueError('The config number is undefined')
+
+    entry = get_cached_dataframe(configNumber)
+    data = get_entry_as(entry, responseFormat)
+    return Response(data, mimetype=RESPONSE_MIMETYPES[responseFormat])
+
+
+@bp.route('/api/db_cache_stats', methods=['GET'])
+def db_cache_stats():
+    # Return the hit/miss counters of the cache of the decoded dataframes
+    return jsonify(get_db_cache_stats())
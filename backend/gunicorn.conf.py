@@ -0,0 +1,80 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "gunicorn.conf.py" file is the configuration to run the backend in production with Gunicorn
+# "python app.py" runs the development server of Flask, which is only ONE process: while one user waits for a big PCA, all the other users wait too
+# With Gunicorn:
+# ==> the master process loads the backend (pandas, scikit-learn, all the blueprints) and runs the warm-up ONCE, check the file "serverHealth.py"
+# ==> then it forks "PCA_WORKERS" worker processes, each one answers "PCA_THREADS" requests at the same time
+# ==> each worker uses "PCA_BLAS_THREADS" threads for the BLAS library (the matrix computations of numpy and scikit-learn)
+#     By default it is 1 thread, and there is one worker for each CPU, so the workers do not fight for the CPUs
+#
+# Run it from the "backend" folder:
+# ==> gunicorn -c gunicorn.conf.py
+#
+# The settings could be changed with the environment variables, like:
+# ==> PCA_WORKERS=4 PCA_THREADS=8 PCA_BLAS_THREADS=2 PCA_BIND=127.0.0.1:7000 gunicorn -c gunicorn.conf.py
+#
+# Graceful reload:
+# ==> "kill -HUP <pid of the master>": new workers are started, then the old workers finish their current requests and stop
+#     As the backend is loaded in the master ("preload_app"), the new workers still run the same code, this is for a new configuration
+# ==> to run a new version of the code without stopping: "kill -USR2 <pid of the master>" starts a new master with the new code,
+#     then "kill -WINCH <pid of the old master>" and "kill -QUIT <pid of the old master>" stop the old one after its requests are finished
+# The pid of the master is written into the file "PCA_PIDFILE", if it is set
+# ⭐⭐⭐
+#
+#########################
+
+import multiprocessing
+import os
+
+bind = os.environ.get('PCA_BIND', '0.0.0.0:7000')
+
+# The number of threads of the BLAS library must be set BEFORE numpy is imported, so it is done at here, before the backend is loaded
+BLAS_THREADS = int(os.environ.get('PCA_BLAS_THREADS', 1))
+for variableName in ['OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'BLIS_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS']:
+    os.environ[variableName] = str(BLAS_THREADS)
+
+workers = int(os.environ.get('PCA_WORKERS', max(1, multiprocessing.cpu_count() // BLAS_THREADS)))
+threads = int(os.environ.get('PCA_THREADS', 4))
+worker_class = 'gthread'
+
+# Load the backend in the master process, then fork the workers, check the NOTICE above
+wsgi_app = 'app:app'
+preload_app = True
+
+# A big PCA can take minutes, so a worker is only restarted after "PCA_WORKER_TIMEOUT" seconds without answering
+timeout = int(os.environ.get('PCA_WORKER_TIMEOUT', 300))
+# When stopping or reloading, the workers have "PCA_GRACEFUL_TIMEOUT" seconds to finish their current requests
+graceful_timeout = int(os.environ.get('PCA_GRACEFUL_TIMEOUT', 60))
+keepalive = 5
+
+# Restart each worker after "PCA_MAX_REQUESTS" requests, to give back the memory of the big datasets, 0 means never
+max_requests = int(os.environ.get('PCA_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+pidfile = os.environ.get('PCA_PIDFILE')
+accesslog = os.environ.get('PCA_ACCESS_LOG', '-')
+
+
+def when_ready(server):
+    # Called in the master process, after the backend is loaded and before the workers are forked
+    # The warm-up runs here, so all the workers are ready as soon as they start
+    import serverHealth
+    serverHealth.warm_up(server.app.wsgi())
+    server.log.info('The backend is warmed up, %s workers with %s threads each, %s BLAS threads per worker', workers, threads, BLAS_THREADS)
+
+
+def post_fork(server, worker):
+    # The BLAS library may have started its threads before the fork, so the number of threads is set again in each worker
+    # "threadpoolctl" is installed with scikit-learn
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(BLAS_THREADS)
@@ -0,0 +1,444 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "jobQueue.py" file runs the big PCA computations as "jobs", in other processes, instead of inside the request
+# With a big dataset, the standardization and the PCA can take tens of seconds
+# ==> the request keeps a worker of the backend busy all this time, and the proxy (like Nginx) may stop waiting and return "504 Gateway Timeout"
+# With the jobs, the flow is:
+# ==> the frontend sends the same request as before, but to "/api/jobs/<endpoint>", like "/api/jobs/generate_bundle?sections=pca,scree_plot"
+#     The body and the URL parameters are the same as for "/api/generate_bundle", check the list "JOB_ENDPOINTS" below
+# ==> the backend returns "202 Accepted" at once, with the "job_id" of the job
+# ==> the frontend asks "/api/jobs/<job_id>" every few seconds, to know the "status" of the job and the "stage" it is at ("parse", "coerce", "scale", "fit", ...)
+# ==> when the "status" is "done", the frontend gets the result at "/api/jobs/<job_id>/result", which is the same result as "/api/generate_bundle"
+#
+# The jobs are the same "generate_*" functions as before: the request is run again in a process of the pool, with the same URL, body and headers
+# ==> so each job does the same work and gives the same result as its endpoint, nothing is written twice
+#
+# The small requests keep the fast path: a request whose body (or uploaded dataset) is smaller than "JOB_SYNC_MAX_BYTES" is run at once in the request itself
+# ==> the backend returns "200 OK" with the job already "done", and its "result" inside, so there is no need to ask again
+#
+# The limits are:
+# ==> "PCA_JOB_WORKERS" processes run the jobs at the same time, the other jobs wait in the queue
+# ==> at most "PCA_JOB_MAX_QUEUED" jobs can wait or run at the same time, after that the backend returns "429 Too Many Requests"
+# ==> a finished job and its result are removed "PCA_JOB_RESULT_TTL_SECONDS" seconds after it finished
+# ==> "DELETE /api/jobs/<job_id>" cancels a job which is waiting; a job which is already running can not be stopped in the middle of the PCA,
+#     so it is marked as "cancelling" and its result is thrown away when it finishes, then it becomes "cancelled"
+#     A "cancelling" job still uses a process of the pool, so it is still counted in "PCA_JOB_MAX_QUEUED" until it finishes
+#
+# The jobs are kept in the memory of the backend process which received them
+# When the backend runs with several Gunicorn workers (check the file "gunicorn.conf.py"), the requests of one job must go to the same worker:
+# ==> as the computations are done in the process pool, one Gunicorn worker with several threads is enough, like "PCA_WORKERS=1 PCA_THREADS=8"
+# ⭐⭐⭐
+#
+#########################
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import Blueprint, Response, abort, current_app, g, jsonify, request
+
+import datasetSessions
+import pcaCache
+
+bp = Blueprint('jobQueue', __name__)
+
+# The number of processes which run the jobs, the maximum number of jobs waiting or running, and how long a finished job is kept
+# They could be changed with the environment variables "PCA_JOB_WORKERS", "PCA_JOB_MAX_QUEUED" and "PCA_JOB_RESULT_TTL_SECONDS"
+JOB_WORKERS = int(os.environ.get('PCA_JOB_WORKERS', 2))
+JOB_MAX_QUEUED = int(os.environ.get('PCA_JOB_MAX_QUEUED', 16))
+JOB_RESULT_TTL_SECONDS = int(os.environ.get('PCA_JOB_RESULT_TTL_SECONDS', 10 * 60))
+# The requests with a body up to this size are run at once, check the NOTICE above
+# For an uploaded dataset, it is the size of its numbers (8 bytes for each number), which is smaller than the same data as JSON,
+# but the dataset is also not parsed again, so more of it can be done at once
+# The data of the folder "database_for_testing" is about 1.3 MB as JSON, and takes less than 0.1 second
+JOB_SYNC_MAX_BYTES = int(os.environ.get('PCA_JOB_SYNC_MAX_BYTES', 4 * 1024 * 1024))
+# The processes of the pool are started with "spawn", a new Python process, because "fork" is not safe in a backend which has several threads
+JOB_START_METHOD = os.environ.get('PCA_JOB_START_METHOD', 'spawn')
+
+# The endpoints which can be run as a job, "/api/jobs/generate_pca" runs "/api/generate_pca", and so on
+JOB_ENDPOINTS = [
+    'generate_pca',
+    'generate_pca_3d',
+    'generate_scree_plot',
+    'generate_loadings_table',
+    'generate_top_five_contributors',
+    'generate_bundle',
+    'generate_parallel_analysis',
+    'query_loadings_table',
+    'streaming_pca',
+]
+
+# A "cancelling" job is still running in the pool, check the NOTICE above
+UNFINISHED_STATUSES = ['queued', 'running', 'cancelling']
+
+_jobs = {}
+_lock = threading.Lock()
+_pool = {
+    'executor': None,
+    'progressQueue': None,
+}
+
+# In the processes of the pool, the queue used to send the progress of the jobs back to the backend, check "start_worker()" below
+_workerProgressQueue = None
+
+
+#########################
+# RUN A JOB
+#########################
+def run_request(flaskApp, jobId, endpoint, queryString, body, headers, report_progress):
+    # Run the request of a job with the "generate_*" function of its endpoint, and return the status code, the body and the "Server-Timing" of the response
+    # A new app context is used, so the "g" of the job is not the "g" of the request which started it
+    with flaskApp.app_context(), flaskApp.test_request_context(
+            f'/api/{endpoint}', method='POST', query_string=queryString, data=body, headers=headers):
+        # Each stage of the request is sent as the progress of the job, check "stage()" in the file "requestMetrics.py"
+        g.stageListener = lambda stageName: report_progress(jobId, stageName)
+        response = flaskApp.full_dispatch_request()
+        return response.status_code, response.get_data(), response.headers.get('Server-Timing')
+
+
+def start_worker(progressQueue):
+    # Called once in each process of the pool, when it starts
+    # The backend is imported here and not at the top of the file, because "app.py" imports this file
+    # The process is warmed up like the backend (check the file "serverHealth.py"), so the first job does not wait for the import of scikit-learn
+    global _workerProgressQueue
+    _workerProgressQueue = progressQueue
+    import app as backend
+    import serverHealth
+    serverHealth.warm_up(backend.app)
+
+
+def report_worker_progress(jobId, stageName):
+    _workerProgressQueue.put((jobId, stageName))
+
+
+def run_job_in_worker(jobId, endpoint, queryString, body, headers, dataset):
+    # This function runs in a process of the pool, the backend is already imported by "start_worker()"
+    import app as backend
+
+    report_worker_progress(jobId, 'started')
+    # A job with a "dataset_id" gets the dataset itself from the backend, as the memory of this process does not have it
+    # Its hash is already known, so it is not computed again, check the file "pcaCache.py"
+    if dataset is not None:
+        datasetId, convertedData = dataset
+        pcaCache.remember_hash(convertedData, datasetId)
+        datasetSessions.store_dataset(convertedData)
+    return run_request(backend.app, jobId, endpoint, queryString, body, headers, report_worker_progress)
+#########################
+# End of RUN A JOB
+#########################
+
+
+#########################
+# THE PROCESS POOL
+#########################
+def get_executor():
+    # Start the process pool at the first job, so the backend does not start processes which are never used
+    # Must be called with the lock
+    if _pool['executor'] is None:
+        context = multiprocessing.get_context(JOB_START_METHOD)
+        progressQueue = context.Queue()
+        _pool['executor'] = ProcessPoolExecutor(
+            max_workers=JOB_WORKERS, mp_context=context, initializer=start_worker, initargs=(progressQueue,))
+        _pool['progressQueue'] = progressQueue
+        threading.Thread(target=read_progress, args=(progressQueue,), name='job-progress', daemon=True).start()
+    return _pool['executor']
+
+
+def read_progress(progressQueue):
+    # Read the progress sent by the processes of the pool, until the pool is replaced
+    while True:
+        item = progressQueue.get()
+        if item is None:
+            return
+        update_progress(*item)
+
+
+def update_progress(jobId, stageName):
+    with _lock:
+        job = _jobs.get(jobId)
+        if job is None or job['status'] not in UNFINISHED_STATUSES:
+            return
+        if stageName == 'started':
+            # A job which was cancelled while it was starting stays "cancelling"
+            if job['status'] == 'queued':
+                job['status'] = 'running'
+            job['startedAt'] = time.time()
+        else:
+            job['stage'] = stageName
+            job['stages'].append(stageName)
+
+
+def reset_broken_pool(executor):
+    # If a process of the pool was killed (for example by the system, when there is not enough memory), the pool can not be used anymore
+    # ==> it is replaced by a new pool at the next job
+    with _lock:
+        if _pool['executor'] is executor:
+            _pool['progressQueue'].put(None)
+            _pool['executor'] = None
+            _pool['progressQueue'] = None
+#########################
+# End of THE PROCESS POOL
+#########################
+
+
+#########################
+# THE JOBS
+#########################
+def _remove_expired_jobs(now):
+    # Must be called with the lock
+    for jobId in [jobId for jobId, job in _jobs.items() if job['finishedAt'] is not None and now - job['finishedAt'] > JOB_RESULT_TTL_SECONDS]:
+        del _jobs[jobId]
+
+
+def finish_job(jobId, status, statusCode=None, result=None, serverTiming=None, error=None):
+    with _lock:
+        job = _jobs.get(jobId)
+        if job is None:
+            return
+        if job['status'] == 'cancelled':
+            return
+        job['finishedAt'] = time.time()
+        # A job which was cancelled while it was waiting or running becomes "cancelled" now that it does not use the pool anymore, and its result is thrown away
+        if job['status'] == 'cancelling':
+            job['status'] = 'cancelled'
+            job['future'] = None
+            return
+        job['status'] = status
+        job['statusCode'] = statusCode
+        job['result'] = result
+        job['serverTiming'] = serverTiming
+        job['error'] = error
+        job['future'] = None
+
+
+def finish_job_from_response(jobId, statusCode, body, serverTiming):
+    # A response which is not "200 OK", like "400 Bad Request" for a wrong option, is a failed job with the error message of the response
+    if statusCode == 200:
+        finish_job(jobId, 'done', statusCode, body, serverTiming)
+        return
+    try:
+        error = json.loads(body).get('error')
+    except (ValueError, AttributeError):
+        error = None
+    finish_job(jobId, 'failed', statusCode, serverTiming=serverTiming, error=error or f'The request returned the status code {statusCode}')
+
+
+def on_job_done(jobId, executor, future):
+    # Called by the process pool when a job is finished (or cancelled)
+    if future.cancelled():
+        finish_job(jobId, 'cancelled')
+        return
+    exception = future.exception()
+    if exception is not None:
+        if isinstance(exception, BrokenProcessPool):
+            reset_broken_pool(executor)
+        finish_job(jobId, 'failed', 500, error=f'The job failed: {exception!r}')
+        return
+    finish_job_from_response(jobId, *future.result())
+
+
+def parse_server_timing(serverTiming):
+    # Read the times of the stages of the job from its "Server-Timing", like "parse;dur=12.1, fit;dur=250.2, total;dur=301.0", in seconds
+    stageSeconds = {}
+    for item in (serverTiming or '').split(','):
+        name, _, duration = item.strip().partition(';dur=')
+        if duration:
+            stageSeconds[name] = float(duration) / 1000
+    return stageSeconds
+
+
+def describe_job(job, now):
+    description = {
+        'job_id': job['id'],
+        'endpoint': job['endpoint'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'stages': list(job['stages']),
+        'waited_seconds': round((job['startedAt'] or now) - job['createdAt'], 3),
+        'run_seconds': round((job['finishedAt'] or now) - job['startedAt'], 3) if job['startedAt'] else None,
+    }
+    if job['status'] == 'queued':
+        description['queue_position'] = sum(
+            1 for otherJob in _jobs.values() if otherJob['status'] == 'queued' and otherJob['createdAt'] < job['createdAt']) + 1
+    if job['status'] == 'done':
+        description['result_url'] = f'/api/jobs/{job["id"]}/result'
+        description['stage_seconds'] = parse_server_timing(job['serverTiming'])
+    if job['status'] == 'failed':
+        description['error'] = job['error']
+        description['status_code'] = job['statusCode']
+    if job['finishedAt'] is not None:
+        description['expires_in_seconds'] = round(max(0, JOB_RESULT_TTL_SECONDS - (now - job['finishedAt'])), 1)
+    return description
+
+
+def get_job(jobId):
+    # Return the job, or "404 Not Found" if it does not exist or has expired
+    now = time.time()
+    with _lock:
+        _remove_expired_jobs(now)
+        job = _jobs.get(jobId)
+    if job is None:
+        abort(404, description=f'The job "{jobId}" does not exist or has expired')
+    return job, now
+
+
+def get_request_dataset():
+    # Return the "dataset_id" and the dataset of the request, if the request uses an uploaded dataset, otherwise None
+    # The "dataset_id" can be in the URL, or in a small JSON body like {"dataset_id": "...", "sections": [...]}
+    datasetId = request.args.get('dataset_id')
+    if not datasetId and (request.content_length or 0) <= JOB_SYNC_MAX_BYTES:
+        requestBody = datasetSessions.get_request_body()
+        if isinstance(requestBody, dict) and 'data' not in requestBody:
+            datasetId = requestBody.get('dataset_id')
+    if not datasetId:
+        return None
+    return datasetId, datasetSessions.get_dataset(datasetId)
+#########################
+# End of THE JOBS
+#########################
+
+
+@bp.route('/api/jobs/<endpoint>', methods=['POST'])
+def submit_job(endpoint):
+    # Start a job, check the NOTICE above
+    if endpoint not in JOB_ENDPOINTS:
+        raise ValueError(f'Unknown endpoint "{endpoint}", the endpoint must be one of: {", ".join(JOB_ENDPOINTS)}')
+
+    body = request.get_data()
+    queryString = request.query_string.decode()
+    headers = {name: request.headers[name] for name in ['Content-Type', 'Content-Encoding'] if name in request.headers}
+    dataset = get_request_dataset()
+    # The memory of the numbers of the dataset, without its gene names, and only the non-zero values for sparse data
+    size = int(dataset[1].memory_usage(index=False).sum()) if dataset is not None else len(body)
+
+    flaskApp = current_app._get_current_object()
+    now = time.time()
+    job = {
+        'id': uuid.uuid4().hex,
+        'endpoint': endpoint,
+        'status': 'queued',
+        'stage': None,
+        'stages': [],
+        'createdAt': now,
+        'startedAt': None,
+        'finishedAt': None,
+        'statusCode': None,
+        'result': None,
+        'serverTiming': None,
+        'error': None,
+        'future': None,
+    }
+
+    #########################
+    # THE FAST PATH OF THE SMALL REQUESTS
+    #########################
+    if size <= JOB_SYNC_MAX_BYTES:
+        job['status'] = 'running'
+        job['startedAt'] = now
+        with _lock:
+            _remove_expired_jobs(now)
+            _jobs[job['id']] = job
+        try:
+            statusCode, result, serverTiming = run_request(flaskApp, job['id'], endpoint, queryString, body, headers, update_progress)
+        except Exception as exception:
+            finish_job(job['id'], 'failed', 500, error=f'The job failed: {exception!r}')
+            raise
+        finish_job_from_response(job['id'], statusCode, result, serverTiming)
+        with _lock:
+            description = describe_job(job, time.time())
+        if job['status'] == 'done':
+            description['result'] = json.loads(result)
+        return jsonify(description), job['statusCode']
+    #########################
+    # End of THE FAST PATH OF THE SMALL REQUESTS
+    #########################
+
+    with _lock:
+        _remove_expired_jobs(now)
+        numberOfUnfinishedJobs = sum(1 for otherJob in _jobs.values() if otherJob['status'] in UNFINISHED_STATUSES)
+        if numberOfUnfinishedJobs >= JOB_MAX_QUEUED:
+            response = jsonify({'error': f'There are already {numberOfUnfinishedJobs} jobs waiting or running, please try again later'})
+            response.headers['Retry-After'] = '10'
+            return response, 429
+        executor = get_executor()
+        _jobs[job['id']] = job
+        job['future'] = executor.submit(run_job_in_worker, job['id'], endpoint, queryString, body, headers, dataset)
+    job['future'].add_done_callback(lambda future: on_job_done(job['id'], executor, future))
+
+    response = jsonify(describe_job(job, time.time()))
+    response.headers['Location'] = f'/api/jobs/{job["id"]}'
+    return response, 202
+
+
+@bp.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    now = time.time()
+    with _lock:
+        _remove_expired_jobs(now)
+        jobs = [describe_job(job, now) for job in _jobs.values()]
+    return jsonify({
+        'jobs': jobs,
+        'workers': JOB_WORKERS,
+        'max_queued': JOB_MAX_QUEUED,
+        'result_ttl_seconds': JOB_RESULT_TTL_SECONDS,
+        'sync_max_bytes': JOB_SYNC_MAX_BYTES,
+    })
+
+
+@bp.route('/api/jobs/<jobId>', methods=['GET'])
+def get_job_status(jobId):
+    job, now = get_job(jobId)
+    with _lock:
+        return jsonify(describe_job(job, now))
+
+
+@bp.route('/api/jobs/<jobId>/result', methods=['GET'])
+def get_job_result(jobId):
+    # Return the result of a finished job, it is the same JSON as the result of its endpoint
+    # ==> "202 Accepted" with the status of the job if it is not finished yet
+    # ==> the status code of the failed request (like "400 Bad Request") with its error if the job failed, and "410 Gone" if it was cancelled
+    job, now = get_job(jobId)
+    with _lock:
+        description = describe_job(job, now)
+    if job['status'] == 'done':
+        return Response(job['result'], status=200, mimetype='application/json')
+    if job['status'] in UNFINISHED_STATUSES:
+        response = jsonify(description)
+        response.headers['Retry-After'] = '2'
+        return response, 202
+    if job['status'] == 'cancelled':
+        return jsonify(description), 410
+    return jsonify(description), job['statusCode'] or 500
+
+
+@bp.route('/api/jobs/<jobId>', methods=['DELETE'])
+def cancel_job(jobId):
+    # Cancel a job which is not finished, or remove a finished job and its result, check the NOTICE above
+    job, now = get_job(jobId)
+    with _lock:
+        if job['status'] not in UNFINISHED_STATUSES:
+            _jobs.pop(jobId, None)
+            return '', 204
+        future = job['future']
+        job['status'] = 'cancelling'
+    # A job which is still waiting in the queue is removed from the queue, otherwise its result is thrown away when it finishes
+    # When it is removed from the queue, "on_job_done()" is called at once and the job is "cancelled" at once
+    # Otherwise it stays "cancelling" until it finishes, check "finish_job()" above
+    if future is not None:
+        future.cancel()
+    with _lock:
+        return jsonify(describe_job(job, time.time()))
@@ -0,0 +1,150 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "jsonEncoding.py" file makes the JSON of the responses faster and smaller
+# ==> the JSON encoder of Flask ("jsonify()") is replaced by "orjson" when it is installed, which is written in Rust and is many times faster
+#     "orjson" can also write numpy arrays and numpy numbers directly, without converting them to Python lists and floats first
+#     If "orjson" is not installed, the normal encoder of Flask is used, with the support of numpy added
+# ==> the numbers can be rounded with "?precision=..." in the URL, which is the number of significant digits, like "?precision=4" ==> 0.029971994349761027 becomes 0.02997
+#     For plotting, 4 to 6 significant digits are enough, and the JSON of the loadings table becomes about 1.5 times smaller
+#     When the PCA is done in float32 (check the file "pcaCache.py"), the numbers are rounded to "FLOAT32_PRECISION" digits by default
+#     ==> a float32 only has about 7 correct digits, the other digits like in 4.599999904632568 are only noise and make the JSON bigger
+#
+# The encoder could be chosen with the environment variable "PCA_JSON_ENCODER": "auto" (the default, "orjson" if it is installed), "orjson" or "default"
+# ⭐⭐⭐
+#
+#########################
+
+import os
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+import datasetSessions
+import pcaCache
+import requestMetrics
+
+# The "orjson" library is optional, if it is not installed, the normal encoder of Flask is used
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_ENCODER = os.environ.get('PCA_JSON_ENCODER', 'auto')
+
+# The number of principal components which are rounded by default, the plots and tables need at most 8 (the scree plot)
+ROUNDED_COMPONENTS = 8
+
+# The number of significant digits of the numbers of a PCA done in float32, when "?precision=..." is not set
+FLOAT32_PRECISION = 7
+
+
+class NumpyJSONProvider(DefaultJSONProvider):
+    # The normal encoder of Flask, which also accepts numpy arrays and numpy numbers
+    @staticmethod
+    def default(o):
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        if isinstance(o, np.generic):
+            return o.item()
+        return DefaultJSONProvider.default(o)
+
+    def response(self, *args, **kwargs):
+        # The time is added to the stage "serialize" of the request, check the file "requestMetrics.py"
+        with requestMetrics.stage('serialize'):
+            return super().response(*args, **kwargs)
+
+
+class OrjsonProvider(NumpyJSONProvider):
+    # The encoder with "orjson", the result is the same JSON as the normal encoder of Flask:
+    # ==> the keys are sorted, like "sort_keys = True" in Flask
+    # ==> the JSON is indented in debug mode, like Flask
+    # The only difference is that NaN and Infinity are written as "null", which is the valid JSON for them
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, indent='indent' in kwargs).decode()
+
+    def dumps_bytes(self, obj, indent=False):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+    def response(self, *args, **kwargs):
+        # The same as "response()" of Flask, but the bytes of "orjson" are used directly, without converting them to a text and back
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        with requestMetrics.stage('serialize'):
+            return self._app.response_class(self.dumps_bytes(obj, indent=indent) + b'\n', mimetype=self.mimetype)
+
+
+def get_json_provider_class():
+    if JSON_ENCODER == 'orjson' and orjson is None:
+        raise ImportError('"PCA_JSON_ENCODER" is "orjson", but the "orjson" library is not installed')
+    if JSON_ENCODER in ('auto', 'orjson') and orjson is not None:
+        return OrjsonProvider
+    return NumpyJSONProvider
+
+
+#########################
+# ROUNDING WITH "?precision=..."
+#########################
+def round_significant(values, precision):
+    # Round each value to "precision" significant digits, for example with precision = 3:
+    # ==> 0.029971994 ==> 0.0300
+    # ==> -24.480181 ==> -24.5
+    # The rounding is done on the whole array at once with numpy:
+    # ==> "magnitude" is the position of the first digit, like -2 for 0.0299 and 1 for -24.48
+    # ==> the value is multiplied by 10^(precision - 1 - magnitude), rounded to a whole number, then divided back
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.floor(np.log10(np.abs(values)))
+    # 0, NaN and Infinity have no magnitude, and the magnitude is limited so 10^(...) does not overflow
+    magnitude = np.clip(np.where(np.isfinite(magnitude), magnitude, 0), -290, 290)
+    factor = 10.0 ** (precision - 1 - magnitude)
+    return np.round(values * factor) / factor
+
+
+def get_precision(fittedPCA=None):
+    # Read "?precision=..." from the URL, None if it is not set
+    # It is between 1 and 17, because a float64 has at most 17 significant digits
+    # If it is not set and the "fittedPCA" was done in float32, "FLOAT32_PRECISION" is used, check the NOTICE above
+    precision = datasetSessions.get_int_arg('precision', None, minimum=1, maximum=17)
+    if precision is None and fittedPCA is not None and fittedPCA['components'].dtype == np.float32:
+        return FLOAT32_PRECISION
+    return precision
+
+
+def get_rounded_pca(fittedPCA, n_components=ROUNDED_COMPONENTS):
+    # Return the "fittedPCA" with its numbers rounded to "?precision=..." digits, or the same "fittedPCA" if there is no "?precision=..."
+    # Only the first "n_components" principal components are rounded (and kept), so the rounding is cheap even with many samples
+    # The rounded copy is kept in the entry of "pcaCache.py", so it is only made once for each precision
+    precision = get_precision(fittedPCA)
+    if precision is None:
+        return fittedPCA
+
+    key = (precision, n_components)
+    roundedViews = fittedPCA.setdefault('roundedViews', {})
+    if key not in roundedViews:
+        roundedPCA = {
+            **fittedPCA,
+            'scores': round_significant(fittedPCA['scores'][:, :n_components], precision),
+            'components': round_significant(fittedPCA['components'][:n_components], precision),
+            'explained_variance_ratio': round_significant(fittedPCA['explained_variance_ratio'], precision),
+            # The rounded copy has its own caches, the index of the loadings is made from the rounded loadings if it is asked for
+            'loadingsIndex': {},
+            'roundedViews': {},
+        }
+        roundedViews[key] = roundedPCA
+        pcaCache.add_entry_bytes(fittedPCA, roundedPCA['scores'].nbytes + roundedPCA['components'].nbytes)
+    return roundedViews[key]
+#########################
+# End of ROUNDING WITH "?precision=..."
+#########################
@@ -0,0 +1,67 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "lazyImports.py" file lets the backend start faster, by loading the big libraries only when they are used for the first time
+# Importing scikit-learn takes about 1 second (it also imports scipy), pandas about 0.5 second, and pymongo about 0.15 second
+# Before, all of them were imported by "import app", even to answer "/health", or when MongoDB is not used at all
+#
+# Instead of "import pandas as pd", the files write:
+#
+#   pd = lazyImports.lazy_module('pandas')
+#
+# ==> "pd" is a small object, pandas is NOT imported yet
+# ==> the first time something is read from it, like "pd.DataFrame", pandas is imported, then "pd" works exactly like the module
+#
+# In production, the warm-up imports everything before the workers are forked, so the first request of a user does not wait, check the file "serverHealth.py"
+# The time of "import app" is checked by "python -m benchmarks.checkImportTime"
+# ⭐⭐⭐
+#
+#########################
+
+import importlib
+import sys
+import threading
+
+_lock = threading.Lock()
+
+
+class LazyModule:
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        # "importlib" has its own lock, our lock is only there so the module is looked up once
+        if self._module is None:
+            with _lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attributeName):
+        # Only called for the attributes which are not in the object itself, so "_name" and "_module" do not come here
+        return getattr(self._load(), attributeName)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded yet'
+        return f'<lazy module "{self._name}", {state}>'
+
+
+def lazy_module(name):
+    # Return a lazy module for "name", like "pandas" or "sklearn.preprocessing"
+    # If the module is already imported, it is returned directly
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
@@ -0,0 +1,145 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "loadingsIndex.py" file lets the frontend ask for ONE page of the loadings table, instead of the whole table
+# Before, "/api/generate_loadings_table" returned every gene, which is megabytes of JSON for a large genome, and the browser had to render all of it
+# Now, for each fitted PCA (check the file "pcaCache.py"), an "index" of the loadings is made once, then kept together with the PCA:
+# ==> for each principal component, the order of the genes sorted by the loading, and sorted by the absolute value of the loading
+# ==> the order of the genes sorted by their names, to find the genes whose names start with a text ("prefix search")
+# Then each page is only a slice of these orders, so it costs a few microseconds and a few KB, whatever the number of genes
+# ⭐⭐⭐
+#
+#########################
+
+import threading
+
+import numpy as np
+
+import pcaCache
+
+# The maximum number of rows in one page
+MAX_PAGE_SIZE = 1000
+
+_lock = threading.Lock()
+
+
+def build_loadings_index(fittedPCA, n_components):
+    # Make the index of the loadings of the first "n_components" principal components, check the NOTICE above
+    # "loadings" has one row for each gene and one column for each principal component, like the loadings table
+    loadings = np.ascontiguousarray(pcaCache.slice_pca(fittedPCA, n_components)['components'].T)
+    labelPrincipalComponents = ['PC' + str(i+1) for i in range(loadings.shape[1])]
+    geneNames = fittedPCA['index'].to_numpy()
+
+    # For each sort key, "order" is the positions of the genes from the smallest to the largest value
+    # and "rank" is the opposite: the place of each gene in "order", which is used to sort the result of a search
+    # The positions are stored as int32 to use half of the memory of int64
+    sortValues = {'gene': np.char.lower(geneNames.astype(str))}
+    for column, pc in enumerate(labelPrincipalComponents):
+        sortValues[pc] = loadings[:, column]
+        sortValues['abs_' + pc] = np.abs(loadings[:, column])
+
+    orders = {}
+    ranks = {}
+    for sortKey, values in sortValues.items():
+        order = np.argsort(values, kind='stable').astype(np.int32)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        orders[sortKey] = order
+        ranks[sortKey] = rank
+
+    loadingsIndex = {
+        'loadings': loadings,
+        'geneNames': geneNames,
+        'labelPrincipalComponents': labelPrincipalComponents,
+        'orders': orders,
+        'ranks': ranks,
+        # The gene names in lower case and sorted, for the prefix search with "searchsorted()"
+        'sortedGeneNames': sortValues['gene'][orders['gene']],
+    }
+    loadingsIndex['nbytes'] = (
+        loadings.nbytes + loadingsIndex['sortedGeneNames'].nbytes
+        + sum(order.nbytes for order in orders.values()) + sum(rank.nbytes for rank in ranks.values()))
+    return loadingsIndex
+
+
+def get_loadings_index(fittedPCA, n_components):
+    # Return the index of the loadings of a fitted PCA, it is made the first time it is asked for, then kept in the entry of "pcaCache.py"
+    with _lock:
+        loadingsIndex = fittedPCA.setdefault('loadingsIndex', {}).get(n_components)
+    if loadingsIndex is not None:
+        return loadingsIndex
+
+    # The index is made outside of the lock, so other requests are not blocked while we are computing
+    loadingsIndex = build_loadings_index(fittedPCA, n_components)
+    with _lock:
+        if n_components in fittedPCA['loadingsIndex']:
+            return fittedPCA['loadingsIndex'][n_components]
+        fittedPCA['loadingsIndex'][n_components] = loadingsIndex
+    pcaCache.add_entry_bytes(fittedPCA, loadingsIndex['nbytes'])
+    return loadingsIndex
+
+
+def find_prefix(loadingsIndex, prefix):
+    # Return the positions of the genes whose names start with "prefix", without looking at the upper or lower case
+    # The sorted names are searched with "searchsorted()", which is a binary search, so it does not check every gene
+    # ==> the first name >= "prefix" is the start
+    # ==> the first name >= "prefix" with its last letter replaced by the next letter (like "cds-c4" ==> "cds-c5") is the end
+    prefix = prefix.lower()
+    sortedGeneNames = loadingsIndex['sortedGeneNames']
+    start = np.searchsorted(sortedGeneNames, prefix, side='left')
+    end = np.searchsorted(sortedGeneNames, prefix[:-1] + chr(ord(prefix[-1]) + 1), side='left')
+    return loadingsIndex['orders']['gene'][start:end]
+
+
+def query_loadings(loadingsIndex, page=1, page_size=50, sort_by=None, descending=True, absolute=False, search=None):
+    # Return one page of the loadings table
+    # ==> "sort_by" is "PC1", "PC2", ... or "gene", if it is None the genes are in the same order as in the data
+    # ==> "absolute" sorts by the absolute value of the loadings, like for the top contributors
+    # ==> "search" only keeps the genes whose names start with this text
+    labelPrincipalComponents = loadingsIndex['labelPrincipalComponents']
+    if sort_by is not None and sort_by != 'gene' and sort_by not in labelPrincipalComponents:
+        raise ValueError(f'Unknown "sort_by" "{sort_by}", it must be "gene" or one of: {", ".join(labelPrincipalComponents)}')
+    sortKey = sort_by
+    if absolute and sort_by not in (None, 'gene'):
+        sortKey = 'abs_' + sort_by
+
+    numberOfGenes = len(loadingsIndex['geneNames'])
+    if search:
+        # Only the genes found by the search are sorted, with their "rank" which was computed before
+        positions = find_prefix(loadingsIndex, search)
+        if sortKey is None:
+            positions = np.sort(positions)
+        else:
+            positions = positions[np.argsort(loadingsIndex['ranks'][sortKey][positions], kind='stable')]
+        if descending and sortKey is not None:
+            positions = positions[::-1]
+        total = len(positions)
+        positions = positions[(page - 1) * page_size:page * page_size]
+    else:
+        # Without a search, a page is just a slice of the precomputed order, from the end when it is descending
+        total = numberOfGenes
+        start = (page - 1) * page_size
+        end = min(page * page_size, total)
+        if sortKey is None:
+            positions = np.arange(start, max(start, end))
+        elif descending:
+            positions = loadingsIndex['orders'][sortKey][::-1][start:end]
+        else:
+            positions = loadingsIndex['orders'][sortKey][start:end]
+
+    return {
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'pages': -(-total // page_size),
+        'geneNames': loadingsIndex['geneNames'][positions],
+        'loadings': loadingsIndex['loadings'][positions],
+    }
@@ -0,0 +1,339 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "matrixStore.py" file keeps the prepared datasets and the fitted PCAs in a folder on the disk, as ".npy" files
+# When the backend runs with several worker processes, the caches in "datasetSessions.py" and "pcaCache.py" are in the memory of each process
+# ==> each worker would parse, prepare and fit the same dataset again, and keep its own copy of it
+# With this store:
+# ==> the first worker which prepares a dataset or fits a PCA writes it into the folder, with the hash of the data as the name (check "hash_converted_data()" in the file "pcaCache.py")
+# ==> the other workers open the ".npy" files with "mmap_mode", so the data is NOT copied into their memory, the operating system shares the same pages of the files between all the processes
+# ==> the hash of each request body is also kept, so the same body sent again to any worker is not parsed again, check "get_request_data()" in the file "datasetSessions.py"
+#
+# The store is only used when the environment variable "PCA_MATRIX_STORE_DIR" is set to a folder, like "/var/cache/pca-plot"
+# When the folder is bigger than "PCA_MATRIX_STORE_MAX_BYTES", the least recently used datasets are removed
+# ⭐⭐⭐
+#
+#########################
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+import dataIngestion
+import lazyImports
+import pcaSolvers
+
+# The big libraries are only imported when they are used for the first time, check the file "lazyImports.py"
+pd = lazyImports.lazy_module('pandas')
+sklearnPreprocessing = lazyImports.lazy_module('sklearn.preprocessing')
+scipySparse = lazyImports.lazy_module('scipy.sparse')
+
+STORE_DIR = os.environ.get('PCA_MATRIX_STORE_DIR')
+STORE_MAX_BYTES = int(os.environ.get('PCA_MATRIX_STORE_MAX_BYTES', 10 * 1024 * 1024 * 1024))
+
+# The files of a fitted PCA, which are saved as ".npy" files
+FIT_ARRAYS = ['scores', 'components', 'explained_variance_ratio', 'pca_mean', 'singular_values', 'scaler_mean', 'scaler_var', 'scaler_scale']
+
+_pruneLock = threading.Lock()
+
+
+def is_enabled():
+    return bool(STORE_DIR)
+
+
+def is_valid_hash(datasetHash):
+    # The names in the store are always sha256 hashes, anything else (like "../") is never used as a path
+    return re.fullmatch('[0-9a-f]{64}', datasetHash) is not None
+
+
+def get_dataset_dir(datasetHash):
+    return os.path.join(STORE_DIR, 'datasets', datasetHash)
+
+
+def get_fit_dir(datasetHash, solver):
+    return os.path.join(get_dataset_dir(datasetHash), 'fit-' + solver)
+
+
+def write_folder_atomically(finalDir, write_files):
+    # Write the files into a temporary folder first, then rename it to "finalDir"
+    # The rename is atomic, so the other workers never see a folder with only some of the files
+    # If another worker wrote the same folder at the same time, its folder is kept and ours is removed
+    parentDir = os.path.dirname(finalDir)
+    os.makedirs(parentDir, exist_ok=True)
+    temporaryDir = tempfile.mkdtemp(prefix='.tmp-', dir=parentDir)
+    try:
+        write_files(temporaryDir)
+        os.rename(temporaryDir, finalDir)
+    except OSError:
+        if not os.path.isdir(finalDir):
+            raise
+    finally:
+        shutil.rmtree(temporaryDir, ignore_errors=True)
+
+
+def mark_as_used(path):
+    # The time of the last use of a dataset is the modification time of its folder, it is used by "prune()"
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+#########################
+# DATASETS
+#########################
+def save_dataset(datasetHash, convertedData):
+    # Save the prepared "convertedData" of a dataset, if it is not already saved
+    # ==> "matrix.npy": the numbers, one row for each gene, one column for each sample
+    # ==> "index.npy": the gene names, as fixed-width text, so it can also be opened with "mmap_mode"
+    # ==> "names.json": the name of the gene column, like "locus_tag", and the sample names
+    # Sparse data (check the file "dataIngestion.py") is saved without its zeros, as the 3 arrays of a CSC matrix: "sparse_data.npy", "sparse_indices.npy" and "sparse_indptr.npy"
+    datasetDir = get_dataset_dir(datasetHash)
+    if os.path.exists(os.path.join(datasetDir, 'names.json')):
+        mark_as_used(datasetDir)
+        return
+    isSparse = dataIngestion.is_sparse_data(convertedData)
+
+    def write_files(folder):
+        if isSparse:
+            matrix = dataIngestion.get_sparse_matrix(convertedData)
+            for name in ['data', 'indices', 'indptr']:
+                np.save(os.path.join(folder, f'sparse_{name}.npy'), getattr(matrix, name))
+        else:
+            # The numbers keep their type, float64 or float32 (check "check_dtype()" in the file "pcaCache.py")
+            np.save(os.path.join(folder, 'matrix.npy'), np.ascontiguousarray(convertedData.to_numpy()))
+        index = convertedData.index.to_numpy()
+        np.save(os.path.join(folder, 'index.npy'), index.astype(str) if index.dtype == object else index, allow_pickle=False)
+        with open(os.path.join(folder, 'names.json'), 'w') as namesFile:
+            json.dump({
+                'index_name': convertedData.index.name,
+                'columns': [str(column) for column in convertedData.columns],
+                'sparse': isSparse,
+            }, namesFile)
+
+    write_folder_atomically(datasetDir, write_files)
+    prune()
+
+
+def load_dataset(datasetHash):
+    # Return the "convertedData" of a saved dataset, or None if it is not saved
+    # The numbers are NOT read into memory, the DataFrame uses the memory-mapped file directly
+    # ==> except for sparse data, whose non-zero values are copied into the sparse columns of the DataFrame
+    if not is_valid_hash(datasetHash):
+        return None
+    datasetDir = get_dataset_dir(datasetHash)
+    try:
+        with open(os.path.join(datasetDir, 'names.json')) as namesFile:
+            names = json.load(namesFile)
+        index = np.load(os.path.join(datasetDir, 'index.npy'), mmap_mode='r')
+        if names.get('sparse'):
+            sparseArrays = [np.load(os.path.join(datasetDir, f'sparse_{name}.npy')) for name in ['data', 'indices', 'indptr']]
+        else:
+            matrix = np.load(os.path.join(datasetDir, 'matrix.npy'), mmap_mode='r')
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    mark_as_used(datasetDir)
+    if names.get('sparse'):
+        return dataIngestion.make_sparse_data(
+            scipySparse.csc_matrix(tuple(sparseArrays), shape=(len(index), len(names['columns']))),
+            pd.Index(index, name=names['index_name']),
+            names['columns'],
+            dtype=sparseArrays[0].dtype,
+        )
+    return pd.DataFrame(
+        matrix,
+        index=pd.Index(index, name=names['index_name']),
+        columns=names['columns'],
+        copy=False,
+    )
+
+
+def delete_dataset(datasetHash):
+    if is_valid_hash(datasetHash):
+        remove_dataset_dir(get_dataset_dir(datasetHash))
+
+
+def remove_dataset_dir(datasetDir):
+    # Remove the folder of a dataset, with its fitted PCAs and the request bodies which give this dataset (check "remember_body()" below)
+    try:
+        bodyHashes = [name[len('body-'):] for name in os.listdir(datasetDir) if name.startswith('body-')]
+    except (FileNotFoundError, NotADirectoryError):
+        bodyHashes = []
+    for bodyHash in bodyHashes:
+        try:
+            os.remove(os.path.join(STORE_DIR, 'bodies', bodyHash))
+        except FileNotFoundError:
+            pass
+    shutil.rmtree(datasetDir, ignore_errors=True)
+
+
+def remember_body(bodyHash, datasetHash):
+    # Keep which dataset a request body gives, so the same body is not parsed again
+    # An empty file "body-<bodyHash>" is also written into the folder of the dataset, so the body is removed with its dataset by "prune()"
+    # If the dataset was already removed, the body is not kept
+    try:
+        open(os.path.join(get_dataset_dir(datasetHash), 'body-' + bodyHash), 'w').close()
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    bodiesDir = os.path.join(STORE_DIR, 'bodies')
+    os.makedirs(bodiesDir, exist_ok=True)
+    bodyPath = os.path.join(bodiesDir, bodyHash)
+    with tempfile.NamedTemporaryFile('w', dir=bodiesDir, prefix='.tmp-', delete=False) as bodyFile:
+        bodyFile.write(datasetHash)
+    os.replace(bodyFile.name, bodyPath)
+
+
+def find_body(bodyHash):
+    # Return the hash of the dataset given by a request body, or None if this body was never seen
+    try:
+        with open(os.path.join(STORE_DIR, 'bodies', bodyHash)) as bodyFile:
+            datasetHash = bodyFile.read()
+    except FileNotFoundError:
+        return None
+    # The dataset may have been removed by another worker while the body was kept, then the body is removed too
+    if not os.path.isdir(get_dataset_dir(datasetHash)):
+        try:
+            os.remove(os.path.join(STORE_DIR, 'bodies', bodyHash))
+        except FileNotFoundError:
+            pass
+        return None
+    return datasetHash
+#########################
+# End of DATASETS
+#########################
+
+
+#########################
+# FITTED PCA
+#########################
+def save_fit(datasetHash, solver, entry):
+    # Save a fitted PCA of "pcaCache.py" next to its dataset, if it is not already saved
+    # The standardized data is not saved, it can be computed again from the dataset and the saved StandardScaler
+    fitDir = get_fit_dir(datasetHash, solver)
+    if os.path.isdir(fitDir):
+        return
+
+    pcaObject = entry['pca']
+    scaler = entry['scaler']
+    arrays = {
+        'scores': entry['scores'],
+        'components': entry['components'],
+        'explained_variance_ratio': entry['explained_variance_ratio'],
+        'pca_mean': pcaObject.mean_,
+        'singular_values': pcaObject.singular_values_,
+        'scaler_mean': scaler.mean_,
+        'scaler_var': scaler.var_,
+        'scaler_scale': scaler.scale_,
+    }
+
+    def write_files(folder):
+        for name in FIT_ARRAYS:
+            np.save(os.path.join(folder, name + '.npy'), np.ascontiguousarray(arrays[name]))
+        with open(os.path.join(folder, 'fit.json'), 'w') as fitFile:
+            json.dump({
+                'solver': getattr(pcaObject, 'solver', solver),
+                'n_samples': int(pcaObject.n_samples_),
+                'scaler_with_mean': scaler.with_mean,
+                'total_variance': float(pcaObject.total_variance_),
+            }, fitFile)
+
+    write_folder_atomically(fitDir, write_files)
+    prune()
+
+
+def load_fit(datasetHash, solver, convertedData):
+    # Return a fitted PCA with the same keys as an entry of "pcaCache.py", or None if it is not saved
+    # All the arrays are memory-mapped, so a worker which loads a PCA fitted by another worker does not copy it
+    fitDir = get_fit_dir(datasetHash, solver)
+    try:
+        arrays = {name: np.load(os.path.join(fitDir, name + '.npy'), mmap_mode='r') for name in FIT_ARRAYS}
+        with open(os.path.join(fitDir, 'fit.json')) as fitFile:
+            fit = json.load(fitFile)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    mark_as_used(get_dataset_dir(datasetHash))
+
+    # Make the StandardScaler and the PCA objects again from the saved numbers, so they can also be used with "transform()"
+    # The StandardScaler of sparse data does not subtract the mean, check the file "pcaCache.py"
+    scaler = sklearnPreprocessing.StandardScaler(with_mean=fit.get('scaler_with_mean', True))
+    scaler.mean_ = arrays['scaler_mean']
+    scaler.var_ = arrays['scaler_var']
+    scaler.scale_ = arrays['scaler_scale']
+    scaler.n_features_in_ = len(scaler.mean_)
+    scaler.n_samples_seen_ = fit['n_samples']
+    pcaObject = pcaSolvers.PCAResult(
+        mean=arrays['pca_mean'],
+        components=arrays['components'],
+        singularValues=arrays['singular_values'],
+        numberOfSamples=fit['n_samples'],
+        totalVariance=fit['total_variance'],
+        solver=fit['solver'],
+    )
+
+    return {
+        'standardizedData': None,
+        'scaler': scaler,
+        'pca': pcaObject,
+        'scores': arrays['scores'],
+        'components': arrays['components'],
+        'explained_variance_ratio': arrays['explained_variance_ratio'],
+        'index': convertedData.index,
+        'columns': convertedData.columns,
+        # The arrays are in the files, not in the memory of this process, so they are not counted in the limit of "pcaCache.py"
+        'nbytes': 0,
+    }
+#########################
+# End of FITTED PCA
+#########################
+
+
+def get_folder_size(folder):
+    return sum(
+        os.path.getsize(os.path.join(root, fileName))
+        for root, _, fileNames in os.walk(folder) for fileName in fileNames)
+
+
+def prune():
+    # Remove the least recently used datasets (and their fitted PCAs and request bodies) until the store is smaller than "STORE_MAX_BYTES"
+    # A worker which still uses the removed files can keep using them, on Linux and macOS the files are only really deleted when they are closed
+    datasetsDir = os.path.join(STORE_DIR, 'datasets')
+    with _pruneLock:
+        try:
+            datasetDirs = [os.path.join(datasetsDir, name) for name in os.listdir(datasetsDir) if not name.startswith('.tmp-')]
+        except FileNotFoundError:
+            return
+        sizes = {datasetDir: get_folder_size(datasetDir) for datasetDir in datasetDirs}
+        totalSize = sum(sizes.values())
+        for datasetDir in sorted(datasetDirs, key=lambda path: os.path.getmtime(path)):
+            if totalSize <= STORE_MAX_BYTES:
+                break
+            remove_dataset_dir(datasetDir)
+            totalSize -= sizes[datasetDir]
+
+
+def get_store_stats():
+    if not is_enabled():
+        return {'enabled': False}
+    datasetsDir = os.path.join(STORE_DIR, 'datasets')
+    datasetNames = [name for name in os.listdir(datasetsDir) if not name.startswith('.tmp-')] if os.path.isdir(datasetsDir) else []
+    bodiesDir = os.path.join(STORE_DIR, 'bodies')
+    return {
+        'enabled': True,
+        'datasets': len(datasetNames),
+        'bodies': len([name for name in os.listdir(bodiesDir) if not name.startswith('.tmp-')]) if os.path.isdir(bodiesDir) else 0,
+        'bytes': get_folder_size(datasetsDir) if datasetNames else 0,
+        'max_bytes': STORE_MAX_BYTES,
+    }
@@ -0,0 +1,326 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "parallelAnalysis.py" file tells how many principal components are "real", with the parallel analysis of Horn
+# The scree plot (check the file "generateScreePlot.py") only draws a line where the cumulative variance reaches 80%, which is not a statistical test
+# The parallel analysis compares each principal component with what random data of the same size would give:
+# ==> the values of each gene are shuffled between the samples, so each gene keeps its own values, but the links between the genes are destroyed
+# ==> the PCA of this shuffled data gives the variance that a principal component explains "by chance"
+# ==> this is done many times ("permutations"), then for each principal component, we take the 95th percentile of the variance by chance
+# ==> the principal components which explain more variance than this percentile are "significant", counting from PC1 until the first one which is not
+#
+# Each permutation needs a full PCA, so it is done in parallel in a pool of processes:
+# ==> the standardized data is copied ONCE into a shared memory block, and all the processes read the same block, without their own copy
+# ==> each process only computes the eigenvalues of the small "samples x samples" Gram matrix of its shuffled data (check the file "pcaSolvers.py")
+# ==> the permutations are split into batches of "BATCH_SIZE", and each batch has its own random seed
+#     So the result only depends on "?seed=...", not on the number of processes
+# For 1000 permutations of 20000 genes x 18 samples, one process needs about 8 seconds, so with 8 processes it is about 1 second
+# ⭐⭐⭐
+#
+#########################
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context, shared_memory, util
+
+import numpy as np
+from flask import Blueprint, abort, jsonify, request
+
+import dataIngestion
+import datasetSessions
+import jobQueue
+import jsonEncoding
+import pcaCache
+import requestMetrics
+import responseCaching
+
+bp = Blueprint('parallelAnalysis', __name__)
+
+# The number of processes, the default and the maximum number of permutations
+# They could be changed with the environment variables "PCA_PARALLEL_ANALYSIS_WORKERS", "PCA_PARALLEL_ANALYSIS_PERMUTATIONS" and "PCA_PARALLEL_ANALYSIS_MAX_PERMUTATIONS"
+PARALLEL_ANALYSIS_WORKERS = int(os.environ.get('PCA_PARALLEL_ANALYSIS_WORKERS', os.cpu_count() or 1))
+PARALLEL_ANALYSIS_PERMUTATIONS = int(os.environ.get('PCA_PARALLEL_ANALYSIS_PERMUTATIONS', 200))
+PARALLEL_ANALYSIS_MAX_PERMUTATIONS = int(os.environ.get('PCA_PARALLEL_ANALYSIS_MAX_PERMUTATIONS', 10000))
+# The number of permutations done by one task of the pool, check the NOTICE above
+BATCH_SIZE = 25
+# The number of principal components which are tested by default
+DEFAULT_N_COMPONENTS = 20
+
+_lock = threading.Lock()
+# The lock of the permutations kept in the entries of "pcaCache.py", check "get_null_variance_ratios()" below
+_resultsLock = threading.Lock()
+_pool = {
+    'executor': None,
+}
+
+
+#########################
+# THE PERMUTATIONS, IN THE PROCESSES OF THE POOL
+#########################
+def start_worker():
+    # Each process of the pool uses only one thread for numpy, because the processes already use all the CPUs together
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+
+
+def permute_batch(sharedMemoryName, shape, dtype, seedSequence, numberOfPermutations, n_components):
+    # Do "numberOfPermutations" permutations of the shared standardized data, and return the share of the variance of the first "n_components" principal components of each one
+    # The data is "samples x genes", in the Fortran order, so the values of each gene are next to each other in memory, and shuffling them is fast
+    # The numbers are float64, or float32 when the PCA is done in float32 (check the file "pcaCache.py")
+    sharedMemory = shared_memory.SharedMemory(name=sharedMemoryName)
+    try:
+        standardizedData = np.ndarray(shape, dtype=dtype, buffer=sharedMemory.buf, order='F')
+        randomGenerator = np.random.default_rng(seedSequence)
+        shuffledData = np.empty(shape, dtype=dtype, order='F')
+        # The shuffling does not change the values of each gene, so the total variance is the same for all the permutations
+        totalVariance = np.einsum('ij,ij->', standardizedData, standardizedData)
+
+        varianceRatios = np.empty((numberOfPermutations, n_components))
+        for i in range(numberOfPermutations):
+            # Shuffle the values of each gene between the samples, each gene with its own random order
+            randomGenerator.permuted(standardizedData, axis=0, out=shuffledData)
+            # The eigenvalues of the Gram matrix are the variances of the principal components (times "n_samples - 1"), check the file "pcaSolvers.py"
+            # With more samples than genes, the "genes x genes" matrix is smaller and has the same non-zero eigenvalues
+            if shape[0] <= shape[1]:
+                gramMatrix = shuffledData @ shuffledData.T
+            else:
+                gramMatrix = shuffledData.T @ shuffledData
+            eigenvalues = np.linalg.eigvalsh(gramMatrix)[::-1][:n_components]
+            varianceRatios[i] = eigenvalues / totalVariance
+        return varianceRatios
+    finally:
+        del standardizedData
+        sharedMemory.close()
+#########################
+# End of THE PERMUTATIONS, IN THE PROCESSES OF THE POOL
+#########################
+
+
+def get_executor():
+    # The pool is started at the first parallel analysis and then kept, so the next ones do not wait for new processes
+    # The processes are started in the same way as the jobs, check "JOB_START_METHOD" in the file "jobQueue.py"
+    with _lock:
+        if _pool['executor'] is None:
+            _pool['executor'] = ProcessPoolExecutor(
+                max_workers=PARALLEL_ANALYSIS_WORKERS, mp_context=get_context(jobQueue.JOB_START_METHOD), initializer=start_worker)
+            # When the parallel analysis runs as a job (check the file "jobQueue.py"), this process is itself a process of a pool
+            # ==> when it stops, it waits for its own child processes BEFORE the pool below is stopped by Python, so it would wait forever
+            # ==> so the pool is stopped first, by the clean up of "multiprocessing"
+            #     Its priority is higher than the one of the queues of "multiprocessing" (10), which must still be open to stop the pool
+            util.Finalize(None, shutdown_executor, exitpriority=100)
+        return _pool['executor']
+
+
+def shutdown_executor():
+    with _lock:
+        executor = _pool['executor']
+        _pool['executor'] = None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def reset_broken_pool(executor):
+    # If a process of the pool was killed (for example by the system, when there is not enough memory), the pool can not be used anymore
+    # ==> it is stopped and replaced by a new pool at the next parallel analysis, like in the file "jobQueue.py"
+    with _lock:
+        if _pool['executor'] is executor:
+            _pool['executor'] = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_parallel_analysis(standardizedData, permutations, n_components, seed=0, executor=None):
+    # Return the share of the variance of the first "n_components" principal components for each permutation, as an array "permutations x n_components"
+    # The benchmark "benchmarks/benchmarkParallelAnalysis.py" gives its own "executor", to compare different numbers of processes
+    n_components = min(n_components, *standardizedData.shape)
+
+    # Copy the standardized data into a shared memory block, in the Fortran order, check "permute_batch()" above
+    sharedMemory = shared_memory.SharedMemory(create=True, size=max(standardizedData.nbytes, 1))
+    try:
+        sharedData = np.ndarray(standardizedData.shape, dtype=standardizedData.dtype, buffer=sharedMemory.buf, order='F')
+        sharedData[:] = standardizedData
+        del sharedData
+
+        batchSizes = [min(BATCH_SIZE, permutations - start) for start in range(0, permutations, BATCH_SIZE)]
+        seedSequences = np.random.SeedSequence(seed).spawn(len(batchSizes))
+
+        def permute_in_pool(executor):
+            futures = [
+                executor.submit(permute_batch, sharedMemory.name, standardizedData.shape, standardizedData.dtype, seedSequence, batchSize, n_components)
+                for seedSequence, batchSize in zip(seedSequences, batchSizes)
+            ]
+            return np.concatenate([future.result() for future in futures])
+
+        if executor is not None:
+            return permute_in_pool(executor)
+        # When the pool is broken, the permutations are done once more with a new pool, then "BrokenProcessPool" is raised
+        # The seeds do not change, so the result is the same as without the broken pool
+        for attempt in range(2):
+            executor = get_executor()
+            try:
+                return permute_in_pool(executor)
+            except BrokenProcessPool:
+                reset_broken_pool(executor)
+                if attempt > 0:
+                    raise
+    finally:
+        sharedMemory.close()
+        sharedMemory.unlink()
+
+
+def get_standardized_data(fittedPCA, convertedData):
+    # A PCA loaded from the on-disk store does not keep its standardized data (check the file "matrixStore.py"), then it is computed again with the saved StandardScaler
+    # For sparse data (check the file "pcaCache.py"), the standardized data is not centered and the permutations need the dense data, so it is made dense and centered here
+    if not dataIngestion.is_sparse_data(convertedData):
+        if fittedPCA['standardizedData'] is not None:
+            return fittedPCA['standardizedData']
+        return fittedPCA['scaler'].transform(convertedData.to_numpy(dtype=fittedPCA['components'].dtype).T)
+    standardizedData = fittedPCA['standardizedData']
+    if standardizedData is None:
+        standardizedData = fittedPCA['scaler'].transform(dataIngestion.get_sparse_matrix(convertedData).T.tocsr())
+    standardizedData = standardizedData.toarray()
+    return standardizedData - standardizedData.mean(axis=0)
+
+
+def build_parallel_analysis(fittedPCA, nullVarianceRatios, percentile):
+    # Compare the observed share of the variance of each principal component with the permutations, check the NOTICE above
+    n_components = nullVarianceRatios.shape[1]
+    observed = np.asarray(fittedPCA['explained_variance_ratio'][:n_components])
+    n_components = len(observed)
+    nullVarianceRatios = nullVarianceRatios[:, :n_components]
+
+    nullPercentile = np.percentile(nullVarianceRatios, percentile, axis=0)
+    # The p-value of each principal component: the share of the permutations which explain at least as much variance, with the +1 so it is never 0
+    pValues = (np.sum(nullVarianceRatios >= observed, axis=0) + 1) / (len(nullVarianceRatios) + 1)
+    isSignificant = observed > nullPercentile
+    significantComponents = int(np.argmin(isSignificant)) if not isSignificant.all() else n_components
+
+    labels = ['PC' + str(x) for x in range(1, n_components + 1)]
+    # The plot is like the scree plot (check the file "generateScreePlot.py"): the observed variance, and the variance by chance as a dashed line
+    plotData = [
+        {
+            'type': 'scatter',
+            'x': labels,
+            'y': np.round(observed * 100, decimals=2).tolist(),
+            'mode': 'lines+markers',
+            'name': 'Observed',
+            'line': {
+                'color': '#272E3F',
+                'width': 2,
+            },
+        },
+        {
+            'type': 'scatter',
+            'x': labels,
+            'y': np.round(nullPercentile * 100, decimals=2).tolist(),
+            'mode': 'lines+markers',
+            'name': f'Permutations ({percentile:g}th percentile)',
+            'line': {
+                'color': 'black',
+                'width': 2,
+                'dash': 'dash',
+            },
+        },
+    ]
+    layout = {
+        'xaxis': {
+            'title': 'Principal component',
+            'titlefont': {
+                'size': 20,
+                'color': '#000000',
+            },
+        },
+        'yaxis': {
+            'title': 'Explained variance (%)',
+            'titlefont': {
+                'size': 20,
+                'color': '#000000',
+            },
+        },
+        'autosize': True,
+        'hovermode': 'closest',
+        'showlegend': True,
+        'height': 400,
+    }
+
+    return {
+        'significant_components': significantComponents,
+        'permutations': len(nullVarianceRatios),
+        'percentile': percentile,
+        'observed': observed,
+        'null_mean': nullVarianceRatios.mean(axis=0),
+        'null_percentile': nullPercentile,
+        'p_values': pValues,
+        'data': plotData,
+        'layout': layout,
+    }
+
+
+def get_null_variance_ratios(fittedPCA, convertedData, permutations, n_components, seed):
+    # The permutations of the same dataset are kept in its entry of "pcaCache.py", so asking again with another "percentile" does not do them again
+    # The entry is shared by all the requests, so its "parallelAnalyses" is only read and changed with the lock, like in the file "loadingsIndex.py"
+    key = (permutations, n_components, seed)
+    with _resultsLock:
+        nullVarianceRatios = fittedPCA.setdefault('parallelAnalyses', {}).get(key)
+    if nullVarianceRatios is not None:
+        return nullVarianceRatios
+
+    # The permutations are done outside of the lock, so other requests are not blocked while we are computing
+    # If the pool is still broken after a new one was started, "503 Service Unavailable" is returned, and the next request starts a new pool again
+    try:
+        with requestMetrics.stage('permute'):
+            nullVarianceRatios = run_parallel_analysis(
+                get_standardized_data(fittedPCA, convertedData), permutations, n_components, seed=seed)
+    except BrokenProcessPool:
+        abort(503, description='The processes of the parallel analysis were stopped, please try again')
+    with _resultsLock:
+        if key in fittedPCA['parallelAnalyses']:
+            return fittedPCA['parallelAnalyses'][key]
+        fittedPCA['parallelAnalyses'][key] = nullVarianceRatios
+    pcaCache.add_entry_bytes(fittedPCA, nullVarianceRatios.nbytes)
+    return nullVarianceRatios
+
+
+def get_float_arg(name, default, minimum, maximum):
+    # Read a number from the URL, like "?percentile=99", a wrong value is returned as "400 Bad Request" (check the file "app.py")
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = float(value)
+    except ValueError:
+        raise ValueError(f'The parameter "{name}" must be a number, but it is "{value}"')
+    if not minimum <= value <= maximum:
+        raise ValueError(f'The parameter "{name}" must be between {minimum} and {maximum}, but it is {value}')
+    return value
+
+
+@bp.route('/api/generate_parallel_analysis', methods=['GET', 'POST'])
+def generate_parallel_analysis():
+    # The data is sent in the same way as for the other "generate_*" functions, check the file "generatePCA.py"
+    # The options are in the URL, like "?permutations=1000&percentile=95&n_components=20&seed=0"
+    # With many permutations and a big dataset, it can also be run as a job, with "/api/jobs/generate_parallel_analysis", check the file "jobQueue.py"
+    convertedData = datasetSessions.get_request_data()
+    responseCaching.check_not_modified(convertedData)
+    permutations = datasetSessions.get_int_arg(
+        'permutations', PARALLEL_ANALYSIS_PERMUTATIONS, maximum=PARALLEL_ANALYSIS_MAX_PERMUTATIONS)
+    n_components = datasetSessions.get_int_arg('n_components', DEFAULT_N_COMPONENTS)
+    seed = datasetSessions.get_int_arg('seed', 0, minimum=0)
+    percentile = get_float_arg('percentile', 95.0, 0, 100)
+
+    fittedPCA = pcaCache.get_fitted_pca(
+        convertedData, solver=request.args.get('solver', 'auto'), dtype=request.args.get('dtype'))
+
+    nullVarianceRatios = get_null_variance_ratios(fittedPCA, convertedData, permutations, n_components, seed)
+
+    # The observed variance could be rounded with the URL, like "?precision=4", and it is rounded by default when the PCA is done in float32, check the file "jsonEncoding.py"
+    return jsonify(build_parallel_analysis(jsonEncoding.get_rounded_pca(fittedPCA), nullVarianceRatios, percentile))
@@ -0,0 +1,287 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "pcaCache.py" file keeps the standardized data and ONE full-rank PCA per dataset in memory
+# When the frontend loads a dataset, it calls "generate_pca", "generate_pca_3d", "generate_scree_plot", "generate_loadings_table" and "generate_top_five_contributors"
+# ==> all of them used to run StandardScaler and PCA again on the same data, only with a different "n_components"
+# ==> now they all call "get_fitted_pca()" below, and just take the first 2, 3, 4 or 8 principal components they need from the same result
+#
+# The cache is an LRU cache (Least Recently Used): when it is full, the entry that was not used for the longest time is removed first
+# The key of the cache is a hash of the content of the data, so the same dataset posted again will hit the cache
+# The numbers can be float64 (the default) or float32, with "?dtype=float32" in the URL, check "check_dtype()" below
+# Sparse data (check the file "dataIngestion.py") stays sparse: it is scaled without centering, and the centering is done inside the "svds" solver (check the file "pcaSolvers.py")
+# ⭐⭐⭐
+#
+#########################
+
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+from flask import Blueprint, jsonify
+
+import dataIngestion
+import lazyImports
+import matrixStore
+import pcaSolvers
+import requestMetrics
+
+# The big libraries are only imported when they are used for the first time, check the file "lazyImports.py"
+sklearnPreprocessing = lazyImports.lazy_module('sklearn.preprocessing')
+
+bp = Blueprint('pcaCache', __name__)
+
+# The maximum number of datasets and the maximum number of bytes that the cache can hold
+# They could be changed with the environment variables "PCA_CACHE_MAX_ENTRIES" and "PCA_CACHE_MAX_BYTES"
+MAX_ENTRIES = int(os.environ.get('PCA_CACHE_MAX_ENTRIES', 16))
+MAX_BYTES = int(os.environ.get('PCA_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# The types of numbers which can be used for the data, the StandardScaler and the PCA
+# ==> "float64" is the same as before
+# ==> "float32" uses half of the memory and the matrix products are about 2 times faster, and its 7 significant digits are more than enough for the plots
+# The default could be changed with the environment variable "PCA_DTYPE"
+DTYPES = ['float64', 'float32']
+DEFAULT_DTYPE = os.environ.get('PCA_DTYPE', 'float64')
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,
+    'bytes': 0,
+}
+
+# The hash of each "convertedData" DataFrame which is still in memory, so a dataset used again by its "dataset_id" is not hashed again on every request
+# The key is the "id()" of the DataFrame, and the hash is removed automatically when the DataFrame is deleted
+# The "convertedData" DataFrames are never modified after they are prepared, so their hash does not change
+_hashes = {}
+
+
+def check_dtype(dtype):
+    # Check the "?dtype=..." of the URL, a wrong value raises a ValueError, which is returned as "400 Bad Request" (check the file "app.py")
+    if dtype not in DTYPES:
+        raise ValueError(f'Unknown dtype "{dtype}", the dtype must be one of: {", ".join(DTYPES)}')
+    return np.dtype(dtype)
+
+
+def hash_converted_data(convertedData):
+    # Make a hash from the content of the "convertedData" DataFrame (the values, the gene names and the sample names)
+    # ==> two requests with the same data will have the same hash, even if they are 2 different JSON objects
+    knownHash = _hashes.get(id(convertedData))
+    if knownHash is not None and knownHash[0]() is convertedData:
+        return knownHash[1]
+
+    with requestMetrics.stage('hash'):
+        hashObject = hashlib.sha256()
+        hashObject.update(str(convertedData.shape).encode())
+        # The data in float32 has another hash than the same data in float64, the float64 data has no mark so its hashes are the same as before
+        dtype = get_data_dtype(convertedData)
+        if dtype != np.float64:
+            hashObject.update(dtype.name.encode())
+        if dataIngestion.is_sparse_data(convertedData):
+            # Only the non-zero values and their positions, so the sparse data is never made dense
+            matrix = dataIngestion.get_sparse_matrix(convertedData)
+            matrix.sort_indices()
+            hashObject.update(b'sparse')
+            for array in [matrix.indptr.astype(np.int64), matrix.indices.astype(np.int64), matrix.data]:
+                hashObject.update(np.ascontiguousarray(array).tobytes())
+        else:
+            hashObject.update(np.ascontiguousarray(convertedData.to_numpy()).tobytes())
+        hashObject.update('\x1f'.join(map(str, convertedData.index)).encode())
+        hashObject.update('\x1f'.join(map(str, convertedData.columns)).encode())
+        dataHash = hashObject.hexdigest()
+    remember_hash(convertedData, dataHash)
+    return dataHash
+
+
+def remember_hash(convertedData, dataHash):
+    # Keep the hash of a DataFrame whose hash is already known, for example a dataset loaded from the file "matrixStore.py" with its hash as the name
+    dataId = id(convertedData)
+    _hashes[dataId] = (weakref.ref(convertedData, lambda _: _hashes.pop(dataId, None)), dataHash)
+
+
+def get_data_dtype(convertedData):
+    # The type of the numbers of the "convertedData", also for the sparse columns
+    dtype = convertedData.dtypes.iloc[0] if len(convertedData.columns) > 0 else np.dtype(np.float64)
+    return np.dtype(getattr(dtype, 'subtype', dtype))
+
+
+def fit_pca(convertedData, solver='auto', dtype='float64'):
+    # This is the same as what every "generate_*" function did before: standardize the data, then do the PCA
+    # The only difference is that "n_components" is not set, so ALL principal components are computed, which is min(n_samples, n_features)
+    # Check the file "generatePCA.py" for the detail explanation of the StandardScaler and the PCA
+    # Check the file "pcaSolvers.py" for the detail explanation of the "solver"
+    # The data is converted to "dtype" (if it is not already), then the StandardScaler and all the solvers keep this type
+    # The times are added to the stages "scale" and "fit" of the request, check the file "requestMetrics.py"
+    dtype = check_dtype(dtype)
+    with requestMetrics.stage('scale'):
+        if dataIngestion.is_sparse_data(convertedData):
+            # The sparse data is only divided by the standard deviation of each gene, "with_mean=False" keeps it sparse
+            # ==> the mean of each gene (divided by the same standard deviation) is subtracted later by the "svds" solver, check the file "pcaSolvers.py"
+            standardScalerObject = sklearnPreprocessing.StandardScaler(with_mean=False)
+            dataAfterStandardization = standardScalerObject.fit_transform(
+                dataIngestion.get_sparse_matrix(convertedData).T.tocsr().astype(dtype, copy=False))
+        else:
+            # The transposed data is given as a numpy array and not as a DataFrame, because scikit-learn checks the type of each column of a DataFrame
+            # ==> with 20000 genes, these checks took longer than the StandardScaler itself
+            # "to_numpy()" does not copy the numbers when they already have the right type, and ".T" is only a view
+            standardScalerObject = sklearnPreprocessing.StandardScaler()
+            dataAfterStandardization = standardScalerObject.fit_transform(
+                convertedData.to_numpy(dtype=dtype).T)
+
+    with requestMetrics.stage('fit'):
+        pcaObject, pcaData = pcaSolvers.fit_pca(dataAfterStandardization, solver=solver)
+
+    return {
+        'standardizedData': dataAfterStandardization,
+        'scaler': standardScalerObject,
+        'pca': pcaObject,
+        # "scores" is the "pcaData" in the file "generatePCA.py", one row for each sample, one column for each principal component
+        'scores': pcaData,
+        # "components" is the "loadings" in the file "generateLoadingsTable.py", one row for each principal component, one column for each gene
+        'components': pcaObject.components_,
+        'explained_variance_ratio': pcaObject.explained_variance_ratio_,
+        'index': convertedData.index,
+        'columns': convertedData.columns,
+        'nbytes': get_nbytes(dataAfterStandardization) + pcaData.nbytes + pcaObject.components_.nbytes,
+    }
+
+
+def get_nbytes(array):
+    # The memory of a numpy array, or of a sparse matrix of scipy (its non-zero values and their positions)
+    if hasattr(array, 'indptr'):
+        return array.data.nbytes + array.indices.nbytes + array.indptr.nbytes
+    return array.nbytes
+
+
+def get_fitted_pca(convertedData, solver='auto', dtype=None):
+    # Return the fitted PCA of the "convertedData", from the cache if we have it, otherwise fit it and put it into the cache
+    # The same data with a different solver or a different dtype is a different entry in the cache
+    # If "dtype" is not set, the type of the numbers of the "convertedData" is used, so a dataset uploaded with "?dtype=float32" stays in float32
+    if solver not in pcaSolvers.SOLVERS:
+        raise ValueError(f'Unknown solver "{solver}", the solver must be one of: {", ".join(pcaSolvers.SOLVERS)}')
+    dtype = dtype or get_data_dtype(convertedData).name
+    check_dtype(dtype)
+    dataHash = hash_converted_data(convertedData)
+    fitName = get_fit_name(solver, dtype)
+    key = dataHash + ':' + fitName
+    requestMetrics.set_dataset_shape(*convertedData.shape)
+
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            # Mark this entry as the most recently used one
+            _entries.move_to_end(key)
+            _stats['hits'] += 1
+            return entry
+        _stats['misses'] += 1
+
+    # The fitting is done outside of the lock, so other requests are not blocked while we are computing
+    # If the on-disk store is used, another worker may have already fitted this PCA, check the file "matrixStore.py"
+    entry = None
+    if matrixStore.is_enabled():
+        entry = matrixStore.load_fit(dataHash, fitName, convertedData)
+    if entry is None:
+        entry = fit_pca(convertedData, solver=solver, dtype=dtype)
+        if matrixStore.is_enabled():
+            matrixStore.save_fit(dataHash, fitName, entry)
+    return _add_entry(key, entry)
+
+
+def put_fitted_pca(convertedData, entry, dtype=None):
+    # Put a PCA which was fitted somewhere else into the cache, like the incremental refit in the file "projectSamples.py"
+    # It is kept under the name of its own solver, like "incremental" or "incremental-rank20", and NOT under a solver of "pcaSolvers.py"
+    # ==> the "generate_*" functions with the same data never take it for the PCA of their solver, which may be an approximation
+    # If the same data already has a PCA with that name in the cache, that one is kept and returned
+    dtype = dtype or get_data_dtype(convertedData).name
+    check_dtype(dtype)
+    dataHash = hash_converted_data(convertedData)
+    fitName = get_fit_name(entry['pca'].solver, dtype)
+    key = dataHash + ':' + fitName
+    with _lock:
+        knownEntry = _entries.get(key)
+        if knownEntry is not None:
+            _entries.move_to_end(key)
+            return knownEntry
+    if matrixStore.is_enabled():
+        matrixStore.save_fit(dataHash, fitName, entry)
+    return _add_entry(key, entry)
+
+
+def get_fit_name(solver, dtype):
+    # The float64 fits keep the same name as before, like "auto", and the float32 fits are like "auto-float32"
+    return solver if dtype == 'float64' else solver + '-' + dtype
+
+
+def _add_entry(key, entry):
+    entry['key'] = key
+
+    with _lock:
+        if key not in _entries:
+            _entries[key] = entry
+            _stats['bytes'] += entry['nbytes']
+        # Remove the least recently used entries until the cache is within its limits
+        # The entry we just added is always kept, even if it is bigger than "MAX_BYTES" on its own
+        while len(_entries) > 1 and (len(_entries) > MAX_ENTRIES or _stats['bytes'] > MAX_BYTES):
+            _, removedEntry = _entries.popitem(last=False)
+            _stats['bytes'] -= removedEntry['nbytes']
+            _stats['evictions'] += 1
+
+    return entry
+
+
+def slice_pca(entry, n_components):
+    # Take only the first "n_components" principal components from a cached entry
+    # ==> for example, the 2D PCA plot needs 2, the 3D PCA plot needs 3, the loadings table needs 4 and the scree plot needs 8
+    # If the dataset has less principal components than asked, then all of them are returned
+    return {
+        'scores': entry['scores'][:, :n_components],
+        'components': entry['components'][:n_components],
+        'explained_variance_ratio': entry['explained_variance_ratio'][:n_components],
+    }
+
+
+def add_entry_bytes(entry, nbytes):
+    # Count the memory of something which was added to an entry after it was fitted, like the index of the loadings in the file "loadingsIndex.py"
+    with _lock:
+        entry['nbytes'] += nbytes
+        if _entries.get(entry.get('key')) is entry:
+            _stats['bytes'] += nbytes
+
+
+def get_cache_stats():
+    with _lock:
+        return {
+            **_stats,
+            'entries': len(_entries),
+            'max_entries': MAX_ENTRIES,
+            'max_bytes': MAX_BYTES,
+        }
+
+
+def clear_cache():
+    with _lock:
+        _entries.clear()
+        _stats['bytes'] = 0
+
+
+@bp.route('/api/pca_cache_stats', methods=['GET'])
+def pca_cache_stats():
+    # Return the hit/miss counters of the cache, so we can check how often the cache is used
+    # The size of the on-disk store is also returned, check the file "matrixStore.py"
+    return jsonify({
+        **get_cache_stats(),
+        'matrix_store': matrixStore.get_store_stats(),
+    })
@@ -0,0 +1,246 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "pcaSolvers.py" file does the PCA of the standardized data, with a choice of HOW the PCA is computed (the "solver")
+# Our data is always very wide: a few dozen samples (rows) and tens of thousands of genes (columns)
+# ==> for this kind of data, the PCA can be computed much faster from the small "samples x samples" matrix, which is called the Gram matrix
+#
+# The solvers are:
+# ==> "sklearn": PCA() of scikit-learn, as it was done before
+# ==> "gram": the eigen decomposition of the Gram matrix X * X^T, used when the number of samples is much smaller than the number of genes
+# ==> "randomized": the randomized SVD of scikit-learn, used when both the number of samples and the number of genes are large
+#                   ==> only the first "RANDOMIZED_N_COMPONENTS" principal components are computed
+# ==> "svds": the truncated SVD of scipy, on the data which is centered "implicitly", used for sparse data (check the file "dataIngestion.py")
+#             ==> centering a sparse matrix (subtracting the mean of each gene) would make it dense, so the mean is subtracted inside each product instead
+#             ==> so the memory depends on the number of non-zero values, not on genes x samples
+# ==> "auto": choose one of the solvers above from the shape of the data, and "svds" for sparse data
+#
+# The result of all solvers is the same as PCA() of scikit-learn (up to the sign of each principal component)
+# All the solvers keep the type of the numbers of X, float64 or float32 (check "check_dtype()" in the file "pcaCache.py")
+# The other solvers also work with sparse data, but the data is made dense first
+# ⭐⭐⭐
+#
+#########################
+
+import numpy as np
+
+import lazyImports
+
+# The big libraries are only imported when they are used for the first time, check the file "lazyImports.py"
+sklearnDecomposition = lazyImports.lazy_module('sklearn.decomposition')
+sklearnExtmath = lazyImports.lazy_module('sklearn.utils.extmath')
+scipySparse = lazyImports.lazy_module('scipy.sparse')
+scipySparseLinalg = lazyImports.lazy_module('scipy.sparse.linalg')
+
+SOLVERS = ['auto', 'sklearn', 'gram', 'randomized', 'svds']
+
+# The "gram" solver is used by "auto" when the number of genes is at least "GRAM_MIN_FEATURES_PER_SAMPLE" times the number of samples
+# ==> and when the number of samples is not more than "GRAM_MAX_SAMPLES", because the Gram matrix has "samples x samples" values
+GRAM_MIN_FEATURES_PER_SAMPLE = 4
+GRAM_MAX_SAMPLES = 2000
+
+# The "randomized" solver is used by "auto" when both the number of samples and the number of genes are larger than this
+RANDOMIZED_MIN_DIMENSION = 2000
+# The number of principal components computed by the "randomized" and "svds" solvers
+# The plots and tables only need a few principal components (the scree plot uses the most, 8), so 50 is more than enough
+RANDOMIZED_N_COMPONENTS = 50
+
+
+class PCAResult:
+    # The result of a solver, with the same attribute names as the PCA object of scikit-learn
+    # ==> so it can be used in the same way as "pcaObject.components_", "pcaObject.explained_variance_ratio_", etc.
+    def __init__(self, mean, components, singularValues, numberOfSamples, totalVariance, solver):
+        self.mean_ = mean
+        self.components_ = components
+        self.singular_values_ = singularValues
+        self.explained_variance_ = singularValues ** 2 / (numberOfSamples - 1)
+        self.explained_variance_ratio_ = self.explained_variance_ / totalVariance
+        # The total variance is also kept, because it can not be found again from the ratios when they are 0, like for constant data
+        self.total_variance_ = totalVariance
+        self.n_components_ = components.shape[0]
+        self.n_samples_ = numberOfSamples
+        self.solver = solver
+
+    def transform(self, X):
+        # Project the (standardized) data onto the principal components, same as "pcaObject.transform()"
+        # For sparse data, the mean is subtracted after the product, so the data stays sparse
+        if scipySparse.issparse(X):
+            return X @ self.components_.T - self.mean_ @ self.components_.T
+        return (X - self.mean_) @ self.components_.T
+
+
+def choose_solver(numberOfSamples, numberOfFeatures):
+    # Choose the solver used by "auto" from the shape of the data
+    if numberOfSamples <= GRAM_MAX_SAMPLES and numberOfFeatures >= GRAM_MIN_FEATURES_PER_SAMPLE * numberOfSamples:
+        return 'gram'
+    if min(numberOfSamples, numberOfFeatures) > RANDOMIZED_MIN_DIMENSION:
+        return 'randomized'
+    return 'sklearn'
+
+
+def fit_pca_sklearn(X):
+    # The same as before: PCA() of scikit-learn with all principal components
+    pcaObject = sklearnDecomposition.PCA(n_components=None)
+    scores = pcaObject.fit_transform(X)
+    result = PCAResult(
+        mean=pcaObject.mean_,
+        components=pcaObject.components_,
+        singularValues=pcaObject.singular_values_,
+        numberOfSamples=X.shape[0],
+        totalVariance=pcaObject.explained_variance_.sum() / pcaObject.explained_variance_ratio_.sum(),
+        solver='sklearn',
+    )
+    return result, scores
+
+
+def pad_components(U, singularValues, components, n_components):
+    # PCA() of scikit-learn always returns min(n_samples, n_features) principal components, also the ones which explain no variance
+    # ==> for example, 2 samples have only 1 principal component with some variance after centering, but the 2D PCA plot still needs PC2
+    # The missing principal components are added at the end with a singular value of 0, so their scores and their explained variance are 0
+    # Their loadings are also 0, because they can not be computed from the data, and they do not change the projection of the samples
+    numberOfMissing = n_components - len(singularValues)
+    if numberOfMissing <= 0:
+        return U, singularValues, components
+    U = np.hstack([U, np.zeros((U.shape[0], numberOfMissing), dtype=U.dtype)])
+    singularValues = np.concatenate([singularValues, np.zeros(numberOfMissing, dtype=singularValues.dtype)])
+    components = np.vstack([components, np.zeros((numberOfMissing, components.shape[1]), dtype=components.dtype)])
+    return U, singularValues, components
+
+
+def fit_pca_gram(X):
+    # X has the shape [n_samples, n_features], for example [24, 20000]
+    # If X = U * S * V^T (the SVD of X), then X * X^T = U * S^2 * U^T
+    # ==> so the eigen decomposition of the small Gram matrix X * X^T (24 x 24) gives U and S
+    # ==> and then the principal components are V^T = S^-1 * U^T * X
+    mean = X.mean(axis=0)
+    centeredX = X - mean
+    gramMatrix = centeredX @ centeredX.T
+
+    # "eigh()" returns the eigenvalues from the smallest to the largest, so we reverse them
+    eigenvalues, eigenvectors = np.linalg.eigh(gramMatrix)
+    eigenvalues = eigenvalues[::-1]
+    eigenvectors = eigenvectors[:, ::-1]
+
+    # After centering, the rank of X is at most n_samples - 1, so the last eigenvalues are (almost) zero
+    # Those principal components explain no variance and can not be computed from the Gram matrix, they are added back by "pad_components()" below
+    tolerance = eigenvalues[0] * max(X.shape) * np.finfo(X.dtype).eps
+    rank = int(np.sum(eigenvalues > tolerance))
+    singularValues = np.sqrt(eigenvalues[:rank])
+    U = eigenvectors[:, :rank]
+    components = (U.T @ centeredX) / singularValues[:, np.newaxis]
+
+    # Use the same rule as scikit-learn to choose the sign of each principal component
+    U, components = sklearnExtmath.svd_flip(U, components)
+    U, singularValues, components = pad_components(U, singularValues, components, min(X.shape))
+    scores = U * singularValues
+
+    result = PCAResult(
+        mean=mean,
+        components=components,
+        singularValues=singularValues,
+        numberOfSamples=X.shape[0],
+        totalVariance=np.trace(gramMatrix) / (X.shape[0] - 1),
+        solver='gram',
+    )
+    return result, scores
+
+
+def fit_pca_randomized(X, n_components=RANDOMIZED_N_COMPONENTS):
+    # Only the first "n_components" principal components are computed by the randomized SVD
+    # The total variance, which is needed for the "explained_variance_ratio_", is computed directly from the data
+    mean = X.mean(axis=0)
+    centeredX = X - mean
+    n_components = min(n_components, *X.shape)
+    U, singularValues, components = sklearnExtmath.randomized_svd(
+        centeredX, n_components=n_components, random_state=0)
+    U, components = sklearnExtmath.svd_flip(U, components)
+    scores = U * singularValues
+
+    result = PCAResult(
+        mean=mean,
+        components=components,
+        singularValues=singularValues,
+        numberOfSamples=X.shape[0],
+        totalVariance=np.sum(centeredX ** 2) / (X.shape[0] - 1),
+        solver='randomized',
+    )
+    return result, scores
+
+
+def fit_pca_svds(X, n_components=RANDOMIZED_N_COMPONENTS):
+    # X can be sparse, and it is NOT centered, check the NOTICE above
+    # The centered data is "X - 1 * mean", where "1" is a column of ones, so its products with a vector "v" or "u" are:
+    # ==> (X - 1 * mean) * v = X * v - (mean * v), the same number is subtracted from each sample
+    # ==> (X - 1 * mean)^T * u = X^T * u - mean^T * sum(u)
+    # These products are given to "svds()" as a "LinearOperator", so the centered data is never created
+    numberOfSamples = X.shape[0]
+    if min(X.shape) < 2:
+        raise ValueError('The PCA needs at least 2 samples and 2 genes')
+    mean = np.asarray(X.mean(axis=0), dtype=X.dtype).ravel()
+    centeredX = scipySparseLinalg.LinearOperator(
+        shape=X.shape,
+        dtype=X.dtype,
+        matvec=lambda v: X @ np.ravel(v) - mean @ np.ravel(v),
+        rmatvec=lambda u: X.T @ np.ravel(u) - mean * np.sum(u),
+        matmat=lambda V: X @ V - mean @ V,
+        rmatmat=lambda U: X.T @ U - np.outer(mean, U.sum(axis=0)),
+    )
+
+    # "svds()" can compute at most min(n_samples, n_features) - 1 principal components, which is also the rank of the centered data
+    # The start vector is fixed, so the same data always gives the same result
+    n_components = min(n_components, *X.shape)
+    U, singularValues, components = scipySparseLinalg.svds(
+        centeredX, k=min(n_components, min(X.shape) - 1), v0=np.full(min(X.shape), 1 / np.sqrt(min(X.shape)), dtype=X.dtype))
+    # "svds()" returns the singular values from the smallest to the largest, so we reverse them
+    order = np.argsort(singularValues)[::-1]
+    U, singularValues, components = U[:, order], singularValues[order], components[order]
+
+    # Like the "gram" solver, the principal components which explain (almost) no variance are replaced by "pad_components()"
+    # ==> so the number of principal components is min(n_samples, n_features), up to "n_components", even if "svds()" can compute one less
+    tolerance = singularValues[0] * max(X.shape) * np.finfo(X.dtype).eps
+    rank = max(int(np.sum(singularValues > tolerance)), 1)
+    singularValues = singularValues[:rank]
+    U, components = sklearnExtmath.svd_flip(U[:, :rank], components[:rank])
+    U, singularValues, components = pad_components(U, singularValues, components, n_components)
+    scores = U * singularValues
+
+    # The total variance is the sum of the squares of the centered data, which is also computed without centering: sum(X^2) - n_samples * sum(mean^2)
+    squaredSum = X.multiply(X).sum() if scipySparse.issparse(X) else np.sum(X ** 2)
+    result = PCAResult(
+        mean=mean,
+        components=components,
+        singularValues=singularValues,
+        numberOfSamples=numberOfSamples,
+        totalVariance=(squaredSum - numberOfSamples * np.sum(mean ** 2)) / (numberOfSamples - 1),
+        solver='svds',
+    )
+    return result, scores
+
+
+def fit_pca(X, solver='auto'):
+    # Do the PCA of X, which has the shape [n_samples, n_features]
+    # X can also be a sparse matrix of scipy, which is not centered, check the NOTICE above
+    # Return the "PCAResult" and the scores (the "pcaData" in the file "generatePCA.py")
+    if solver not in SOLVERS:
+        raise ValueError(f'Unknown solver "{solver}", the solver must be one of: {", ".join(SOLVERS)}')
+    if solver == 'auto':
+        solver = 'svds' if scipySparse.issparse(X) else choose_solver(*X.shape)
+
+    if solver == 'svds':
+        return fit_pca_svds(X)
+    if scipySparse.issparse(X):
+        X = X.toarray()
+
+    if solver == 'gram':
+        return fit_pca_gram(X)
+    if solver == 'randomized':
+        return fit_pca_randomized(X)
+    return fit_pca_sklearn(X)
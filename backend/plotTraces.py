@@ -0,0 +1,119 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "plotTraces.py" file makes the "data" (the list of traces) for the <Plot/> component of Plotly.js in the frontend
+# It is used by "generatePCA.py", "generatePCA3D.py" and "generateTopFiveContributors.py"
+#
+# There are 2 layouts of the traces, chosen with "?trace_layout=..." in the URL:
+# ==> "per_sample" (the default): ONE trace for each sample, with only one point, as before
+#     The frontend changes the color of each sample with "data[index].marker.color", so this layout is kept as the default
+# ==> "grouped": ONE trace for each condition, with all the points of its samples in "x", "y" (and "z")
+#     The condition is the name of the sample without the replicate at the end, like "H2O_30m_A", "H2O_30m_B" ==> "H2O_30m"
+#     With hundreds of samples, this makes a much smaller JSON, and Plotly draws a few traces much faster than hundreds of traces
+#
+# When a 2D plot has more than "WEBGL_MIN_POINTS" points, the trace type "scattergl" is used instead of "scatter"
+# ==> "scattergl" draws the points with WebGL (the graphic card), which is much faster for many points
+# ==> the 3D plot ("scatter3d") always uses WebGL
+# ⭐⭐⭐
+#
+#########################
+
+import os
+import re
+from collections import OrderedDict
+
+TRACE_LAYOUTS = ['per_sample', 'grouped']
+
+# The number of points from which the 2D plots use "scattergl"
+# It could be changed with the environment variable "PCA_WEBGL_MIN_POINTS"
+WEBGL_MIN_POINTS = int(os.environ.get('PCA_WEBGL_MIN_POINTS', 1000))
+
+# The replicate at the end of a sample name, like "_A", "_B", "_1", "_rep2"
+REPLICATE_PATTERN = re.compile(r'^(.+)_(?:[A-Za-z]|\d+|rep\d+)$', re.IGNORECASE)
+
+# The colors of the groups in the "grouped" layout, these are the default colors of Plotly
+GROUP_COLORS = [
+    '#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+    '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf',
+]
+
+
+def check_trace_layout(traceLayout):
+    if traceLayout not in TRACE_LAYOUTS:
+        raise ValueError(f'Unknown "trace_layout" "{traceLayout}", it must be one of: {", ".join(TRACE_LAYOUTS)}')
+    return traceLayout
+
+
+def get_condition(sampleName):
+    # Return the condition of a sample, like "H2O_30m_A" ==> "H2O_30m"
+    # If the name has no replicate at the end, the whole name is the condition
+    match = REPLICATE_PATTERN.match(str(sampleName))
+    return match.group(1) if match else str(sampleName)
+
+
+def group_positions(groupKeys):
+    # Return the positions of the items of each group, in the order in which the groups first appear
+    # For example ["H2O_30m", "H2O_30m", "PNA79_30m"] ==> {"H2O_30m": [0, 1], "PNA79_30m": [2]}
+    groups = OrderedDict()
+    for position, groupKey in enumerate(groupKeys):
+        groups.setdefault(groupKey, []).append(position)
+    return groups
+
+
+def get_trace_type(traceType, numberOfPoints):
+    # Use WebGL for the 2D scatter plots with many points
+    if traceType == 'scatter' and numberOfPoints >= WEBGL_MIN_POINTS:
+        return 'scattergl'
+    return traceType
+
+
+def build_traces(names, axes, baseTrace, traceLayout='per_sample', text=None, groupKeys=None):
+    # Make the list of traces
+    # ==> "names": the name of each point, like the sample names
+    # ==> "axes": the coordinates of the points, like {"x": [...], "y": [...]} or {"x": [...], "y": [...], "z": [...]}, one value for each point
+    # ==> "baseTrace": what is the same for all the traces, like {"type": "scatter", "mode": "markers", "marker": {...}}
+    # ==> "text": the text of each point, if the trace shows a text next to the points
+    # ==> "groupKeys": the group of each point in the "grouped" layout, if it is not given, the condition from the sample name is used
+    numberOfPoints = len(names)
+    baseTrace = {**baseTrace, 'type': get_trace_type(baseTrace['type'], numberOfPoints)}
+    axes = {axis: list(values) for axis, values in axes.items()}
+    names = [str(name) for name in names]
+
+    if check_trace_layout(traceLayout) == 'per_sample':
+        # The same as before: one trace with one point for each sample
+        traces = []
+        for i in range(numberOfPoints):
+            trace = {**baseTrace, 'name': names[i]}
+            for axis, values in axes.items():
+                trace[axis] = [values[i]]
+            if text is not None:
+                trace['text'] = [text[i]]
+            traces.append(trace)
+        return traces
+
+    # The "grouped" layout: one trace for each group, the points of the group are in columns
+    # The name of each sample is in "text", so it is shown when the mouse is over the point
+    if groupKeys is None:
+        groupKeys = [get_condition(name) for name in names]
+    traces = []
+    for groupNumber, (groupKey, positions) in enumerate(group_positions(groupKeys).items()):
+        trace = {
+            **baseTrace,
+            'name': str(groupKey),
+            'text': [text[i] if text is not None else names[i] for i in positions],
+            'marker': {**baseTrace.get('marker', {}), 'color': GROUP_COLORS[groupNumber % len(GROUP_COLORS)]},
+        }
+        for axis, values in axes.items():
+            trace[axis] = [values[i] for i in positions]
+        if text is None:
+            trace['hoverinfo'] = 'text+x+y' + ('+z' if 'z' in axes else '')
+        traces.append(trace)
+    return traces
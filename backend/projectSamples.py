@@ -0,0 +1,315 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "projectSamples.py" file places NEW samples on the PCA of a dataset which was uploaded before, without doing the PCA again
+# The fitted PCA of a dataset (check the file "pcaCache.py") already keeps everything that is needed:
+# ==> the StandardScaler, with the mean and the standard deviation of each gene
+# ==> the principal components (the "loadings"), one value for each gene
+# So a new sample is standardized with the same numbers, then multiplied by the principal components, which gives its PC1, PC2, PC3, ...
+# ==> this is only a few matrix products, so it takes a few milliseconds, even when the PCA itself took seconds
+# ==> the principal components do NOT change, so the new samples are placed in the same plot as the samples of the dataset
+#
+# The new samples are sent in the same way as a dataset (check the file "generatePCA.py"): a gene column and one column for each new sample
+# ==> the genes are matched by their names with the genes of the dataset, the genes which are not in the dataset are ignored
+# ==> a gene of the dataset which is missing in the new samples is given its mean, so it does not move the new samples
+#
+# With "?refit=...", the new samples are also added to the dataset, and the PCA of the dataset with the new samples is returned:
+# ==> "?refit=none" (the default): only the projection above
+# ==> "?refit=full": the new samples are added to the dataset, and its PCA is done again from the start
+# ==> "?refit=incremental": the PCA is updated from the old PCA and the new samples only, without reading the old data again, check "update_fit()" below
+#     ==> it gives the same result as the full refit, and with "?rank=20", only the first 20 principal components of the old PCA are used
+#         For 200 samples x 60000 genes, this is about 15 times faster than the full refit, and the first principal components differ by about 1e-5
+# In both cases, the new dataset is stored like an uploaded one, and its "dataset_id" is returned, so the plots can be made again with it
+# ==> the incremental PCA is kept under its own name, like "incremental-rank20", so the plots of the new dataset still use a full PCA of the chosen solver
+# ==> the "solver" of the result is the one which was really used, like "gram" for the full refit with "?solver=auto"
+#
+# When the on-disk store is used (check the file "matrixStore.py"), the StandardScaler and the principal components of each dataset are saved there
+# ==> then the new samples can also be projected by the other workers and after a restart, without doing the PCA again
+# ⭐⭐⭐
+#
+#########################
+
+import numpy as np
+from flask import Blueprint, jsonify, request
+
+import dataIngestion
+import datasetSessions
+import jsonEncoding
+import lazyImports
+import pcaCache
+import pcaSolvers
+import plotTraces
+import requestMetrics
+
+# The big libraries are only imported when they are used for the first time, check the file "lazyImports.py"
+pd = lazyImports.lazy_module('pandas')
+scipySparse = lazyImports.lazy_module('scipy.sparse')
+sklearnPreprocessing = lazyImports.lazy_module('sklearn.preprocessing')
+sklearnExtmath = lazyImports.lazy_module('sklearn.utils.extmath')
+
+bp = Blueprint('projectSamples', __name__)
+
+REFIT_MODES = ['none', 'full', 'incremental']
+# The number of principal components returned for each new sample by default, for the 2D and the 3D PCA plots
+DEFAULT_N_COMPONENTS = 3
+
+
+#########################
+# PROJECTION
+#########################
+def align_samples(fittedPCA, newData):
+    # Put the genes of the new samples in the same order as the genes of the dataset
+    # Return the values as [n_new_samples, n_genes], like the data given to the StandardScaler, and the numbers of used, missing and ignored genes
+    index = fittedPCA['index']
+    if not index.is_unique or not newData.index.is_unique:
+        raise ValueError('The gene names must be unique to match the new samples with the dataset')
+    positions = newData.index.get_indexer(index)
+    isFound = positions >= 0
+    if not isFound.any():
+        raise ValueError('None of the genes of the new samples is in the dataset')
+
+    if dataIngestion.is_sparse_data(newData):
+        newData = newData.sparse.to_dense()
+    # The missing genes get the mean of the dataset, so after the standardization, they are at the center of the PCA and do not move the new samples
+    values = np.empty((newData.shape[1], len(index)), dtype=fittedPCA['components'].dtype)
+    values[:] = fittedPCA['scaler'].mean_
+    values[:, isFound] = newData.to_numpy(dtype=values.dtype)[positions[isFound]].T
+    genes = {
+        'used': int(isFound.sum()),
+        'missing': int((~isFound).sum()),
+        'ignored': int(len(newData.index) - isFound.sum()),
+    }
+    return values, genes
+
+
+def project_samples(fittedPCA, values, n_components):
+    # Standardize the new samples with the StandardScaler of the dataset, then multiply them by the first "n_components" principal components
+    # This is the same as "transform()" of the PCA, check the file "pcaSolvers.py", but only with the principal components we need
+    pcaObject = fittedPCA['pca']
+    standardizedValues = fittedPCA['scaler'].transform(values)
+    return (standardizedValues - pcaObject.mean_) @ fittedPCA['components'][:n_components].T
+#########################
+# End of PROJECTION
+#########################
+
+
+#########################
+# INCREMENTAL REFIT
+#########################
+def update_scaler(scaler, numberOfSamples, values):
+    # The mean and the variance of each gene for the old samples and the new samples together, from the numbers of the old StandardScaler
+    # This is the same as "partial_fit()" of the StandardScaler, so the old data is not needed
+    numberOfNewSamples = len(values)
+    totalSamples = numberOfSamples + numberOfNewSamples
+    oldMean = np.asarray(scaler.mean_, dtype=np.float64)
+    newMean = values.mean(axis=0)
+    mean = oldMean + (newMean - oldMean) * numberOfNewSamples / totalSamples
+    var = (numberOfSamples * (np.asarray(scaler.var_, dtype=np.float64) + (oldMean - mean) ** 2)
+           + numberOfNewSamples * (values.var(axis=0) + (newMean - mean) ** 2)) / totalSamples
+
+    # Like the StandardScaler, a gene with (almost) the same value in all the samples is divided by 1 instead of 0
+    epsilon = np.finfo(np.float64).eps
+    isConstant = var <= totalSamples * epsilon * var + (totalSamples * mean * epsilon) ** 2
+    updatedScaler = sklearnPreprocessing.StandardScaler(with_mean=scaler.with_mean)
+    updatedScaler.mean_ = mean
+    updatedScaler.var_ = var
+    updatedScaler.scale_ = np.where(isConstant, 1.0, np.sqrt(var))
+    updatedScaler.n_features_in_ = len(mean)
+    updatedScaler.n_samples_seen_ = totalSamples
+    return updatedScaler
+
+
+def update_fit(fittedPCA, values, columns, rank=None):
+    # Update the PCA of the dataset with the new samples, without the old data, with the incremental SVD (like "IncrementalPCA" of scikit-learn)
+    # The old standardized and centered data is "U * S * V^T", where "U * S" are the old scores and "V^T" are the old principal components
+    # With the new mean and the new standard deviation of each gene (check "update_scaler()" above), the old samples become:
+    # ==> "U * S * V^T * r + 1 * d", where "r" is the old standard deviation divided by the new one, and "d" is the move of the mean
+    # So the new data is the product of a matrix with orthonormal columns and the small matrix "B", which has only "k + 1 + n_new_samples" rows:
+    # ==> B = [S * V^T * r ; sqrt(n_old_samples) * d ; the new samples, standardized and centered]
+    # The SVD of "B" gives the new singular values and principal components, and the new scores of the old and the new samples
+    # When all the principal components of the old PCA are used, the result is the same as a full refit, "rank" keeps only the first ones, which is faster
+    # The name of the solver tells them apart, like "incremental" and "incremental-rank20", it is also the name of the fit in the file "pcaCache.py"
+    pcaObject = fittedPCA['pca']
+    dtype = fittedPCA['components'].dtype
+    numberOfSamples = int(pcaObject.n_samples_)
+    values = np.asarray(values, dtype=np.float64)
+    scaler = fittedPCA['scaler']
+    updatedScaler = update_scaler(scaler, numberOfSamples, values)
+
+    # The old principal components which explain (almost) no variance are not used, because "U" is computed as "scores / S"
+    singularValues = np.asarray(pcaObject.singular_values_[:len(fittedPCA['components'])], dtype=np.float64)
+    tolerance = singularValues[0] * max(numberOfSamples, values.shape[1]) * np.finfo(dtype).eps
+    k = int(np.sum(singularValues > tolerance))
+    if rank is not None:
+        k = min(k, rank)
+    singularValues = singularValues[:k]
+    U = np.asarray(fittedPCA['scores'][:, :k], dtype=np.float64) / singularValues
+    ratio = np.asarray(scaler.scale_, dtype=np.float64) / updatedScaler.scale_
+    meanMove = (np.asarray(scaler.mean_, dtype=np.float64) - updatedScaler.mean_) / updatedScaler.scale_
+
+    B = np.vstack([
+        singularValues[:, np.newaxis] * np.asarray(fittedPCA['components'][:k], dtype=np.float64) * ratio,
+        np.sqrt(numberOfSamples) * meanMove,
+        (values - updatedScaler.mean_) / updatedScaler.scale_,
+    ])
+    # "B" is very wide, so its SVD is computed from the small Gram matrix "B * B^T", like the "gram" solver (check the file "pcaSolvers.py")
+    eigenvalues, smallU = np.linalg.eigh(B @ B.T)
+    eigenvalues, smallU = eigenvalues[::-1], smallU[:, ::-1]
+    tolerance = eigenvalues[0] * max(B.shape) * np.finfo(dtype).eps
+    updatedRank = max(int(np.sum(eigenvalues > tolerance)), 1)
+    updatedSingularValues = np.sqrt(eigenvalues[:updatedRank])
+    smallU = smallU[:, :updatedRank]
+    components = (smallU.T @ B) / updatedSingularValues[:, np.newaxis]
+
+    # The left singular vectors for the old samples come back through "U" and the column of ones, and the ones of the new samples are the last rows of "smallU"
+    updatedU = np.vstack([U @ smallU[:k] + smallU[k] / np.sqrt(numberOfSamples), smallU[k + 1:]])
+    updatedU, components = sklearnExtmath.svd_flip(updatedU, components)
+    scores = updatedU * updatedSingularValues
+
+    # Each standardized gene has the variance 1 (or 0 for a constant gene), so the total variance does not need the old data either
+    totalSamples = numberOfSamples + len(values)
+    totalVariance = np.sum(updatedScaler.var_ / updatedScaler.scale_ ** 2) * totalSamples / (totalSamples - 1)
+    # The mean of the standardized data is 0, or "mean / scale" for sparse data, which is not centered by the StandardScaler (check the file "pcaCache.py")
+    pcaMean = updatedScaler.mean_ / updatedScaler.scale_ if not updatedScaler.with_mean else np.zeros(len(updatedScaler.mean_))
+    updatedPCA = pcaSolvers.PCAResult(
+        mean=pcaMean.astype(dtype),
+        components=components.astype(dtype),
+        singularValues=updatedSingularValues.astype(dtype),
+        numberOfSamples=totalSamples,
+        totalVariance=totalVariance,
+        solver='incremental' if rank is None else f'incremental-rank{rank}',
+    )
+    scores = scores.astype(dtype)
+
+    return {
+        # The standardized data is not kept, it is computed again with the StandardScaler if it is needed, like for a PCA from the file "matrixStore.py"
+        'standardizedData': None,
+        'scaler': updatedScaler,
+        'pca': updatedPCA,
+        'scores': scores,
+        'components': updatedPCA.components_,
+        'explained_variance_ratio': updatedPCA.explained_variance_ratio_,
+        'index': fittedPCA['index'],
+        'columns': columns,
+        'nbytes': scores.nbytes + updatedPCA.components_.nbytes,
+    }
+
+
+def add_samples(convertedData, values, newNames):
+    # The dataset with the new samples as new columns, in the same type of numbers, and still sparse if the dataset is sparse
+    dtype = pcaCache.get_data_dtype(convertedData)
+    if dataIngestion.is_sparse_data(convertedData):
+        matrix = scipySparse.hstack([dataIngestion.get_sparse_matrix(convertedData), scipySparse.csc_matrix(values.T)], format='csc')
+        return dataIngestion.make_sparse_data(matrix, convertedData.index, list(convertedData.columns) + newNames, dtype=dtype)
+    newData = pd.DataFrame(values.T.astype(dtype), index=convertedData.index, columns=newNames)
+    return pd.concat([convertedData, newData], axis=1)
+#########################
+# End of INCREMENTAL REFIT
+#########################
+
+
+def build_projection(fittedPCA, coordinates, newNames, precision=None):
+    # The coordinates of the new samples, and the traces of the 2D PCA plot, so the frontend can add them to the plot of "generatePCA.py"
+    if precision is not None:
+        coordinates = jsonEncoding.round_significant(coordinates, precision)
+    n_components = coordinates.shape[1]
+    projectionTraces = plotTraces.build_traces(
+        names=newNames,
+        axes={'x': coordinates[:, 0].tolist(), 'y': coordinates[:, 1].tolist() if n_components > 1 else [0] * len(newNames)},
+        baseTrace={
+            # The new samples are drawn as diamonds, so they can be told apart from the samples of the dataset
+            'type': 'scatter',
+            'mode': 'markers',
+            'marker': {
+                'size': 12,
+                'symbol': 'diamond',
+                'color': '#E4572E',
+                'line': {
+                    'color': '#000000',
+                    'width': 2,
+                }
+            },
+        },
+        traceLayout=request.args.get('trace_layout', 'per_sample'),
+    )
+    return {
+        'samples': newNames,
+        'principal_components': ['PC' + str(x) for x in range(1, n_components + 1)],
+        'coordinates': coordinates,
+        'explained_variance_ratio': fittedPCA['explained_variance_ratio'][:n_components],
+        'data': projectionTraces,
+    }
+
+
+@bp.route('/api/project_samples', methods=['POST'])
+def project_new_samples():
+    # The dataset is chosen with "?dataset_id=..." in the URL, or in a JSON object like {"dataset_id": "...", "data": [...]}
+    # The new samples are the data of the request, check the NOTICE above
+    # The options are in the URL, like "?n_components=3&refit=incremental"
+    requestBody = datasetSessions.get_request_body()
+    datasetId = request.args.get('dataset_id')
+    if isinstance(requestBody, dict):
+        datasetId = datasetId or requestBody.get('dataset_id')
+        requestBody = requestBody.get('data')
+    if not datasetId:
+        raise ValueError('The "dataset_id" of the dataset is needed to project the new samples on its PCA')
+    if requestBody is None:
+        raise ValueError('The request has no new samples')
+    refit = request.args.get('refit', 'none')
+    if refit not in REFIT_MODES:
+        raise ValueError(f'Unknown refit "{refit}", the refit must be one of: {", ".join(REFIT_MODES)}')
+    n_components = datasetSessions.get_int_arg('n_components', DEFAULT_N_COMPONENTS, minimum=1)
+    rank = datasetSessions.get_int_arg('rank', None, minimum=1)
+    solver = request.args.get('solver', 'auto')
+
+    convertedData = datasetSessions.get_dataset(datasetId)
+    fittedPCA = pcaCache.get_fitted_pca(convertedData, solver=solver, dtype=request.args.get('dtype'))
+    newData = datasetSessions.prepare_request_data(requestBody)
+    newNames = [str(name) for name in newData.columns]
+    with requestMetrics.stage('project'):
+        values, genes = align_samples(fittedPCA, newData)
+
+    result = {
+        'dataset_id': datasetId,
+        'refit': refit,
+        'genes': genes,
+    }
+    if refit == 'none':
+        with requestMetrics.stage('project'):
+            coordinates = project_samples(fittedPCA, values, n_components)
+        result.update(build_projection(fittedPCA, coordinates, newNames, jsonEncoding.get_precision(fittedPCA)))
+        return jsonify(result)
+
+    # The refit adds the new samples to the dataset, so they must have all the genes of the dataset and new names
+    if genes['missing'] > 0:
+        raise ValueError(f'{genes["missing"]} genes of the dataset are missing in the new samples, they are needed to add the new samples to the dataset')
+    knownNames = set(map(str, convertedData.columns))
+    repeatedNames = [name for name in newNames if name in knownNames]
+    if repeatedNames or len(set(newNames)) < len(newNames):
+        raise ValueError(f'The names of the new samples must be new and unique, but these are already used: {", ".join(repeatedNames) or "the same name twice"}')
+
+    updatedData = add_samples(convertedData, values, newNames)
+    updatedDatasetId = datasetSessions.store_dataset(updatedData)
+    if refit == 'incremental':
+        with requestMetrics.stage('fit'):
+            updatedPCA = update_fit(fittedPCA, values, updatedData.columns, rank=rank)
+        updatedPCA = pcaCache.put_fitted_pca(updatedData, updatedPCA, dtype=request.args.get('dtype'))
+    else:
+        updatedPCA = pcaCache.get_fitted_pca(updatedData, solver=solver, dtype=request.args.get('dtype'))
+
+    # The new samples are the last rows of the scores of the updated PCA
+    coordinates = np.asarray(updatedPCA['scores'][-len(newNames):, :n_components])
+    result.update(build_projection(updatedPCA, coordinates, newNames, jsonEncoding.get_precision(updatedPCA)))
+    result.update({
+        'updated_dataset_id': updatedDatasetId,
+        'solver': updatedPCA['pca'].solver,
+    })
+    return jsonify(result)
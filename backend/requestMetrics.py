@@ -0,0 +1,190 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "requestMetrics.py" file measures where the time of each request goes
+# The slow parts of a request are wrapped with "with requestMetrics.stage('...'):", the stages are:
+# ==> "database": read the dataset from MongoDB, check the file "getDataFromDB.py"
+# ==> "parse": read the body of the request (JSON, Arrow, Parquet), check the file "datasetSessions.py"
+# ==> "coerce": turn the text like "20,01" into numbers, check the file "dataIngestion.py"
+# ==> "hash": the hash of the data, check the file "pcaCache.py"
+# ==> "scale" and "fit": the StandardScaler and the PCA, check the file "pcaCache.py"
+# ==> "permute": the permutations of the parallel analysis, check the file "parallelAnalysis.py"
+# ==> "project": match the genes of the new samples and place them on the PCA of a dataset, check the file "projectSamples.py"
+# ==> "serialize": write the JSON result, check the file "jsonEncoding.py"
+# ==> "compress": compress the JSON result, check the file "responseCaching.py"
+#
+# The times are sent back in 2 ways:
+# ==> in the "Server-Timing" header of each response, like "parse;dur=12.1, coerce;dur=30.5, fit;dur=250.2, total;dur=301.0" (in milliseconds)
+#     The "Network" tab of the browser shows this header as a chart in the "Timing" of the request
+# ==> at "/metrics", in the text format of Prometheus, so a Prometheus server can collect them and draw them in Grafana
+#     The number of genes and of samples are in the labels "genes" and "samples", as ranges like "10k-100k", so a slow request can be linked to the size of its data
+#
+# Each worker process has its own numbers, so when the backend runs with several workers, Prometheus sees the numbers of the worker which answered "/metrics"
+# ⭐⭐⭐
+#
+#########################
+
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+# The upper bounds of the buckets of the histograms, in seconds and in bytes
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+SIZE_BUCKETS = [1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024, 100 * 1024 * 1024]
+
+# The ranges of the number of genes and of samples, which are used as labels
+# The exact numbers are not used as labels, because each different value of a label is a new time series in Prometheus
+GENE_RANGES = [(1000, '<1k'), (10000, '1k-10k'), (100000, '10k-100k'), (float('inf'), '>=100k')]
+SAMPLE_RANGES = [(10, '<10'), (100, '10-100'), (1000, '100-1k'), (float('inf'), '>=1k')]
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+METRICS_HELP = {
+    'pca_requests_total': ('counter', 'The number of requests'),
+    'pca_request_duration_seconds': ('histogram', 'The total time of the requests'),
+    'pca_stage_duration_seconds': ('histogram', 'The time of each stage of the requests'),
+    'pca_response_size_bytes': ('histogram', 'The size of the response bodies, after the compression'),
+}
+
+
+@contextmanager
+def stage(name):
+    # Measure the time of the code inside "with stage(name):", and add it to the times of the current request
+    # If the same stage runs several times in one request, the times are added together
+    # A job of the file "jobQueue.py" sets "g.stageListener", to know which stage its request is at
+    if has_request_context() and 'stageListener' in g:
+        g.stageListener(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            stageTimes = g.setdefault('stageTimes', {})
+            stageTimes[name] = stageTimes.get(name, 0.0) + time.perf_counter() - start
+
+
+def set_dataset_shape(numberOfGenes, numberOfSamples):
+    # Keep the size of the data of the current request, it is used for the labels "genes" and "samples"
+    if has_request_context():
+        g.datasetShape = (numberOfGenes, numberOfSamples)
+
+
+def get_range(value, ranges):
+    for upperBound, label in ranges:
+        if value < upperBound:
+            return label
+
+
+#########################
+# COUNTERS AND HISTOGRAMS
+#########################
+def increment_counter(name, labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + 1
+
+
+def observe_histogram(name, labels, value, buckets):
+    # Add one value into a histogram, the buckets are cumulative like in Prometheus: each bucket counts the values lower than or equal to its bound
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for i, upperBound in enumerate(buckets):
+            if value <= upperBound:
+                histogram['counts'][i] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+
+def escape_label_value(value):
+    # The backslash, the double quote and the new line must be escaped in the values of the labels
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    # Format the labels like {endpoint="/api/generate_pca",status="200"}
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in labels) + '}'
+
+
+def render_metrics():
+    # Write all the counters and histograms in the text format of Prometheus
+    lines = []
+    with _lock:
+        for name, (metricType, helpText) in METRICS_HELP.items():
+            lines.append(f'# HELP {name} {helpText}')
+            lines.append(f'# TYPE {name} {metricType}')
+            if metricType == 'counter':
+                for (counterName, labels), value in sorted(_counters.items()):
+                    if counterName == name:
+                        lines.append(f'{name}{format_labels(labels)} {value}')
+                continue
+            for (histogramName, labels), histogram in sorted(_histograms.items(), key=lambda item: item[0]):
+                if histogramName != name:
+                    continue
+                for upperBound, count in zip(histogram['buckets'], histogram['counts']):
+                    lines.append(f'{name}_bucket{format_labels(labels + (("le", repr(float(upperBound))),))} {count}')
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", "+Inf"),))} {histogram["count"]}')
+                lines.append(f'{name}_sum{format_labels(labels)} {histogram["sum"]}')
+                lines.append(f'{name}_count{format_labels(labels)} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+#########################
+# End of COUNTERS AND HISTOGRAMS
+#########################
+
+
+#########################
+# HOOKS OF FLASK
+#########################
+def start_request():
+    # This function is called by Flask before each request (check "before_request" in the file "app.py")
+    g.requestStart = time.perf_counter()
+
+
+def finish_request(response):
+    # This function is called by Flask after each request (check "after_request" in the file "app.py")
+    # It adds the "Server-Timing" header and updates the counters and the histograms
+    if 'requestStart' not in g:
+        return response
+    totalTime = time.perf_counter() - g.requestStart
+    stageTimes = g.get('stageTimes', {})
+
+    serverTiming = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in stageTimes.items()]
+    serverTiming.append(f'total;dur={totalTime * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(serverTiming)
+
+    # The rule of the URL is used instead of the path, so "/api/datasets/<datasetId>" is one endpoint and not one endpoint for each dataset
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unknown'
+    if endpoint == '/metrics':
+        return response
+    labels = {'endpoint': endpoint, 'method': request.method, 'status': str(response.status_code)}
+    increment_counter('pca_requests_total', labels)
+    observe_histogram('pca_request_duration_seconds', labels, totalTime, DURATION_BUCKETS)
+    if not response.direct_passthrough:
+        observe_histogram('pca_response_size_bytes', {'endpoint': endpoint}, len(response.get_data()), SIZE_BUCKETS)
+
+    stageLabels = {'endpoint': endpoint}
+    if 'datasetShape' in g:
+        stageLabels['genes'] = get_range(g.datasetShape[0], GENE_RANGES)
+        stageLabels['samples'] = get_range(g.datasetShape[1], SAMPLE_RANGES)
+    for name, seconds in stageTimes.items():
+        observe_histogram('pca_stage_duration_seconds', {**stageLabels, 'stage': name}, seconds, DURATION_BUCKETS)
+    return response
+#########################
+# End of HOOKS OF FLASK
+#########################
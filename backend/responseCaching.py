@@ -0,0 +1,170 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "responseCaching.py" file avoids sending the same result again and makes the big results smaller on the network
+#
+# 1. ETag and "304 Not Modified"
+# The result of a "generate_*" function only depends on the data and on the options in the URL (like "?solver=...", "?precision=...")
+# ==> so each result gets an "ETag" header, which is a hash of the data (the same hash as in "pcaCache.py") and of the options
+# ==> when the frontend asks for the same result again with the header "If-None-Match: <the ETag>", the backend answers "304 Not Modified" with no body
+#     The PCA is not computed again and the JSON is not written again, the frontend uses the result it already has
+# ==> this helps a lot when Micromix opens the same configuration again in its iframe
+# The "generate_*" functions can also be called with GET and a "dataset_id", like "/api/generate_pca?dataset_id=...", then the browser sends "If-None-Match" by itself
+#
+# 2. Compression
+# The big JSON results, like the loadings table, are compressed with the best compression accepted by the browser ("Accept-Encoding" header)
+# ==> zstd (if the "zstandard" library is installed), brotli (if the "brotli" library is installed), or gzip (always available)
+# ==> the order of preference could be changed with the environment variable "PCA_COMPRESSION_ENCODINGS", like "gzip" to only use gzip
+# ==> the results smaller than "PCA_COMPRESSION_MIN_BYTES" are not compressed, because it would not make them much smaller
+# ⭐⭐⭐
+#
+#########################
+
+import gzip
+import hashlib
+import json
+import os
+
+from flask import abort, current_app, g, request
+
+import pcaCache
+import requestMetrics
+
+# The libraries "brotli" and "zstandard" are optional, if they are not installed, their compression is not used
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_ENCODINGS = os.environ.get('PCA_COMPRESSION_ENCODINGS', 'zstd,br,gzip').split(',')
+COMPRESSION_MIN_BYTES = int(os.environ.get('PCA_COMPRESSION_MIN_BYTES', 1024))
+
+# Change this number when the results of the "generate_*" functions change, so the old ETags kept by the browsers are not used anymore
+ETAG_VERSION = '1'
+
+# The parameters in the URL which do NOT change the result, they are not part of the ETag
+# ==> "dataset_id" is replaced by the hash of the data itself, so the same data sent in the body or with its "dataset_id" has the same ETag
+IGNORED_ARGS = ['dataset_id']
+
+
+def compress_gzip(body):
+    return gzip.compress(body, compresslevel=6)
+
+
+def compress_brotli(body):
+    return brotli.compress(body, quality=5)
+
+
+def compress_zstd(body):
+    return zstandard.ZstdCompressor(level=3).compress(body)
+
+
+def get_compressors():
+    # The available compressions, with the names used in the "Accept-Encoding" and "Content-Encoding" headers
+    compressors = {'gzip': compress_gzip}
+    if brotli is not None:
+        compressors['br'] = compress_brotli
+    if zstandard is not None:
+        compressors['zstd'] = compress_zstd
+    return compressors
+
+
+#########################
+# ETAG
+#########################
+def make_etag(dataHash):
+    # The ETag is a hash of:
+    # ==> the hash of the data
+    # ==> the endpoint, like "/api/generate_pca"
+    # ==> the parameters in the URL, sorted, so "?k=10&n_components=6" and "?n_components=6&k=10" have the same ETag
+    # ==> the other keys of the JSON body, like "sections" for "/api/generate_bundle"
+    hashObject = hashlib.sha256()
+    hashObject.update(f'{ETAG_VERSION}\x1f{dataHash}\x1f{request.path}\x1f'.encode())
+    arguments = sorted(
+        (name, value) for name, values in request.args.lists() if name not in IGNORED_ARGS for value in values)
+    hashObject.update(json.dumps(arguments).encode())
+    requestBody = g.get('requestBody')
+    if isinstance(requestBody, dict):
+        options = {key: value for key, value in requestBody.items() if key not in ('data', 'dataset_id')}
+        hashObject.update(json.dumps(options, sort_keys=True, default=str).encode())
+    return hashObject.hexdigest()[:32]
+
+
+def check_not_modified(convertedData):
+    # Make the ETag of the result for "convertedData" and the current request
+    # If the frontend already has this result (the header "If-None-Match" has the same ETag), the response "304 Not Modified" is returned at once
+    # Otherwise the ETag is kept in "g", and it is added to the response by "finish_response()" below
+    etag = make_etag(pcaCache.hash_converted_data(convertedData))
+    g.etag = etag
+    # The ETag of a compressed response ends with the compression, like "...-gzip", check "finish_response()" below
+    # ==> the "304 Not Modified" sends back the ETag which was found in "If-None-Match", so it is still the ETag kept by the browser
+    candidates = [etag] + [f'{etag}-{encoding}' for encoding in get_compressors()]
+    matchedEtag = next((candidate for candidate in candidates if request.if_none_match.contains(candidate)), None)
+    if matchedEtag is not None:
+        response = current_app.response_class(status=304)
+        response.set_etag(matchedEtag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept-Encoding')
+        abort(response)
+#########################
+# End of ETAG
+#########################
+
+
+#########################
+# COMPRESSION
+#########################
+def choose_encoding():
+    # Choose the first compression of "COMPRESSION_ENCODINGS" which is available and accepted by the browser
+    # "Accept-Encoding" looks like "gzip, deflate, br, zstd" or "gzip;q=1.0, br;q=0" ("q=0" means "not accepted")
+    compressors = get_compressors()
+    for encoding in COMPRESSION_ENCODINGS:
+        encoding = encoding.strip()
+        if encoding in compressors and request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def finish_response(response):
+    # This function is called by Flask after each request (check "after_request" in the file "app.py")
+    # It adds the ETag kept by "check_not_modified()" and compresses the JSON results
+    if response.status_code != 200:
+        return response
+    etag = g.get('etag')
+    if etag is not None:
+        response.headers['Cache-Control'] = 'no-cache'
+
+    if response.direct_passthrough or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers:
+        if etag is not None:
+            response.set_etag(etag)
+        return response
+    response.vary.add('Accept-Encoding')
+
+    body = response.get_data()
+    encoding = choose_encoding() if len(body) >= COMPRESSION_MIN_BYTES else None
+    if encoding is not None:
+        with requestMetrics.stage('compress'):
+            response.set_data(get_compressors()[encoding](body))
+        response.headers['Content-Encoding'] = encoding
+        # The compressed body is different from the original body, so its ETag must also be different
+        if etag is not None:
+            etag = f'{etag}-{encoding}'
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+#########################
+# End of COMPRESSION
+#########################
@@ -0,0 +1,127 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "serverHealth.py" file has the "/health" endpoint and the warm-up of the backend
+#
+# The warm-up runs the whole work of a request once, on a very small dataset:
+# ==> prepare the data, StandardScaler, PCA, all the sections of "/api/generate_bundle", and the JSON
+# ==> this imports pandas, scikit-learn, scipy and pyarrow, which are not imported by "import app" (check the file "lazyImports.py"),
+#     loads the parts of them which are only loaded at their first use, and starts the BLAS library
+# ==> so the first real request of a user is not slower than the next ones
+# In production (check the file "gunicorn.conf.py"), the warm-up runs ONCE in the master process, BEFORE the workers are forked
+# ==> the workers get everything already loaded, and share the memory of it with the master process
+# With "python app.py", the warm-up runs in a background thread, so the server starts at once and answers "/health" while warming up
+# With "flask run" or another WSGI server, the same background warm-up is started by the first request, which can be the first "/health"
+# ==> the warm-up runs only once: the request does not start it again when it already ran or is running, like after the warm-up of Gunicorn
+#
+# "/health" answers:
+# ==> "503 Service Unavailable" with {"status": "starting"} until the warm-up has finished
+# ==> "200 OK" with {"status": "ready"} after that
+# So a load balancer (or Kubernetes, or Docker) only sends the requests to the backend when it is ready
+# ⭐⭐⭐
+#
+#########################
+
+import os
+import threading
+import time
+
+import numpy as np
+from flask import Blueprint, current_app, jsonify
+
+import dataIngestion
+import generateBundle
+import lazyImports
+import pcaCache
+
+# The big libraries are only imported when they are used for the first time, check the file "lazyImports.py"
+pd = lazyImports.lazy_module('pandas')
+
+bp = Blueprint('serverHealth', __name__)
+
+_lock = threading.Lock()
+# The lock of "warmUpThread", it is not "_lock" because "_lock" is held during the whole warm-up
+_startLock = threading.Lock()
+_state = {
+    'ready': False,
+    'startedAt': time.time(),
+    'warmUpSeconds': None,
+    'error': None,
+    'warmUpThread': None,
+}
+
+
+def make_warm_up_data():
+    # A very small dataset which looks like the data sent by the frontend, with "," as the decimal delimiter
+    randomGenerator = np.random.default_rng(0)
+    values = randomGenerator.gamma(2.0, 50.0, size=(50, 12))
+    data = {'locus_tag': [f'gene_{i}' for i in range(values.shape[0])]}
+    for j in range(values.shape[1]):
+        data[f'Condition{j % 4}_30m_{j}'] = [f'{value:.4f}'.replace('.', ',') for value in values[:, j]]
+    return pd.DataFrame(data)
+
+
+def warm_up(app):
+    # Run the whole work of a request once, then mark the backend as ready, check the NOTICE above
+    # The result is not put into the caches of "pcaCache.py", so the warm-up does not take any place in them
+    with _lock:
+        if _state['ready']:
+            return
+        start = time.perf_counter()
+        convertedData = dataIngestion.prepare_numeric_data(make_warm_up_data())
+        fittedPCA = pcaCache.fit_pca(convertedData)
+        result = generateBundle.build_sections(fittedPCA, list(generateBundle.SECTION_BUILDERS))
+        with app.app_context():
+            app.json.dumps(result)
+        _state['warmUpSeconds'] = time.perf_counter() - start
+        _state['ready'] = True
+
+
+def warm_up_in_background(app):
+    # Run the warm-up in a separate thread, the server can already answer the requests (they just do not get the benefit of the warm-up yet)
+    # If the warm-up fails, the error is logged and shown by "/health", and the backend still works, the libraries are then imported by the first request
+    # It is started only once, the next calls return the thread which was already started
+    def run():
+        try:
+            warm_up(app)
+        except Exception as error:
+            _state['error'] = repr(error)
+            app.logger.exception('The warm-up failed')
+
+    with _startLock:
+        if _state['warmUpThread'] is None:
+            _state['warmUpThread'] = threading.Thread(target=run, name='warm-up', daemon=True)
+            _state['warmUpThread'].start()
+        return _state['warmUpThread']
+
+
+@bp.before_app_request
+def start_warm_up():
+    # Called before each request, it starts the warm-up at the first request when nothing else has started it, check the NOTICE above
+    if not _state['ready'] and _state['warmUpThread'] is None:
+        warm_up_in_background(current_app._get_current_object())
+
+
+def is_ready():
+    return _state['ready']
+
+
+@bp.route('/health', methods=['GET'])
+def health():
+    result = {
+        'status': 'ready' if _state['ready'] else 'starting',
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.time() - _state['startedAt'], 1),
+        'warm_up_seconds': _state['warmUpSeconds'],
+    }
+    if _state['error'] is not None:
+        result['warm_up_error'] = _state['error']
+    return jsonify(result), 200 if _state['ready'] else 503
@@ -0,0 +1,288 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "streamingPCA.py" file does the PCA of a dataset which is too big to be kept in memory
+# The normal way (check the file "pcaCache.py") keeps the whole data in memory several times: the DataFrame, its transposed copy and its standardized copy
+# Here, the data is read from a Parquet file (or a ".npy" file) a few samples at a time, a "chunk", so the memory only depends on the size of one chunk:
+# ==> pass 1: read the chunks and compute the mean and the standard deviation of each gene, which are what StandardScaler computes
+# ==> pass 2: read the chunks again, standardize them with these numbers, and give them one by one to "IncrementalPCA" of scikit-learn with "partial_fit()"
+# ==> pass 3: read the chunks again and project them on the principal components, to get the coordinates of each sample ("scores")
+# The result has the same format as an entry of "pcaCache.py", so the same "build_*()" functions make the PCA plot, the 3D plot, the scree plot, the loadings table and the top contributors
+#
+# The Parquet file must have one text column with the gene names (the first one is used, like in "dataIngestion.py"), and one number column for each sample
+# ⭐⭐⭐
+#
+#########################
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from flask import Blueprint, jsonify, request
+
+import datasetSessions
+import generateBundle
+import jsonEncoding
+import lazyImports
+import requestMetrics
+
+# The big libraries are only imported when they are used for the first time, check the file "lazyImports.py"
+pd = lazyImports.lazy_module('pandas')
+pa = lazyImports.lazy_module('pyarrow')
+pq = lazyImports.lazy_module('pyarrow.parquet')
+sklearnDecomposition = lazyImports.lazy_module('sklearn.decomposition')
+
+# The "zstandard" library is only needed if the Parquet file is sent compressed with zstd
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+bp = Blueprint('streamingPCA', __name__)
+
+# The number of samples in one chunk, the memory used is about (number of genes x chunk size x 8 bytes) for each copy of a chunk
+# It could be changed with the environment variable "PCA_STREAMING_CHUNK_SIZE", or for one request with "?chunk_size=..."
+STREAMING_CHUNK_SIZE = int(os.environ.get('PCA_STREAMING_CHUNK_SIZE', 32))
+# The number of principal components which are computed, the builders need at most 8 (for the scree plot)
+# "IncrementalPCA" needs at least this number of samples in each chunk, so it is also limited by the chunk size
+STREAMING_N_COMPONENTS = int(os.environ.get('PCA_STREAMING_N_COMPONENTS', 10))
+# The folder where the big files can be put on the server, to be used with "?file=..." instead of sending them in the request
+# If it is not set, only files sent in the request can be used
+STREAMING_DATA_DIR = os.environ.get('PCA_STREAMING_DATA_DIR')
+
+# The size of the blocks used to copy the request body into a temporary file
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+#########################
+# SOURCES OF THE DATA
+#########################
+# A "source" is a dictionary with the gene names ("index"), the sample names ("columns") and a function "read_columns(start, end)"
+# which returns the samples from "start" to "end" as a float array, one row for each gene, one column for each sample
+def open_parquet_source(path):
+    parquetFile = pq.ParquetFile(path)
+    schema = parquetFile.schema_arrow
+
+    # Like "prepare_numeric_data()" in the file "dataIngestion.py": the number columns are the samples, and the first other column has the gene names
+    numericColumns = [field.name for field in schema if pa.types.is_integer(field.type) or pa.types.is_floating(field.type)]
+    otherColumns = [field.name for field in schema if field.name not in numericColumns]
+    if not otherColumns:
+        raise ValueError('The data has no non-numeric column, so there is no column with the gene names')
+    if not numericColumns:
+        raise ValueError('The data has no numeric column')
+    indexName = otherColumns[0]
+
+    def read_columns(start, end):
+        table = parquetFile.read(columns=numericColumns[start:end])
+        return np.column_stack([
+            table.column(i).to_numpy(zero_copy_only=False).astype(np.float64, copy=False)
+            for i in range(table.num_columns)
+        ])
+
+    index = pd.Index(parquetFile.read(columns=[indexName]).column(0).to_pandas(), name=indexName)
+    return {
+        'index': index,
+        'columns': numericColumns,
+        'read_columns': read_columns,
+    }
+
+
+def open_npy_source(path):
+    # The ".npy" file is opened with "mmap_mode", so it is not read into memory, only the asked columns are read from the disk
+    # The gene names and the sample names can be in a ".json" file with the same name, like {"index_name": "locus_tag", "index": [...], "columns": [...]}
+    # Otherwise they are "gene_0", "gene_1", ... and "sample_0", "sample_1", ...
+    matrix = np.load(path, mmap_mode='r')
+    if matrix.ndim != 2:
+        raise ValueError(f'The ".npy" file must have 2 dimensions (genes x samples), but it has {matrix.ndim}')
+
+    namesPath = os.path.splitext(path)[0] + '.json'
+    names = {}
+    if os.path.exists(namesPath):
+        with open(namesPath) as namesFile:
+            names = json.load(namesFile)
+
+    index = pd.Index(names.get('index', [f'gene_{i}' for i in range(matrix.shape[0])]), name=names.get('index_name', 'gene'))
+    return {
+        'index': index,
+        'columns': names.get('columns', [f'sample_{j}' for j in range(matrix.shape[1])]),
+        'read_columns': lambda start, end: np.asarray(matrix[:, start:end], dtype=np.float64),
+    }
+
+
+def open_source(path):
+    if path.endswith('.npy'):
+        return open_npy_source(path)
+    return open_parquet_source(path)
+#########################
+# End of SOURCES OF THE DATA
+#########################
+
+
+def get_chunk_bounds(numberOfSamples, chunkSize, minimumChunkSize):
+    # Return the (start, end) of each chunk
+    # "IncrementalPCA" needs at least "n_components" samples in each chunk, so a last chunk which is too small is merged with the chunk before it
+    bounds = [(start, min(start + chunkSize, numberOfSamples)) for start in range(0, numberOfSamples, chunkSize)]
+    if len(bounds) > 1 and bounds[-1][1] - bounds[-1][0] < minimumChunkSize:
+        lastStart, lastEnd = bounds.pop()
+        bounds[-1] = (bounds[-1][0], lastEnd)
+    return bounds
+
+
+def fit_streaming_pca(source, chunkSize=STREAMING_CHUNK_SIZE, n_components=STREAMING_N_COMPONENTS):
+    # Do the PCA of a "source", check the NOTICE above
+    # Return a dictionary with the same keys as an entry of "pcaCache.py", so it can be given to the "build_*()" functions
+    numberOfGenes = len(source['index'])
+    numberOfSamples = len(source['columns'])
+    n_components = min(n_components, chunkSize, numberOfSamples, numberOfGenes)
+    chunkBounds = get_chunk_bounds(numberOfSamples, chunkSize, n_components)
+
+    #########################
+    # PASS 1: MEAN AND STANDARD DEVIATION OF EACH GENE
+    #########################
+    # The statistics are computed over the samples, for each gene, like StandardScaler on the transposed data
+    # The mean and the sum of the squared differences to the mean ("M2") of each chunk are merged with those of the chunks before
+    # This is the "parallel algorithm" of Chan et al., which is as precise as computing them on the whole data at once
+    # The genes with a missing value (NaN) in any sample are removed, like "dropna()" in the file "dataIngestion.py"
+    mean = np.zeros(numberOfGenes)
+    sumOfSquaredDifferences = np.zeros(numberOfGenes)
+    hasMissingValue = np.zeros(numberOfGenes, dtype=bool)
+    numberOfSamplesSeen = 0
+    for start, end in chunkBounds:
+        chunk = source['read_columns'](start, end)
+        hasMissingValue |= np.isnan(chunk).any(axis=1)
+        chunkSamples = end - start
+        chunkMean = chunk.mean(axis=1)
+        chunkSumOfSquaredDifferences = ((chunk - chunkMean[:, np.newaxis]) ** 2).sum(axis=1)
+        delta = chunkMean - mean
+        totalSamples = numberOfSamplesSeen + chunkSamples
+        mean += delta * chunkSamples / totalSamples
+        sumOfSquaredDifferences += chunkSumOfSquaredDifferences + delta * delta * numberOfSamplesSeen * chunkSamples / totalSamples
+        numberOfSamplesSeen = totalSamples
+
+    keptGenes = ~hasMissingValue
+    if not keptGenes.any():
+        raise ValueError('Every gene has at least one missing value, so there is no data left for the PCA')
+    mean = mean[keptGenes]
+    variance = sumOfSquaredDifferences[keptGenes] / numberOfSamples
+    # Like StandardScaler, a gene with a variance of 0 is not divided, otherwise it would be a division by 0
+    scale = np.sqrt(variance)
+    scale[scale == 0] = 1
+    #########################
+    # End of PASS 1: MEAN AND STANDARD DEVIATION OF EACH GENE
+    #########################
+
+    def read_standardized_chunk(start, end):
+        # One row for each sample, one column for each gene, like "dataAfterStandardization" in the file "generatePCA.py"
+        chunk = source['read_columns'](start, end)[keptGenes]
+        chunk -= mean[:, np.newaxis]
+        chunk /= scale[:, np.newaxis]
+        return chunk.T
+
+    #########################
+    # PASS 2: FIT THE INCREMENTAL PCA
+    #########################
+    incrementalPCA = sklearnDecomposition.IncrementalPCA(n_components=n_components)
+    for start, end in chunkBounds:
+        incrementalPCA.partial_fit(read_standardized_chunk(start, end))
+    #########################
+    # End of PASS 2: FIT THE INCREMENTAL PCA
+    #########################
+
+    #########################
+    # PASS 3: COORDINATES OF THE SAMPLES
+    #########################
+    scores = np.vstack([
+        incrementalPCA.transform(read_standardized_chunk(start, end)) for start, end in chunkBounds
+    ])
+    #########################
+    # End of PASS 3: COORDINATES OF THE SAMPLES
+    #########################
+
+    index = source['index'][keptGenes]
+    return {
+        # The standardized data is never kept in memory in this mode
+        'standardizedData': None,
+        'scaler': {'mean': mean, 'scale': scale},
+        'pca': incrementalPCA,
+        'scores': scores,
+        'components': incrementalPCA.components_,
+        # "IncrementalPCA" keeps the total variance of all the data, so this is the ratio of the WHOLE variance, the same as the normal PCA, even if less components are computed
+        'explained_variance_ratio': incrementalPCA.explained_variance_ratio_,
+        'index': index,
+        'columns': source['columns'],
+        'nbytes': scores.nbytes + incrementalPCA.components_.nbytes,
+    }
+
+
+def copy_request_body_to_file(fileObject):
+    # Copy the body of the request into a file, block by block, so the whole body is never in memory
+    contentEncoding = (request.headers.get('Content-Encoding') or '').strip().lower()
+    stream = request.stream
+    if contentEncoding == 'gzip':
+        stream = gzip.GzipFile(fileobj=stream)
+    elif contentEncoding == 'zstd':
+        if zstandard is None:
+            raise ValueError('The request is compressed with zstd, but the "zstandard" library is not installed')
+        stream = zstandard.ZstdDecompressor().stream_reader(stream)
+    elif contentEncoding not in ('', 'identity'):
+        raise ValueError(f'Unknown "Content-Encoding" "{contentEncoding}", it must be "gzip" or "zstd"')
+    shutil.copyfileobj(stream, fileObject, COPY_BLOCK_SIZE)
+    fileObject.flush()
+
+
+def get_server_file_path(fileName):
+    # Return the path of a file in "STREAMING_DATA_DIR", only the files directly inside this folder can be used
+    if not STREAMING_DATA_DIR:
+        raise ValueError('Files on the server can not be used because "PCA_STREAMING_DATA_DIR" is not set')
+    if os.path.basename(fileName) != fileName:
+        raise ValueError(f'The file "{fileName}" must be a file name, without any folder')
+    path = os.path.join(STREAMING_DATA_DIR, fileName)
+    if not os.path.isfile(path):
+        raise ValueError(f'The file "{fileName}" does not exist in the data folder of the server')
+    return path
+
+
+@bp.route('/api/streaming_pca', methods=['POST'])
+def streaming_pca():
+    # Do the PCA of a big dataset, check the NOTICE above
+    # The data is either:
+    # ==> a Parquet file in the body of the request, with the "Content-Type" "application/vnd.apache.parquet", it can be compressed with gzip or zstd
+    # ==> the name of a Parquet or ".npy" file in the folder "PCA_STREAMING_DATA_DIR" of the server, like "/api/streaming_pca?file=big_data.parquet"
+    # The result is like "/api/generate_bundle", the sections can be chosen with the URL, like "?sections=pca,scree_plot", and also the "trace_layout"
+    sections = request.args.get('sections')
+    sections = sections.split(',') if sections else list(generateBundle.SECTION_BUILDERS)
+    unknownSections = [section for section in sections if section not in generateBundle.SECTION_BUILDERS]
+    if unknownSections:
+        raise ValueError(f'Unknown sections: {", ".join(unknownSections)}, the sections must be some of: {", ".join(generateBundle.SECTION_BUILDERS)}')
+    chunkSize = datasetSessions.get_int_arg('chunk_size', STREAMING_CHUNK_SIZE)
+
+    if request.args.get('file'):
+        with requestMetrics.stage('fit'):
+            fittedPCA = fit_streaming_pca(open_source(get_server_file_path(request.args['file'])), chunkSize=chunkSize)
+    else:
+        # The temporary file is deleted at the end of the "with" block
+        with tempfile.NamedTemporaryFile(suffix='.parquet') as temporaryFile:
+            with requestMetrics.stage('parse'):
+                copy_request_body_to_file(temporaryFile)
+            if temporaryFile.tell() == 0:
+                raise ValueError('The request has no data and no "file"')
+            with requestMetrics.stage('fit'):
+                fittedPCA = fit_streaming_pca(open_parquet_source(temporaryFile.name), chunkSize=chunkSize)
+
+    requestMetrics.set_dataset_shape(len(fittedPCA['index']), len(fittedPCA['columns']))
+
+    # The numbers could be rounded with the URL, like "?precision=4", check the file "jsonEncoding.py"
+    fittedPCA = jsonEncoding.get_rounded_pca(fittedPCA)
+    return jsonify(generateBundle.build_sections(
+        fittedPCA, sections, traceLayout=request.args.get('trace_layout', 'per_sample')))
@@ -0,0 +1,82 @@
+# --------------------------------
+#
+# 🚀 Created by Quang, 2024
+# ✉️ For any inquiries, suggestions, or discussions related to this work, feel free to contact me at: voquang.usth@gmail.com
+#
+# --------------------------------
+
+#########################
+#
+# ⭐⭐⭐
+# NOTICE
+# This "topContributors.py" file finds the genes which contribute the most to each principal component
+# Before, "generateTopFiveContributors.py" sorted ALL the genes again for each principal component, one by one, with pandas
+# ==> with 100 000 genes, this is 4 full sorts of 100 000 values, only to keep 5 of them
+# Now, all the principal components are done at the same time with numpy "argpartition()":
+# ==> "argpartition()" only moves the k largest values to the end, without sorting all the values, which is much faster than a full sort
+# ==> then only these k values are sorted, which costs nothing
+# ⭐⭐⭐
+#
+#########################
+
+import numpy as np
+
+
+def top_k_indices(values, k):
+    # "values" is a 2D array, one row for each principal component, one column for each gene
+    # Return the column positions of the "k" largest values in each row, from the largest to the smallest
+    # The result has the shape (number of rows, k)
+    k = min(k, values.shape[1])
+    if k == 0:
+        return np.empty((values.shape[0], 0), dtype=np.intp)
+
+    # After "argpartition()" with "kth = n - k", the last k positions of each row are the k largest values, but not in order
+    partitionedIndices = np.argpartition(values, values.shape[1] - k, axis=1)[:, -k:]
+    partitionedValues = np.take_along_axis(values, partitionedIndices, axis=1)
+
+    # Sort only these k values, from the largest to the smallest
+    order = np.argsort(-partitionedValues, axis=1, kind='stable')
+    return np.take_along_axis(partitionedIndices, order, axis=1)
+
+
+def find_top_contributors(components, k):
+    # "components" is the "components" of a fitted PCA, one row for each principal component, one column for each gene
+    # Return 3 lists of contributors for each principal component:
+    # ==> "absolute": the k genes with the largest absolute loadings, like before in "generateTopFiveContributors.py"
+    # ==> "positive": the k genes with the largest positive loadings
+    # ==> "negative": the k genes with the most negative loadings
+    # Each list is a pair of 2D arrays (gene positions, loadings), with one row for each principal component
+    # In the "positive" and "negative" lists, the loadings with the wrong sign are marked with the gene position -1, they happen when a principal component has less than k positive or negative loadings
+    absoluteIndices = top_k_indices(np.abs(components), k)
+    positiveIndices = top_k_indices(components, k)
+    negativeIndices = top_k_indices(-components, k)
+
+    positiveLoadings = np.take_along_axis(components, positiveIndices, axis=1)
+    negativeLoadings = np.take_along_axis(components, negativeIndices, axis=1)
+
+    return {
+        'absolute': (absoluteIndices, np.take_along_axis(components, absoluteIndices, axis=1)),
+        'positive': (np.where(positiveLoadings > 0, positiveIndices, -1), positiveLoadings),
+        'negative': (np.where(negativeLoadings < 0, negativeIndices, -1), negativeLoadings),
+    }
+
+
+def to_records(indices, loadings, geneNames, geneColumnName, labelPrincipalComponents):
+    # Convert the result of "find_top_contributors()" into a list like this, which is the same format as before:
+    # [
+    #     {"Principal component": "PC1", "locus_tag": "gene47", "Loadings": 0.0782},
+    #     {"Principal component": "PC1", "locus_tag": "gene89", "Loadings": 0.0775},
+    #     ...
+    # ]
+    # The genes marked with the position -1 are skipped
+    keep = indices >= 0
+    rows = np.nonzero(keep)[0]
+    names = geneNames[indices[keep]].tolist()
+    values = loadings[keep].tolist()
+    return [
+        {
+            "Principal component": labelPrincipalComponents[row],
+            geneColumnName: name,
+            "Loadings": value,
+        } for row, name, value in zip(rows.tolist(), names, values)
+    ]